@@ -0,0 +1,249 @@
+"""
+aio_app.py - Async Serving Mode
+aiohttp server for the I/O-bound hot paths: session starts, live turn
+appends, call-log writes and health. They run on one event loop with the
+async Firestore client and AsyncElevenLabs, so concurrency is no longer
+capped at the worker thread count. Every other route is forwarded to the
+Flask app in main.py, which runs on a thread pool.
+Run with: `uv run python aio_app.py --port 5000`
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from aiohttp import web
+from multidict import CIMultiDict
+from pydantic import ValidationError
+
+import metrics
+import wellbeing
+from config import async_db, async_el_client, get_health_status
+from main import SESSION_AGENTS, app as flask_app, signed_url_pool
+from models.calls import CALL_LOG_ADAPTER, TRANSCRIPT_ADAPTER, call_category
+from profile_cache import profile_cache
+from service_agent import build_context_snapshot, get_dynamic_variables, get_service_context
+from services.signed_url_pool import fetch_signed_url_async
+from transcripts import append_turns_async, save_call_log_async
+
+# Threads for routes still served by Flask.
+WSGI_THREADS = int(os.getenv("AIO_WSGI_THREADS", "32"))
+# Hop-by-hop or recomputed by aiohttp
+_SKIP_HEADERS = {"content-length", "transfer-encoding", "connection"}
+
+
+def _json_error(message, status, **extra):
+    return web.json_response({"error": message, **extra}, status=status)
+
+
+async def _read_json(request):
+    try:
+        return await request.json() or {}
+    except ValueError:
+        return {}
+
+
+async def _load_profile(user_id):
+    doc = await async_db.collection("users").document(user_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+# --- ASYNC ROUTES ---
+
+
+async def start_personalized_session(request):
+    """Async twin of main.start_personalized_session."""
+    try:
+        data = await _read_json(request)
+        user_id = data.get("user_id")
+        agent_type = data.get("agent_type", "service")
+        service_type = data.get("service_type", "casual")
+        session_key = "onboarding" if agent_type == "onboarding" else service_type
+
+        agent_id = SESSION_AGENTS.get(session_key)
+        if not agent_id:
+            return _json_error(f"Unknown session type '{session_key}'", 400)
+
+        needs_context = bool(user_id and session_key != "onboarding")
+        # The signed URL and the profile are fetched concurrently.
+        signed_url, user_data = await asyncio.gather(
+            signed_url_pool.get_async(agent_id, lambda a: fetch_signed_url_async(async_el_client, a)),
+            profile_cache.get_async(user_id, _load_profile) if needs_context else asyncio.sleep(0),
+        )
+
+        response = {"signed_url": signed_url, "agent_id": agent_id, "status": "success"}
+        if needs_context:
+            context = build_context_snapshot(user_data)
+            response["dynamic_variables"] = get_dynamic_variables(
+                user_id, service_type, data.get("reminder"), context=context
+            )
+            response["conversation_config_override"] = {
+                "agent": {"prompt": {"prompt": get_service_context(user_id, service_type, context=context)}}
+            }
+        return web.json_response(response)
+    except Exception as e:
+        return _json_error(str(e), 500)
+
+
+async def append_transcript_turns(request):
+    """Async twin of main.append_transcript_turns."""
+    call_id = request.match_info["call_id"]
+    try:
+        data = await _read_json(request)
+        user_id = data.get("user_id")
+        seq = data.get("seq")
+        if not user_id or not isinstance(seq, int) or seq < 0:
+            return _json_error("Missing user_id or non-negative integer seq", 400)
+
+        turns = [t.model_dump(exclude_none=True) for t in TRANSCRIPT_ADAPTER.validate_python(data.get("turns") or [])]
+        if not turns:
+            return _json_error("No turns provided", 400)
+
+        stored = await append_turns_async(async_db, call_id, user_id, seq, turns)
+        return web.json_response({"success": True, "seq": seq, "duplicate": not stored})
+    except ValidationError as ve:
+        return _json_error("Validation failed", 400, details=ve.errors())
+    except Exception as e:
+        return _json_error(str(e), 500)
+
+
+async def log_call_event(request):
+    """Async twin of main.log_call_event."""
+    try:
+        entry = CALL_LOG_ADAPTER.validate_json(await request.read())
+        call_obj, call_data = entry.call, entry.call.model_dump()
+        await save_call_log_async(async_db, call_obj.call_id, call_data)
+        # Rollups use the sync client, like the routes forwarded to Flask
+        await asyncio.get_running_loop().run_in_executor(
+            request.app["wsgi_pool"], wellbeing.record_call,
+            call_obj.user_id, call_obj.call_id, call_category(entry), call_data,
+        )
+
+        return web.json_response({"success": True, "call_id": call_obj.call_id}, status=201)
+    except ValidationError as ve:
+        return _json_error("Validation failed", 400, details=ve.errors(include_input=False))
+    except Exception as e:
+        return _json_error(str(e), 500)
+
+
+async def health(request):
+    return web.json_response(get_health_status(deep=request.query.get("deep") == "1"))
+
+
+# --- FLASK FALLBACK ---
+
+
+def _wsgi_environ(request, body):
+    path, _, query = request.raw_path.partition("?")
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": unquote(path, "latin-1"),
+        "QUERY_STRING": query,
+        "SERVER_NAME": request.host.split(":")[0],
+        "SERVER_PORT": str(request.url.port or 80),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_TYPE": request.headers.get("Content-Type", ""),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in request.headers.items():
+        key = "HTTP_" + name.upper().replace("-", "_")
+        if key not in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ):
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+
+    result = flask_app(environ, start_response)
+    try:
+        body = b"".join(result)  # streamed responses are buffered here
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+
+async def forward_to_flask(request):
+    body = await request.read()
+    loop = asyncio.get_running_loop()
+    status, headers, payload = await loop.run_in_executor(
+        request.app["wsgi_pool"], _call_wsgi, _wsgi_environ(request, body)
+    )
+    response_headers = CIMultiDict((k, v) for k, v in headers if k.lower() not in _SKIP_HEADERS)
+    return web.Response(status=int(status.split()[0]), headers=response_headers, body=payload)
+
+
+@web.middleware
+async def cors(request, handler):
+    # Preflights go to Flask, where flask_cors answers them for every route.
+    if request.method == "OPTIONS":
+        return await forward_to_flask(request)
+    response = await handler(request)
+    response.headers.setdefault("Access-Control-Allow-Origin", "*")
+    return response
+
+
+@web.middleware
+async def timing(request, handler):
+    # Forwarded requests are timed by the Flask hooks instead.
+    if handler is forward_to_flask or request.method == "OPTIONS":
+        return await handler(request)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        route = request.match_info.route.resource.canonical
+        metrics.observe_request(request.method, route, status, time.perf_counter() - started)
+
+
+def create_app():
+    aio = web.Application(middlewares=[cors, timing])
+    aio["wsgi_pool"] = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+    aio.router.add_post("/api/voice-session/start", start_personalized_session)
+    aio.router.add_post("/api/voice-session/{call_id}/turns", append_transcript_turns)
+    aio.router.add_post("/api/calls/log", log_call_event)
+    aio.router.add_get("/api/health", health)
+    # Everything else, including other methods on the paths above
+    aio.router.add_route("*", "/{tail:.*}", forward_to_flask)
+
+    async def shutdown(app):
+        app["wsgi_pool"].shutdown(wait=False)
+
+    aio.on_cleanup.append(shutdown)
+    return aio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the VoiceCare API with async hot paths")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+batch_analysis.py - Batched Gemini Analysis of Reminder Calls
+Packs many transcripts into one structured Gemini request (keyed by
+call_id, under a token budget) instead of one request per call. Used to
+drain calls whose analysis was deferred during a burst and to backfill
+old call logs.
+Run with: `uv run python batch_analysis.py [--limit 500]`
+"""
+
+import argparse
+import json
+import os
+
+from google.api_core.exceptions import NotFound
+from google.cloud import firestore
+
+from compaction import REMINDER_KEEP, compact_transcript, estimate_tokens
+from config import db, get_gemini_client
+from extraction_cache import cache_key, extraction_cache
+from metrics import timed
+from transcripts import load_transcript
+from wellbeing import record_calls, rollup_fields
+
+PROMPT_VERSION = "reminder-analysis-batch-v2"
+MODEL = "gemini-2.0-flash"
+TOKEN_BUDGET = int(os.getenv("BATCH_ANALYSIS_TOKEN_BUDGET", "24000"))
+MAX_CALLS_PER_REQUEST = int(os.getenv("BATCH_ANALYSIS_MAX_CALLS", "25"))
+WRITE_BATCH_SIZE = 500
+# Runs a pending call may fail (or lack a transcript) before it is given up
+# on with analysis_tier "failed", keeping its local-rules analysis.
+MAX_ANALYSIS_ATTEMPTS = int(os.getenv("BATCH_ANALYSIS_MAX_ATTEMPTS", "3"))
+
+ANALYSIS_FIELDS = (
+    "action_status", "engagement_level", "mood_detected", "comfort_provided", "memory_anchors",
+    "topics_discussed", "user_worries", "red_flags_detected",
+)
+
+PROMPT_HEADER = """
+Analyze each transcript below between a medical AI assistant and a senior user.
+Return ONE JSON object whose keys are the call ids and whose values follow:
+{
+  "action_status": "completed" | "delayed" | "refused" | "partially_done" | "ignored" | "pending",
+  "engagement_level": "low" | "meaningful" | "high",
+  "mood_detected": "string (e.g., happy, anxious, neutral)",
+  "comfort_provided": boolean,
+  "memory_anchors": ["string (e.g., personal facts, likes/dislikes)"],
+  "topics_discussed": ["string"],
+  "user_worries": ["string"],
+  "red_flags_detected": boolean
+}
+Every call id must appear exactly once. ONLY output valid JSON.
+"""
+
+
+def _render(call_id, transcript_log):
+    lines = "\n".join(f"{t['role'].upper()}: {t['text']}" for t in transcript_log)
+    return f"\n### CALL {call_id}\n{lines}\n"
+
+
+def pack(items, budget=TOKEN_BUDGET, max_calls=MAX_CALLS_PER_REQUEST):
+    """
+    Groups (call_id, transcript_log) items into request-sized batches.
+    A single transcript larger than the budget still gets its own batch.
+    """
+    batches, current, used = [], [], estimate_tokens(PROMPT_HEADER)
+    for call_id, transcript_log in items:
+        cost = estimate_tokens(_render(call_id, transcript_log))
+        if current and (used + cost > budget or len(current) >= max_calls):
+            batches.append(current)
+            current, used = [], estimate_tokens(PROMPT_HEADER)
+        current.append((call_id, transcript_log))
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _request(batch):
+    prompt = PROMPT_HEADER + "\nTRANSCRIPTS:\n" + "".join(_render(cid, log) for cid, log in batch)
+    with timed("gemini", "generate_content_batch"):
+        response = get_gemini_client().models.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config={"response_mime_type": "application/json"},
+        )
+    parsed = json.loads(response.text)
+    missing = [cid for cid, _ in batch if not isinstance(parsed.get(cid), dict)]
+    if missing:
+        raise ValueError(f"response missing {len(missing)} call(s)")
+    return {cid: parsed[cid] for cid, _ in batch}
+
+
+def analyze_batch(batch, stats):
+    """
+    Analyses one packed batch. On a parse failure the batch is split in half
+    and each half retried; a single call that still fails is reported.
+    """
+    stats["requests"] += 1
+    try:
+        return _request(batch), []
+    except Exception as e:
+        if len(batch) == 1:
+            print(f"⚠️ Batch analysis failed for {batch[0][0]}: {e}")
+            return {}, [batch[0][0]]
+        stats["splits"] += 1
+        mid = len(batch) // 2
+        left, left_failed = analyze_batch(batch[:mid], stats)
+        right, right_failed = analyze_batch(batch[mid:], stats)
+        return {**left, **right}, left_failed + right_failed
+
+
+def analyze_transcripts(items):
+    """
+    Analyses (call_id, transcript_log) pairs with as few Gemini requests as
+    possible. Transcripts are compacted like the single-call path, and
+    cached results are reused. Returns (results, failed_ids, stats).
+    """
+    stats = {"calls": len(items), "cached": 0, "requests": 0, "splits": 0}
+    results, pending = {}, []
+    for call_id, transcript_log in items:
+        transcript_log, _ = compact_transcript(transcript_log, keep_pattern=REMINDER_KEEP)
+        cached = extraction_cache.get(cache_key(PROMPT_VERSION, MODEL, transcript_log))
+        if cached is not None:
+            results[call_id] = cached
+            stats["cached"] += 1
+        else:
+            pending.append((call_id, transcript_log))
+
+    failed = []
+    logs = dict(pending)
+    for batch in pack(pending):
+        analysed, batch_failed = analyze_batch(batch, stats)
+        failed.extend(batch_failed)
+        for call_id, analysis in analysed.items():
+            extraction_cache.put(cache_key(PROMPT_VERSION, MODEL, logs[call_id]), analysis)
+        results.update(analysed)
+    return results, failed, stats
+
+
+def _update_existing(updates):
+    """
+    Applies {call_id: fields} as updates, 500 per commit. Calls deleted
+    meanwhile are skipped: one missing doc would fail its whole batch with
+    NotFound, so a batch that still hits one is retried doc by doc.
+    Returns the ids updated.
+    """
+    refs = {call_id: db.collection("call_logs").document(call_id) for call_id in updates}
+    existing = [doc.id for doc in db.get_all(list(refs.values())) if doc.exists] if refs else []
+    done = []
+    for i in range(0, len(existing), WRITE_BATCH_SIZE):
+        chunk = existing[i:i + WRITE_BATCH_SIZE]
+        batch = db.batch()
+        for call_id in chunk:
+            batch.update(refs[call_id], updates[call_id])
+        try:
+            batch.commit()
+            done.extend(chunk)
+        except NotFound:
+            for call_id in chunk:
+                try:
+                    refs[call_id].update(updates[call_id])
+                    done.append(call_id)
+                except NotFound:
+                    pass
+    skipped = len(updates) - len(done)
+    if skipped:
+        print(f"⚠️ Skipped {skipped} call log(s) deleted during batch analysis")
+    return done
+
+
+def write_results(results):
+    """Merges analyses onto the call logs that still exist. Returns their ids."""
+    return _update_existing({
+        call_id: {
+            **{k: analysis[k] for k in ANALYSIS_FIELDS if k in analysis},
+            "analysis_tier": "llm_batch",
+            "analysis_pending": False,
+        }
+        for call_id, analysis in results.items()
+    })
+
+
+def record_failures(calls, failed_ids):
+    """
+    Counts a failed attempt on each call; calls out of attempts leave the
+    pending queue. Returns the ids given up on.
+    """
+    updates = {}
+    for call_id in failed_ids:
+        attempts = (calls[call_id].get("analysis_attempts") or 0) + 1
+        updates[call_id] = {"analysis_attempts": attempts}
+        if attempts >= MAX_ANALYSIS_ATTEMPTS:
+            updates[call_id].update({"analysis_pending": False, "analysis_tier": "failed"})
+    written = set(_update_existing(updates))
+    return [call_id for call_id, update in updates.items() if "analysis_tier" in update and call_id in written]
+
+
+def analyze_pending_calls(limit=500):
+    """
+    Drains call logs saved with analysis_pending=True, oldest first, then
+    adds them to the wellbeing rollups, which process_reminder_call_log left
+    to us. Needs the composite index (analysis_pending, created_at).
+    """
+    docs = db.collection("call_logs") \
+        .where(filter=firestore.FieldFilter("analysis_pending", "==", True)) \
+        .order_by("created_at") \
+        .limit(limit) \
+        .stream()
+    calls = {doc.id: doc.to_dict() for doc in docs}
+    items = [(call_id, load_transcript(call_id, data)) for call_id, data in calls.items()]
+    missing = [call_id for call_id, log in items if not log]
+    items = [(call_id, log) for call_id, log in items if log]
+
+    results, failed, stats = analyze_transcripts(items)
+    written = set(write_results(results))
+    given_up = record_failures(calls, failed + missing)
+    # Given-up calls are counted with the local-rules mood they were saved with.
+    record_calls([
+        (calls[call_id].get("user_id"), call_id, "reminder", {**rollup_fields(calls[call_id]), **analysis})
+        for call_id, analysis in [*results.items(), *((call_id, {}) for call_id in given_up)]
+        if calls[call_id].get("user_id") and (call_id in written or call_id in given_up)
+    ])
+    return {
+        "success": True, "analysed": len(results), "failed": failed + missing, "given_up": given_up, "stats": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-analyse pending reminder calls")
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+
+    result = analyze_pending_calls(args.limit)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
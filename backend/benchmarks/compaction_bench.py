@@ -0,0 +1,95 @@
+"""
+compaction_bench.py - Prompt Size Before/After Transcript Compaction
+Replays last_onboarding.json, repeated to simulate longer calls, through
+compaction.compact_transcript and reports estimated prompt tokens and the
+compaction time. With --live the full and the compacted prompts are also
+sent to Gemini so end-to-end latency can be compared.
+Run with: `uv run python benchmarks/compaction_bench.py [--repeat 1 5 20] [--live]`
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from compaction import ONBOARDING_KEEP, PROMPT_TOKEN_BUDGET, compact_transcript, transcript_tokens  # noqa: E402
+
+CHATTER = [
+    {"role": "user", "text": "Hmm."},
+    {"role": "assistant", "text": "Take your time, there's no rush at all."},
+    {"role": "user", "text": "Okay."},
+    {"role": "user", "text": "The weather has been lovely this week, I sat out in the garden most mornings."},
+    {"role": "assistant", "text": "That sounds wonderful. Gardens are such a peaceful place to spend the morning."},
+    {"role": "user", "text": "Yes."},
+]
+
+
+def load_sample():
+    with open(os.path.join(BACKEND_DIR, "last_onboarding.json")) as f:
+        return json.load(f)
+
+
+def scaled(sample, repeat):
+    """The sample with `repeat` rounds of small talk spliced in before it."""
+    return CHATTER * repeat + sample
+
+
+def render(transcript_log):
+    return "\n".join(f"{t['role'].upper()}: {t['text']}" for t in transcript_log)
+
+
+def time_gemini(text, runs):
+    from config import get_gemini_client
+
+    client = get_gemini_client()
+    prompt = "Extract the senior's profile into JSON. ONLY output JSON.\n\nTRANSCRIPT:\n" + text
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        client.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=prompt,
+            config={"response_mime_type": "application/json"},
+        )
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transcript compaction")
+    parser.add_argument("--repeat", type=int, nargs="+", default=[0, 10, 50, 200])
+    parser.add_argument("--budget", type=int, default=PROMPT_TOKEN_BUDGET)
+    parser.add_argument("--live", action="store_true", help="also time Gemini calls")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    sample = load_sample()
+    rows = []
+    for repeat in args.repeat:
+        transcript_log = scaled(sample, repeat)
+        started = time.perf_counter()
+        compacted, stats = compact_transcript(transcript_log, budget=args.budget, keep_pattern=ONBOARDING_KEEP)
+        row = {
+            "repeat": repeat,
+            "turns": f"{stats['turns_before']} -> {stats['turns_after']}",
+            "tokens": f"{stats['tokens_before']} -> {stats['tokens_after']}",
+            "saved": f"{100 - 100 * stats['tokens_after'] // max(stats['tokens_before'], 1)}%",
+            "compact_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        if args.live:
+            row["gemini_ms"] = f"{time_gemini(render(transcript_log), args.runs)} -> " \
+                               f"{time_gemini(render(compacted), args.runs)}"
+        rows.append(row)
+        assert transcript_tokens(compacted) <= stats["tokens_before"]
+
+    for row in rows:
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+
+
+if __name__ == "__main__":
+    main()
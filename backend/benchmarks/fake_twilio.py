@@ -0,0 +1,94 @@
+"""
+fake_twilio.py - Local Stand-in for the Twilio Messages API
+Accepts POST /2010-04-01/Accounts/<sid>/Messages.json, answers after an
+injectable latency and fails a share of requests with 429/503 so the
+bulk sender's concurrency, throttling and retries can be exercised.
+Run with: `uv run python benchmarks/fake_twilio.py --port 8765 --latency-ms 200`
+then start the backend with TWILIO_API_BASE=http://127.0.0.1:8765
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTwilio:
+    def __init__(self, latency_ms=0, error_rate=0.0, retry_after=None, host="127.0.0.1", port=0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.retry_after = retry_after  # Retry-After header (seconds) sent with a 429
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if status == 429 and fake.retry_after is not None:
+                    self.send_header("Retry-After", str(fake.retry_after))
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                with fake._lock:
+                    fake.requests.append({"path": self.path, "to": form.get("To", [None])[0]})
+                time.sleep(fake.latency_ms / 1000)
+                if not self.path.endswith("/Messages.json"):
+                    return self._reply(404, {"code": 20404, "message": "Not found", "status": 404})
+                if random.random() < fake.error_rate:
+                    status = random.choice((429, 503))
+                    return self._reply(status, {"code": 20429, "message": "Too Many Requests", "status": status})
+                self._reply(201, {
+                    "sid": "SM" + uuid.uuid4().hex,
+                    "status": "queued",
+                    "to": form.get("To", [None])[0],
+                    "from": form.get("From", [None])[0],
+                    "body": form.get("Body", [None])[0],
+                })
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-twilio", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Twilio Messages API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeTwilio(args.latency_ms, args.error_rate, port=args.port)
+    print(f"✓ Fake Twilio listening on {fake.base_url}")
+    fake.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
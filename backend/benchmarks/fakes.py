@@ -0,0 +1,98 @@
+"""
+fakes.py - Local Stand-ins for Firestore, Gemini and ElevenLabs
+In-process fakes with injectable latency, implementing just the SDK surface
+the backend uses, so load tests run without Google Cloud or API keys.
+Firestore is storage.MemoryFirestore (the STORAGE_BACKEND=memory client).
+Install them with `install_fakes()` before importing main. Twilio is faked
+over HTTP in fake_twilio.py, since the SDK reaches it via TWILIO_API_BASE.
+"""
+
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+
+
+def _pause(latency_ms, jitter=0.2):
+    if latency_ms:
+        time.sleep(latency_ms * random.uniform(1 - jitter, 1 + jitter) / 1000)
+
+
+# --- GEMINI ---
+
+ONBOARDING_RESULT = {
+    "full_name": "Demo Senior",
+    "allergies": ["penicillin"],
+    "emergency_contacts": [],
+    "reminders": [{"time": "08:00 AM", "frequency": "Daily", "date": None, "about": "Aspirin"}],
+}
+REMINDER_RESULT = {
+    "action_status": "completed",
+    "engagement_level": "meaningful",
+    "mood_detected": "happy",
+    "comfort_provided": True,
+    "memory_anchors": [],
+    "topics_discussed": ["medication"],
+    "user_worries": [],
+    "red_flags_detected": False,
+}
+
+
+class FakeGemini:
+    """`client.models.generate_content(...)` returning canned JSON for our prompts."""
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.calls = Counter()
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+
+    def generate_content(self, model, contents, config=None):
+        self.calls[model] += 1
+        _pause(self.latency_ms)
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        call_ids = re.findall(r"^### CALL (\S+)$", prompt, re.MULTILINE)
+        if call_ids:
+            # batch_analysis prompts: one object per call id
+            result = {call_id: REMINDER_RESULT for call_id in call_ids}
+        elif "full_name" in prompt:
+            result = ONBOARDING_RESULT
+        else:
+            result = REMINDER_RESULT
+        return SimpleNamespace(text=json.dumps(result))
+
+
+# --- ELEVENLABS ---
+
+
+class FakeElevenLabs:
+    """`client.conversational_ai.conversations.get_signed_url(agent_id=...)`."""
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.calls = Counter()
+        conversations = SimpleNamespace(get_signed_url=self.get_signed_url)
+        self.conversational_ai = SimpleNamespace(conversations=conversations)
+
+    def get_signed_url(self, agent_id):
+        self.calls[agent_id] += 1
+        _pause(self.latency_ms)
+        return SimpleNamespace(signed_url=f"wss://fake.elevenlabs.local/v1/convai?agent_id={agent_id}&token={uuid.uuid4().hex}")
+
+
+def install_fakes(firestore_ms=0, gemini_ms=0, elevenlabs_ms=0):
+    """Points config's lazy clients at fakes; call before main is imported."""
+    import config
+    from storage import MemoryFirestore
+
+    fakes = {
+        "firestore": MemoryFirestore(firestore_ms),
+        "gemini": FakeGemini(gemini_ms),
+        "elevenlabs": FakeElevenLabs(elevenlabs_ms),
+    }
+    config.db.override(fakes["firestore"])
+    config.gemini_client.override(fakes["gemini"])
+    config.el_client.override(fakes["elevenlabs"])
+    return fakes
@@ -0,0 +1,75 @@
+"""
+import_bench.py - Cold-start Import Time
+Runs `python -X importtime` in fresh interpreters and reports the
+cumulative import time of the given modules plus the slowest imports
+underneath them, and the wall time of a cold `/api/health` request.
+Run with: `uv run python benchmarks/import_bench.py [--modules config main] [--runs 5]`
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+HEALTH_SNIPPET = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.app.test_client().get('/api/health')
+print(round((imported - started) * 1000, 1), round((time.perf_counter() - started) * 1000, 1))
+"""
+
+
+def import_profile(module):
+    """{module: cumulative_us} for one cold import of `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    profile = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            profile[match.group(4)] = int(match.group(2))
+    return profile
+
+
+def cold_health():
+    proc = subprocess.run([sys.executable, "-c", HEALTH_SNIPPET], cwd=BACKEND_DIR, capture_output=True, text=True)
+    import_ms, total_ms = proc.stdout.strip().splitlines()[-1].split()
+    return float(import_ms), float(total_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time")
+    parser.add_argument("--modules", nargs="+", default=["config", "main"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    report = {}
+    for module in args.modules:
+        runs = [import_profile(module) for _ in range(args.runs)]
+        slowest = sorted(runs[-1].items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+        report[module] = {
+            "import_ms_median": round(statistics.median(r.get(module, 0) for r in runs) / 1000, 1),
+            "slowest": {name: round(us / 1000, 1) for name, us in slowest},
+        }
+
+    health = [cold_health() for _ in range(args.runs)]
+    report["cold_health"] = {
+        "import_main_ms_median": statistics.median(h[0] for h in health),
+        "first_response_ms_median": statistics.median(h[1] for h in health),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
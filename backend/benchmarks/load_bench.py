@@ -0,0 +1,319 @@
+"""
+load_bench.py - Concurrent Load Test of the test.py Flows
+Starts the onboarding, service, reminders and calls flows from test.py at a
+fixed arrival rate, over real HTTP, against the Flask app served in-process.
+Firestore, Gemini and ElevenLabs are replaced by fakes.py and Twilio by
+fake_twilio.py, each with injectable latency, so no credentials are needed.
+Reports p50/p95/p99 per endpoint and requests per second; --out saves the
+run as JSON and --baseline compares p95s against an earlier run.
+Run with: `uv run python benchmarks/load_bench.py --rate 20 --duration 30 --out run.json`
+With --url, loads an already running server (and its real back ends) instead.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FLOW_NAMES = ("onboarding", "service", "reminders", "calls")
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 2)
+
+
+def _summary(values_ms):
+    values = sorted(values_ms)
+    return {
+        "p50_ms": _percentile(values, 0.50),
+        "p95_ms": _percentile(values, 0.95),
+        "p99_ms": _percentile(values, 0.99),
+        "max_ms": round(values[-1], 2) if values else None,
+    }
+
+
+class Recorder:
+    """Latency samples per endpoint and per flow, shared by the worker threads."""
+
+    def __init__(self):
+        self.requests = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.flows = defaultdict(list)
+        self.flow_errors = Counter()
+        self.schedule_lag = []
+        self._lock = threading.Lock()
+
+    def request(self, endpoint, status, elapsed_ms):
+        with self._lock:
+            self.requests[endpoint].append(elapsed_ms)
+            self.statuses[endpoint][str(status)] += 1
+
+    def flow(self, name, elapsed_ms, lag_ms, failed):
+        with self._lock:
+            self.flows[name].append(elapsed_ms)
+            self.schedule_lag.append(lag_ms)
+            if failed:
+                self.flow_errors[name] += 1
+
+
+class _Response:
+    """The slice of Flask's test response that test._call_api reads."""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.data = response.content
+        self._response = response
+
+    def get_json(self):
+        return self._response.json()
+
+
+class HttpClient:
+    """Stands in for test.client: same .open() call, timed, one session per thread."""
+
+    def __init__(self, base_url, url_map, recorder):
+        self.base_url = base_url.rstrip("/")
+        self.routes = url_map.bind("localhost")
+        self.recorder = recorder
+        self._local = threading.local()
+
+    def _endpoint(self, method, path):
+        from werkzeug.exceptions import HTTPException
+
+        try:
+            rule, _ = self.routes.match(path.split("?")[0], method=method, return_rule=True)
+            return f"{method} {rule.rule}"
+        except HTTPException:
+            return f"{method} unmatched"
+
+    def open(self, path, method="GET", json=None):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, json=json, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            status = "error"
+            raise
+        finally:
+            self.recorder.request(self._endpoint(method, path), status, (time.perf_counter() - started) * 1000)
+        return _Response(response)
+
+
+def prepare_backends(args):
+    """Fakes for every external service; must run before main is imported."""
+    from fake_twilio import FakeTwilio
+    from fakes import install_fakes
+
+    twilio = FakeTwilio(latency_ms=args.twilio_ms).start()
+    os.environ.update({
+        "TWILIO_ACCOUNT_SID": "AC" + "0" * 32,
+        "TWILIO_AUTH_TOKEN": "fake-token",
+        "TWILIO_WHATSAPP_NUMBER": "+10000000000",
+        "TWILIO_API_BASE": twilio.base_url,
+    })
+    for name in ("ELEVENLABS_AGENT_ID", "ELEVENLABS_REMINDER_AGENT_ID", "ELEVENLABS_CASUAL_AGENT_ID"):
+        os.environ.setdefault(name, name.lower())
+    fakes = install_fakes(args.firestore_ms, args.gemini_ms, args.elevenlabs_ms)
+    fakes["twilio"] = twilio
+    return fakes
+
+
+def serve(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_load(flows, args, recorder):
+    """Open loop: flow i starts at i / rate regardless of how slow earlier ones are."""
+    pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bench")
+    names = itertools.cycle(args.flows)
+    futures = []
+    started = time.perf_counter()
+
+    def run(name, user_id, due):
+        begun = time.perf_counter()
+        failed = False
+        try:
+            flows[name](user_id)
+        except Exception as e:
+            failed = True
+            print(f"⚠️ {name} flow failed: {e}")
+        recorder.flow(name, (time.perf_counter() - begun) * 1000, (begun - due) * 1000, failed)
+
+    for i in itertools.count():
+        due = started + i / args.rate
+        if due - started >= args.duration:
+            break
+        time.sleep(max(0.0, due - time.perf_counter()))
+        futures.append(pool.submit(run, next(names), f"bench-user-{i % args.users}", due))
+    wait(futures)
+    pool.shutdown()
+    return time.perf_counter() - started
+
+
+def _drain_jobs(timeout=30):
+    from jobs import job_queue
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = job_queue.stats()
+        if not stats["queue_depth"] and not stats["in_flight"]:
+            break
+        time.sleep(0.1)
+    return job_queue.stats()
+
+
+def build_report(args, recorder, elapsed, fakes):
+    total = sum(len(samples) for samples in recorder.requests.values())
+    report = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 2) if elapsed else None,
+        "endpoints": {},
+        "flows": {},
+        "schedule_lag": _summary(recorder.schedule_lag),
+    }
+    for endpoint, samples in sorted(recorder.requests.items()):
+        statuses = recorder.statuses[endpoint]
+        report["endpoints"][endpoint] = {
+            "count": len(samples),
+            "rps": round(len(samples) / elapsed, 2),
+            "errors": sum(n for status, n in statuses.items() if not status.startswith(("2", "3"))),
+            "status": dict(statuses),
+            **_summary(samples),
+        }
+    for name, samples in sorted(recorder.flows.items()):
+        report["flows"][name] = {"count": len(samples), "errors": recorder.flow_errors[name], **_summary(samples)}
+
+    if fakes:
+        from extraction_cache import extraction_cache
+        from main import signed_url_pool
+
+        report["backends"] = {
+            "firestore_ops": dict(fakes["firestore"].ops),
+            "gemini_calls": sum(fakes["gemini"].calls.values()),
+            "elevenlabs_calls": sum(fakes["elevenlabs"].calls.values()),
+            "twilio_requests": len(fakes["twilio"].requests),
+        }
+        report["server"] = {
+            "job_queue": _drain_jobs(),
+            "extraction_cache": extraction_cache.stats(),
+            "signed_url_pool": signed_url_pool.stats(),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Endpoints whose p95 grew by more than `tolerance` (a fraction) since the baseline."""
+    regressions = []
+    for endpoint, now in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before or not before.get("p95_ms") or now["p95_ms"] is None:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append((endpoint, before["p95_ms"], now["p95_ms"]))
+    return regressions
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']}s -> {report['rps']} req/s")
+    print(f"{'endpoint':<48} {'count':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<48} {row['count']:>6} {row['rps']:>7} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>5}")
+    print("\nflows (ms):")
+    for name, row in report["flows"].items():
+        print(f"  {name:<12} n={row['count']:<5} p50={row['p50_ms']} p95={row['p95_ms']} errors={row['errors']}")
+    lag = report["schedule_lag"]
+    print(f"start lag (ms): p50={lag['p50_ms']} p95={lag['p95_ms']} max={lag['max_ms']}")
+    if "backends" in report:
+        print(f"back ends: {json.dumps(report['backends'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the VoiceCare API with the test.py flows")
+    parser.add_argument("--flows", nargs="+", choices=FLOW_NAMES, default=list(FLOW_NAMES))
+    parser.add_argument("--rate", type=float, default=10.0, help="flows started per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to keep starting flows")
+    parser.add_argument("--concurrency", type=int, default=64, help="max flows in flight")
+    parser.add_argument("--users", type=int, default=50, help="distinct user ids to spread load over")
+    parser.add_argument("--firestore-ms", type=float, default=10.0)
+    parser.add_argument("--gemini-ms", type=float, default=800.0)
+    parser.add_argument("--elevenlabs-ms", type=float, default=150.0)
+    parser.add_argument("--twilio-ms", type=float, default=200.0)
+    parser.add_argument("--url", help="load a running server instead of the in-process one")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier --out file to compare p95s against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth vs the baseline")
+    args = parser.parse_args()
+
+    fakes = None if args.url else prepare_backends(args)
+
+    import test as flows_module
+    from main import app
+
+    recorder = Recorder()
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        server, base_url = serve(app)
+    flows_module.VERBOSE = False
+    flows_module.client = HttpClient(base_url, app.url_map, recorder)
+    flows = {
+        "onboarding": flows_module.onboarding_flow,
+        "service": flows_module.service_flow,
+        "reminders": flows_module.reminder_flow,
+        "calls": flows_module.list_calls,
+    }
+
+    print(f"Running {', '.join(args.flows)} at {args.rate}/s for {args.duration}s against {base_url}")
+    elapsed = run_load(flows, args, recorder)
+    report = build_report(args, recorder, elapsed, fakes)
+    if server:
+        server.shutdown()
+    print_report(report)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"✓ Results saved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for endpoint, before, now in regressions:
+            print(f"❌ {endpoint}: p95 {before} -> {now} ms")
+        if regressions:
+            sys.exit(1)
+        print("✓ No p95 regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
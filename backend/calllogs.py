@@ -1,14 +1,23 @@
+import os
 from datetime import datetime
-import json
-from config import db, get_gemini_client
+from google.cloud import firestore
+from compaction import REMINDER_KEEP, compact_transcript
+from extraction_cache import generate_json
+from local_extractor import analyze_reminder_tiered
+from transcripts import load_transcript, save_call_log
+from wellbeing import record_call
 
-def process_reminder_call_log(transcript_log, user_id, call_id=None):
-    """
-    Analyzes a reminder call transcript to extract metadata and 
-    saves it to the 'call_logs' collection.
-    """
-    full_text = "\n".join([f"{t['role'].upper()}: {t['text']}" for t in transcript_log])
-    client = get_gemini_client()
+# Bump when the prompt changes so cached extractions are not reused.
+PROMPT_VERSION = "reminder-analysis-v3"
+MODEL = "gemini-2.0-flash"
+# "batch" defers uncertain analyses to batch_analysis.analyze_pending_calls,
+# so a burst of calls costs a handful of Gemini requests.
+LLM_MODE = os.getenv("REMINDER_LLM_MODE", "inline")
+
+def _llm_analysis(transcript_log):
+    """Gemini tier of the reminder-call analysis."""
+    compacted, _ = compact_transcript(transcript_log, keep_pattern=REMINDER_KEEP)
+    full_text = "\n".join([f"{t['role'].upper()}: {t['text']}" for t in compacted])
 
     prompt = f"""
     Analyze this transcript between a medical AI assistant and a senior user.
@@ -16,6 +25,7 @@ def process_reminder_call_log(transcript_log, user_id, call_id=None):
 
     SCHEMA:
     {{
+      "action_status": "completed" | "delayed" | "refused" | "partially_done" | "ignored" | "pending",
       "engagement_level": "low" | "meaningful" | "high",
       "mood_detected": "string (e.g., happy, anxious, neutral)",
       "comfort_provided": boolean,
@@ -31,13 +41,21 @@ def process_reminder_call_log(transcript_log, user_id, call_id=None):
     {full_text}
     """
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt,
-        config={"response_mime_type": "application/json"},
-    )
+    return generate_json(PROMPT_VERSION, MODEL, compacted, prompt)
+
+def process_reminder_call_log(transcript_log, user_id, call_id=None):
+    """
+    Analyzes a reminder call transcript to extract metadata and 
+    saves it to the 'call_logs' collection.
+    If the turns were streamed in during the call, pass only the call_id.
+    Short, unambiguous calls are analysed by local rules without Gemini.
+    """
+    transcript_stored = not transcript_log and call_id is not None
+    if transcript_stored:
+        transcript_log = load_transcript(call_id)
 
-    analysis = json.loads(response.text)
+    llm_analyze = None if LLM_MODE == "batch" else (lambda: _llm_analysis(transcript_log))
+    analysis, tier, confidence = analyze_reminder_tiered(transcript_log, llm_analyze)
 
     # Prepare the Firestore document following your screenshot structure
     # Document ID format: cas-1767100091
@@ -57,10 +75,20 @@ def process_reminder_call_log(transcript_log, user_id, call_id=None):
         "topics_discussed": analysis.get("topics_discussed", []),
         "user_worries": analysis.get("user_worries", []),
         "red_flags_detected": analysis.get("red_flags_detected", False),
-        "transcript": transcript_log # Stores the full conversation as shown in screenshot
+        "action_status": analysis.get("action_status"),
+        "medications_mentioned": analysis.get("medications_mentioned", []),
+        "allergies_mentioned": analysis.get("allergies_mentioned", []),
+        "analysis_tier": tier,
+        "analysis_pending": tier == "deferred",
+        "analysis_confidence": confidence,
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "transcript": transcript_log # Offloaded to the transcript_chunks subcollection
     }
 
     # Save to the 'call_logs' collection
-    db.collection("call_logs").document(doc_id).set(call_log_data)
+    save_call_log(doc_id, call_log_data, transcript_stored=transcript_stored)
+    # Deferred calls are added to the rollups once batch_analysis has a mood
+    if tier != "deferred":
+        record_call(user_id, doc_id, "reminder", call_log_data)
 
     return {"log_saved": True, "call_id": doc_id}
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+compaction.py - Token-budgeted Transcript Compaction
+Shrinks a transcript before it is put into an LLM prompt:
+  1. drop filler turns ("hmm", "okay", "uh huh")
+  2. merge consecutive turns by the same speaker
+  3. if still over budget, keep recent turns and turns matching the
+     caller's keep-pattern verbatim, and fold older turns into
+     progressively coarser extractive summaries.
+No LLM is involved, so the output is deterministic and cache-friendly.
+"""
+
+import os
+import re
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Most recent turns always kept verbatim.
+KEEP_RECENT_TURNS = 8
+SUMMARY_GROUP_SIZE = 4
+SUMMARY_SNIPPET_CHARS = 120
+
+FILLER_WORDS = {
+    "ok", "okay", "hmm", "hm", "mm", "mmm", "uh", "um", "huh", "uh-huh", "yeah",
+    "yes", "yep", "right", "sure", "alright", "oh", "ah", "hello", "hi", "bye",
+}
+_WORD = re.compile(r"[a-z'\-]+")
+
+# Turns each extraction needs; these are never folded into summaries.
+ONBOARDING_KEEP = re.compile(
+    r"\d|\b(allerg\w*|medic\w*|pills?|tablets?|mg|am|pm|o'clock|daily|weekly|morning|evening|night|"
+    r"name|number|phone|son|daughter|wife|husband|brother|sister|doctor|neighbou?r|friend)\b"
+)
+REMINDER_KEEP = re.compile(
+    r"\b(pain|breathe?|fell|fall|dizzy|faint|bleeding|help|emergency|worr\w*|scared|afraid|"
+    r"lonely|sad|miss|remember|allerg\w*|medic\w*|pills?|tablets?)\b"
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def transcript_tokens(transcript_log):
+    return sum(estimate_tokens(f"{t['role'].upper()}: {t['text']}\n") for t in transcript_log)
+
+
+def is_filler(text):
+    words = _WORD.findall((text or "").lower())
+    return len(words) <= 3 and all(w in FILLER_WORDS for w in words)
+
+
+def merge_same_role(transcript_log):
+    merged = []
+    for turn in transcript_log:
+        if merged and merged[-1]["role"] == turn["role"]:
+            merged[-1] = {**merged[-1], "text": f"{merged[-1]['text']} {turn['text']}".strip()}
+        else:
+            merged.append(dict(turn))
+    return merged
+
+
+def _snippet(turn):
+    first = re.split(r"(?<=[.!?])\s", turn["text"].strip(), maxsplit=1)[0]
+    return f"{turn['role']}: {first[:SUMMARY_SNIPPET_CHARS]}"
+
+
+def _summarize(turns, level):
+    """One synthetic turn standing in for a run of older turns."""
+    return {
+        "role": "assistant",
+        "text": f"[summary L{level} of {len(turns)} earlier turns] " + " | ".join(_snippet(t) for t in turns),
+        "timestamp": turns[0].get("timestamp"),
+        "_summary_level": level,
+    }
+
+
+def _keep(turn, keep_pattern):
+    # Only what the user said is pinned; assistant turns are context.
+    return keep_pattern is not None and turn["role"] == "user" and "_summary_level" not in turn \
+        and bool(keep_pattern.search(turn["text"].lower()))
+
+
+def compact_transcript(transcript_log, budget=PROMPT_TOKEN_BUDGET, keep_pattern=None):
+    """
+    Returns (compacted_log, stats). `keep_pattern` is a compiled regex; turns
+    matching it are never summarised (e.g. medication names for onboarding).
+    """
+    original = [t for t in transcript_log or [] if (t.get("text") or "").strip()]
+    stats = {"turns_before": len(original), "tokens_before": transcript_tokens(original)}
+
+    turns = []
+    for turn in original:
+        # A bare "yes" that answers a question is the answer, not filler.
+        answers = turns and turns[-1]["role"] != turn["role"] and turns[-1]["text"].rstrip().endswith("?")
+        if is_filler(turn["text"]) and not answers:
+            continue
+        turns.append(turn)
+    turns = merge_same_role(turns)
+
+    level = 1
+    while transcript_tokens(turns) > budget and level <= 3:
+        head, tail = turns[:-KEEP_RECENT_TURNS], turns[-KEEP_RECENT_TURNS:]
+        if not head:
+            break
+        compacted, run = [], []
+
+        def flush():
+            summary = _summarize(run, level)
+            # Never let a summary cost more than the turns it replaces.
+            compacted.extend([summary] if transcript_tokens([summary]) < transcript_tokens(run) else run)
+            run.clear()
+
+        for turn in head:
+            if _keep(turn, keep_pattern):
+                if run:
+                    flush()
+                compacted.append(turn)
+                continue
+            run.append(turn)
+            if len(run) >= SUMMARY_GROUP_SIZE ** level:
+                flush()
+        if run:
+            flush()
+        turns = compacted + tail
+        level += 1
+
+    # Last resort: forget the oldest summaries until the prompt fits.
+    dropped = 0
+    while transcript_tokens(turns) > budget:
+        oldest = next((i for i, t in enumerate(turns[:-KEEP_RECENT_TURNS]) if not _keep(t, keep_pattern)), None)
+        if oldest is None:
+            break
+        turns.pop(oldest)
+        dropped += 1
+
+    turns = [{k: v for k, v in t.items() if not k.startswith("_")} for t in turns]
+    stats.update(turns_after=len(turns), tokens_after=transcript_tokens(turns),
+                 dropped=dropped, over_budget=transcript_tokens(turns) > budget)
+    return turns, stats
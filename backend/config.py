@@ -1,78 +1,189 @@
-import os
-import json
-from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
-from elevenlabs.client import ElevenLabs
-from google import genai
-
-load_dotenv()
-
-# ===== 1. FIRESTORE SETUP =====
-# This logic handles both Vercel (Env Var) and Local (File) authentication
-try:
-    # Option A: Production (Vercel)
-    firebase_creds_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
-
-    if firebase_creds_json:
-        print("Using Firebase Creds from Env Var")
-        cred_dict = json.loads(firebase_creds_json)
-        cred = credentials.Certificate(cred_dict)
-
-    # Option B: Local Development - Load from File
-    elif os.path.exists("serviceAccountKey.json"):
-        print("Using Firebase Creds from Local File")
-        cred = credentials.Certificate("serviceAccountKey.json")
-
-    else:
-        raise FileNotFoundError(
-            "No Firebase credentials found (checked Env Var 'FIREBASE_SERVICE_ACCOUNT' and local 'serviceAccountKey.json')"
-        )
-
-    # Initialize Firebase App (if not already running)
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-
-    db = firestore.client()
-    print("✓ Firestore initialized successfully")
-
-except Exception as e:
-    print(f"⚠️ Firestore error: {e}")
-    db = None
-
-# ===== 2. ELEVENLABS (Unified for 1 Agent) =====
-try:
-    el_client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
-
-    # Using the single ID provided in your .env for all agent types
-    ONBOARDING_AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID")
-    SERVICE_AGENT_ID = os.getenv("ELEVENLABS_REMINDER_AGENT_ID")
-    CANSUAL_AGENT_ID = os.getenv("ELEVENLABS_CASUAL_AGENT_ID")
-    AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID")
-
-    print("✓ ElevenLabs initialized")
-except Exception as e:
-    print(f"⚠️ ElevenLabs error: {e}")
-    el_client = None
-
-# ===== 3. GEMINI 2.0 =====
-try:
-    gemini_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    print("✓ Gemini 2.0 client initialized")
-except Exception as e:
-    print(f"⚠️ Gemini error: {e}")
-    gemini_client = None
-
-
-# ===== HELPERS =====
-def get_gemini_client():
-    return gemini_client
-
-
-def get_health_status():
-    return {
-        "status": "healthy",
-        "firestore": "connected" if db else "disconnected",
-        "elevenlabs": "connected" if el_client else "disconnected",
-        "gemini": "connected" if gemini_client else "disconnected",
-    }
+import os
+import json
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Clients are built on first use, not at import, so a cold start that only
+# serves /api/health never pays for credential parsing or SDK imports.
+# `db`, `el_client` and `gemini_client` below are stand-ins that build the
+# real client once, thread-safely; `if db:` still means "available".
+
+
+class LazyClient:
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._state = "idle"  # idle | ready | failed
+
+    def get(self):
+        """The real client, or None if it could not be created."""
+        if self._state == "idle":
+            with self._lock:
+                if self._state == "idle":
+                    try:
+                        self._client = self._factory()
+                        self._state = "ready"
+                        print(f"✓ {self._name} initialized")
+                    except Exception as e:
+                        print(f"⚠️ {self._name} error: {e}")
+                        self._state = "failed"
+        return self._client
+
+    def override(self, client):
+        """Uses `client` instead of building one (local stand-ins, benchmarks)."""
+        with self._lock:
+            self._client = client
+            self._state = "ready"
+
+    @property
+    def state(self):
+        return self._state
+
+    def __bool__(self):
+        return self.get() is not None
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            # copy/pickle probes must not trigger initialisation
+            raise AttributeError(attr)
+        client = self.get()
+        if client is None:
+            raise RuntimeError(f"{self._name} is not available")
+        return getattr(client, attr)
+
+
+# ===== 1. FIRESTORE SETUP =====
+# This logic handles both Vercel (Env Var) and Local (File) authentication
+_firebase_lock = threading.Lock()
+
+
+def get_firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _firebase_lock:
+        if firebase_admin._apps:
+            return firebase_admin.get_app()
+
+        # Option A: Production (Vercel)
+        firebase_creds_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
+
+        if firebase_creds_json:
+            print("Using Firebase Creds from Env Var")
+            cred = credentials.Certificate(json.loads(firebase_creds_json))
+
+        # Option B: Local Development - Load from File
+        elif os.path.exists("serviceAccountKey.json"):
+            print("Using Firebase Creds from Local File")
+            cred = credentials.Certificate("serviceAccountKey.json")
+
+        else:
+            raise FileNotFoundError(
+                "No Firebase credentials found (checked Env Var 'FIREBASE_SERVICE_ACCOUNT' and local 'serviceAccountKey.json')"
+            )
+
+        return firebase_admin.initialize_app(cred)
+
+
+# "memory" keeps all data in-process (storage.MemoryFirestore): offline
+# benchmarks and profiling only, nothing is persisted.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+
+
+def _make_db():
+    if STORAGE_BACKEND == "memory":
+        from storage import MemoryFirestore
+
+        return MemoryFirestore()
+
+    from firebase_admin import firestore
+    from metrics import instrument_firestore
+
+    instrument_firestore()
+    return firestore.client(get_firebase_app())
+
+
+def _make_async_db():
+    if STORAGE_BACKEND == "memory":
+        raise RuntimeError("the async server needs STORAGE_BACKEND=firestore")
+
+    from firebase_admin import firestore_async
+
+    return firestore_async.client(get_firebase_app())
+
+
+db = LazyClient("Firestore", _make_db)
+# Only for the async server (aio_app.py); binds to the event loop that first uses it.
+async_db = LazyClient("Firestore (async)", _make_async_db)
+
+# ===== 2. ELEVENLABS (Unified for 1 Agent) =====
+# Using the single ID provided in your .env for all agent types
+ONBOARDING_AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID")
+SERVICE_AGENT_ID = os.getenv("ELEVENLABS_REMINDER_AGENT_ID")
+CANSUAL_AGENT_ID = os.getenv("ELEVENLABS_CASUAL_AGENT_ID")
+AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID")
+
+
+def _make_el_client():
+    from elevenlabs.client import ElevenLabs
+
+    return ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+
+
+def _make_async_el_client():
+    from elevenlabs.client import AsyncElevenLabs
+
+    return AsyncElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+
+
+el_client = LazyClient("ElevenLabs", _make_el_client)
+async_el_client = LazyClient("ElevenLabs (async)", _make_async_el_client)
+
+# ===== 3. GEMINI 2.0 =====
+
+
+def _make_gemini_client():
+    from google import genai
+
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+gemini_client = LazyClient("Gemini 2.0 client", _make_gemini_client)
+
+CLIENTS = {"firestore": db, "elevenlabs": el_client, "gemini": gemini_client}
+
+
+# ===== HELPERS =====
+def get_db():
+    return db.get()
+
+
+def get_el_client():
+    return el_client.get()
+
+
+def get_gemini_client():
+    return gemini_client.get()
+
+
+def prewarm(names=None):
+    """Builds clients on a background thread so the first request does not wait."""
+    clients = [CLIENTS[name] for name in (names or CLIENTS)]
+    thread = threading.Thread(target=lambda: [c.get() for c in clients], name="client-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_health_status(deep=False):
+    """With deep=False, clients not yet built are reported as 'idle' instead of being created."""
+    status = {"status": "healthy"}
+    for name, client in CLIENTS.items():
+        if not deep and client.state == "idle":
+            status[name] = "idle"
+        else:
+            status[name] = "connected" if client.get() is not None else "disconnected"
+    return status
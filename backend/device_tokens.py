@@ -0,0 +1,103 @@
+"""
+device_tokens.py - FCM Device Token Registry
+A user's device tokens live in the `fcm_tokens` array on their users
+document, so lookups are served by the profile cache. Pushes are handed
+to messaging.send_each 500 at a time; the SDK still makes one HTTP request
+per message (FCM retired its batch endpoint), but sends them concurrently.
+Tokens FCM reports as unregistered are removed from the registry.
+"""
+
+import threading
+
+from firebase_admin import messaging
+from google.cloud import firestore
+
+from config import db, get_firebase_app
+from metrics import timed
+from profile_cache import profile_cache
+from storage import users
+
+FCM_BATCH_SIZE = 500
+WRITE_BATCH_SIZE = 500
+
+# Errors meaning the token will never work again.
+DEAD_TOKEN_ERRORS = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+
+_stats_lock = threading.Lock()
+# "batches" counts send_each calls; "messages" is the number of FCM requests.
+_stats = {"batches": 0, "messages": 0, "succeeded": 0, "failed": 0, "pruned": 0}
+
+
+def register_token(user_id, token):
+    users.set(user_id, {
+        "fcm_tokens": firestore.ArrayUnion([token]),
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+    profile_cache.invalidate(user_id)
+
+
+def unregister_token(user_id, token):
+    users.update(user_id, {"fcm_tokens": firestore.ArrayRemove([token])})
+    profile_cache.invalidate(user_id)
+
+
+def get_tokens(user_id):
+    return list((profile_cache.get(user_id) or {}).get("fcm_tokens", []))
+
+
+def get_tokens_many(user_ids):
+    """{user_id: [tokens]}; profile-cache misses are read in one round trip."""
+    profiles = profile_cache.get_many(user_ids)
+    return {user_id: list((data or {}).get("fcm_tokens", [])) for user_id, data in profiles.items()}
+
+
+def prune_tokens(dead):
+    """Removes {user_id: [tokens]} from the registry, 500 users per write batch."""
+    items = list(dead.items())
+    for i in range(0, len(items), WRITE_BATCH_SIZE):
+        batch = db.batch()
+        for user_id, tokens in items[i:i + WRITE_BATCH_SIZE]:
+            batch.update(users.ref(user_id), {"fcm_tokens": firestore.ArrayRemove(tokens)})
+        batch.commit()
+        for user_id, _ in items[i:i + WRITE_BATCH_SIZE]:
+            profile_cache.invalidate(user_id)
+
+
+def send_messages(items):
+    """
+    Sends (user_id, token, message) items in send_each batches of FCM_BATCH_SIZE.
+    Returns one result dict per item, in order, and prunes dead tokens.
+    """
+    results, dead = [], {}
+    for i in range(0, len(items), FCM_BATCH_SIZE):
+        chunk = items[i:i + FCM_BATCH_SIZE]
+        with timed("fcm", "send_each"):
+            response = messaging.send_each([message for _, _, message in chunk], app=get_firebase_app())
+        for (user_id, token, _), sent in zip(chunk, response.responses):
+            result = {"user_id": user_id, "token": token, "success": sent.success}
+            if sent.success:
+                result["message_id"] = sent.message_id
+            else:
+                result["error"] = str(sent.exception)
+                if isinstance(sent.exception, DEAD_TOKEN_ERRORS):
+                    dead.setdefault(user_id, []).append(token)
+            results.append(result)
+        with _stats_lock:
+            _stats["batches"] += 1
+            _stats["messages"] += len(chunk)
+            _stats["succeeded"] += response.success_count
+            _stats["failed"] += response.failure_count
+
+    if dead:
+        try:
+            prune_tokens(dead)
+            with _stats_lock:
+                _stats["pruned"] += sum(len(tokens) for tokens in dead.values())
+        except Exception as e:
+            print(f"⚠️ Could not prune dead FCM tokens: {e}")
+    return results
+
+
+def fcm_stats():
+    with _stats_lock:
+        return dict(_stats)
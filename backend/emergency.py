@@ -0,0 +1,242 @@
+"""
+emergency.py - SOS Fan-out
+Alerts every emergency contact of a user at once: a WhatsApp message to
+each number and an FCM push to each device of the contact (tokens on the
+contact entry, or registered to the contact's own user_id). Sends
+start before anything is read or written: a contact's registered devices
+are looked up inside the fan-out. Delivery results are merged onto the
+emergency call log by a separate recorder pool once that log exists, so
+send workers never wait on Firestore.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import messaging
+from google.cloud import firestore
+
+from config import get_firebase_app
+from device_tokens import get_tokens
+from metrics import timed
+from storage import call_logs
+
+SOS_RESPONSE_BUDGET_MS = int(os.getenv("SOS_RESPONSE_BUDGET_MS", "300"))
+SOS_WORKERS = int(os.getenv("SOS_WORKERS", "16"))
+SOS_RECORD_WORKERS = 2
+
+_stats_lock = threading.Lock()
+_stats = {"incidents": 0, "no_contacts": 0, "delivered": 0, "failed": 0}
+_first_notification_ms = deque(maxlen=500)
+
+
+def alert_message(profile, user_id):
+    name = (profile or {}).get("full_name") or f"user {user_id}"
+    return f"🚨 SOS: {name} pressed the emergency button in VoiceCare. Please check on them right away."
+
+
+def send_push(token, title, body, data=None):
+    """One high-priority FCM notification."""
+    try:
+        with timed("fcm", "send"):
+            message_id = messaging.send(messaging.Message(
+                notification=messaging.Notification(title=title, body=body),
+                data=data or {},
+                token=token,
+                android=messaging.AndroidConfig(priority="high"),
+            ), app=get_firebase_app())
+        return {"success": True, "message_id": message_id}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def record_delivery(call_id, key, result, notified_name, first_notification_ms):
+    """Merges one delivery result onto the call log."""
+    update = {"emergency_deliveries": {key: result}}
+    if notified_name:
+        update["emergency_contacts_notified"] = firestore.ArrayUnion([notified_name])
+    if first_notification_ms is not None:
+        update["first_notification_ms"] = first_notification_ms
+    call_logs.set(call_id, update, merge=True)
+
+
+def _push_tokens(contact):
+    """Tokens stored on the contact entry itself (no Firestore read)."""
+    tokens = list(contact.get("fcm_tokens") or [])
+    if contact.get("fcm_token"):
+        tokens.append(contact["fcm_token"])
+    return list(dict.fromkeys(tokens))
+
+
+def _delivery_key(channel, target):
+    # Field names must not contain '.', and phone numbers carry a '+'.
+    return f"{channel}_{re.sub(r'[^A-Za-z0-9]', '', target)[-24:]}"
+
+
+class SosFanout:
+    """Handle on one incident's in-flight deliveries."""
+
+    def __init__(self, call_id, total, clock, record=None):
+        self.call_id = call_id
+        self.total = total
+        self.clock = clock
+        self.started = clock()
+        # record(entries) persists delivery records; it is only called once
+        # the call log exists, and entries finished earlier are held until then
+        self._record = record or (lambda entries: None)
+        self._logged = False
+        self._unrecorded = []
+        self.first_sent = threading.Event()
+        self.first_notification_ms = None
+        self.results = []
+        # Contacts whose registered devices are still being looked up
+        self.pending_lookups = 0
+        self._lock = threading.Lock()
+
+    def expect(self, count):
+        """Adds deliveries discovered after dispatch (a contact's devices)."""
+        with self._lock:
+            self.total += count
+            self.pending_lookups -= 1
+
+    def mark_logged(self):
+        """Called once the call log exists; records the deliveries held until then."""
+        with self._lock:
+            self._logged = True
+            held, self._unrecorded = self._unrecorded, []
+        if held:
+            self._record(held)
+
+    def add_record(self, entry):
+        """Records one delivery now if the call log exists, else holds it."""
+        with self._lock:
+            if not self._logged:
+                self._unrecorded.append(entry)
+                return
+        self._record([entry])
+
+    def wait_first(self, timeout):
+        return self.first_sent.wait(max(timeout, 0))
+
+    def snapshot(self):
+        with self._lock:
+            sent = sum(1 for r in self.results if r["success"])
+            return {
+                "contacts_targeted": self.total,
+                "sent": sent,
+                "failed": len(self.results) - sent,
+                "pending": self.total - len(self.results),
+                "pending_lookups": self.pending_lookups,
+                "first_notification_ms": self.first_notification_ms,
+            }
+
+
+class SosDispatcher:
+    def __init__(self, send_whatsapp, send_push=send_push, record=record_delivery,
+                 workers=SOS_WORKERS, clock=time.perf_counter):
+        """
+        Args:
+            send_whatsapp (callable): (number, text) -> result dict, or None when unavailable
+            send_push (callable): (token, title, body, data) -> result dict
+            record (callable): persists one delivery onto the call log
+        """
+        self.send_whatsapp = send_whatsapp
+        self.send_push = send_push
+        self.record = record
+        self.clock = clock
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sos")
+        # Firestore writes run here, never on the send pool
+        self._recorder = ThreadPoolExecutor(max_workers=SOS_RECORD_WORKERS, thread_name_prefix="sos-record")
+
+    def dispatch(self, call_id, contacts, text, data=None):
+        """
+        Starts every send whose target is already known, without touching
+        Firestore; contacts with their own account get their devices looked
+        up on the pool and pushed from there.
+        """
+        deliveries, lookups = [], []
+        for contact in contacts or []:
+            name = contact.get("name") or contact.get("number")
+            if contact.get("number") and self.send_whatsapp:
+                deliveries.append(("whatsapp", contact["number"], name))
+            tokens = _push_tokens(contact)
+            for token in tokens:
+                deliveries.append(("push", token, name))
+            if contact.get("user_id"):
+                # Family members with their own VoiceCare account
+                lookups.append((contact["user_id"], name, set(tokens)))
+
+        fanout = SosFanout(call_id, len(deliveries), self.clock,
+                           record=lambda entries: self._recorder.submit(self._record_all, call_id, entries))
+        fanout.pending_lookups = len(lookups)
+        for channel, target, name in deliveries:
+            self._pool.submit(self._deliver, fanout, channel, target, name, text, data)
+        for user_id, name, known in lookups:
+            self._pool.submit(self._deliver_to_account, fanout, user_id, name, known, text, data)
+
+        with _stats_lock:
+            _stats["incidents"] += 1
+            _stats["no_contacts"] += 0 if deliveries or lookups else 1
+        if not deliveries and not lookups:
+            print(f"⚠️ SOS {call_id}: no emergency contacts to notify")
+        return fanout
+
+    def _deliver_to_account(self, fanout, user_id, name, known, text, data):
+        try:
+            tokens = [t for t in get_tokens(user_id) if t not in known]
+        except Exception as e:
+            print(f"❌ SOS {fanout.call_id}: could not read devices of {user_id}: {e}")
+            tokens = []
+        fanout.expect(len(tokens))
+        for token in tokens:
+            self._pool.submit(self._deliver, fanout, "push", token, name, text, data)
+
+    def _deliver(self, fanout, channel, target, name, text, data):
+        if channel == "whatsapp":
+            result = self.send_whatsapp(target, text)
+        else:
+            result = self.send_push(target, "SOS alert", text, {**(data or {}), "call_id": fanout.call_id})
+        result = {
+            "channel": channel,
+            "contact": name,
+            "success": bool(result.get("success")),
+            "error": result.get("error"),
+            "sent_ms": round((self.clock() - fanout.started) * 1000, 1),
+        }
+
+        first = None
+        with fanout._lock:
+            fanout.results.append(result)
+            if result["success"] and fanout.first_notification_ms is None:
+                first = fanout.first_notification_ms = result["sent_ms"]
+        with _stats_lock:
+            _stats["delivered" if result["success"] else "failed"] += 1
+            if first is not None:
+                _first_notification_ms.append(first)
+        if first is not None:
+            fanout.first_sent.set()
+            print(f"✓ SOS {fanout.call_id}: first contact notified after {first} ms")
+
+        fanout.add_record((_delivery_key(channel, target), result, name if result["success"] else None, first))
+
+    def _record_all(self, call_id, entries):
+        for key, result, notified_name, first in entries:
+            try:
+                self.record(call_id, key, result, notified_name, first)
+            except Exception as e:
+                print(f"❌ SOS {call_id}: could not record delivery: {e}")
+
+
+def sos_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+        samples = sorted(_first_notification_ms)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else None
+
+    stats["first_notification_ms"] = {"p50": pct(0.5), "p95": pct(0.95), "max": samples[-1] if samples else None}
+    return stats
@@ -0,0 +1,139 @@
+"""
+extraction_cache.py - Cached Gemini JSON Extraction
+Results are keyed by a hash of (prompt template version, model, normalised
+transcript), so client retries and identical transcripts never pay for a
+second LLM call. Tier 1 is an in-process LRU; tier 2 (opt-in with
+EXTRACTION_CACHE_FIRESTORE=1) is the 'extraction_cache' collection, shared
+across server workers.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from config import db, get_gemini_client
+from metrics import timed
+
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "1024"))
+EXTRACTION_CACHE_TTL = timedelta(days=int(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "7")))
+USE_FIRESTORE_TIER = os.getenv("EXTRACTION_CACHE_FIRESTORE") == "1"
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(transcript_log):
+    """Role + whitespace-collapsed text per turn; timestamps do not affect the key."""
+    lines = []
+    for turn in transcript_log or []:
+        role = (turn.get("role") or "").lower()
+        text = _WHITESPACE.sub(" ", turn.get("text") or "").strip()
+        lines.append(f"{role}: {text}")
+    return "\n".join(lines)
+
+
+def cache_key(template_version, model, transcript_log):
+    raw = f"{template_version}\x00{model}\x00{normalize_transcript(transcript_log)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, max_entries=EXTRACTION_CACHE_SIZE, ttl=EXTRACTION_CACHE_TTL, store=None):
+        """
+        Args:
+            max_entries (int): in-memory LRU bound
+            ttl (timedelta): lifetime of an entry in either tier
+            store: optional Firestore-like client for the shared tier
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(entry[1])
+            self._entries.pop(key, None)
+
+        if self.store:
+            try:
+                doc = self.store.collection("extraction_cache").document(key).get()
+                data = doc.to_dict() if doc.exists else None
+                if data and data.get("expires_at") and data["expires_at"] > now:
+                    self._remember(key, data["result"], data["expires_at"])
+                    with self._lock:
+                        self._stats["store_hits"] += 1
+                    return copy.deepcopy(data["result"])
+            except Exception as e:
+                print(f"⚠️ Extraction cache read failed: {e}")
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def _remember(self, key, result, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def put(self, key, result, meta=None):
+        expires_at = datetime.now(timezone.utc) + self.ttl
+        self._remember(key, result, expires_at)
+        if self.store:
+            try:
+                # 'expires_at' doubles as the Firestore TTL-policy field.
+                self.store.collection("extraction_cache").document(key).set({
+                    "result": result,
+                    "expires_at": expires_at,
+                    **(meta or {}),
+                })
+            except Exception as e:
+                print(f"⚠️ Extraction cache write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        hits = stats["memory_hits"] + stats["store_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+        return stats
+
+
+extraction_cache = ExtractionCache(store=db if USE_FIRESTORE_TIER else None)
+
+
+def generate_json(template_version, model, transcript_log, prompt):
+    """
+    Runs a JSON-mode Gemini extraction for `prompt`, answering from the cache
+    when the same template/model/transcript was already analysed.
+    """
+    key = cache_key(template_version, model, transcript_log)
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with timed("gemini", "generate_content"):
+        response = get_gemini_client().models.generate_content(
+            model=model,
+            contents=prompt,
+            config={"response_mime_type": "application/json"},
+        )
+    result = json.loads(response.text)
+    extraction_cache.put(key, result, {"template_version": template_version, "model": model})
+    return result
@@ -0,0 +1,347 @@
+"""
+jobs.py - Post-call Processing Queue
+Bounded worker pool for slow post-call work (Gemini extraction + Firestore
+writes) so API requests can return as soon as the job is queued.
+Job state and payload are mirrored to the 'jobs' collection by a
+background sync thread, so any server worker can answer a status request.
+Unfinished jobs are leased to the process holding them; when a process
+dies its leases run out and another process re-claims and reruns them.
+"""
+
+import json
+import os
+import queue
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from google.cloud import firestore
+
+from config import db
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "500"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs kept in memory for status lookups.
+JOB_HISTORY = 2000
+JOB_WORKER_ID = os.getenv("JOB_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+# How often leases are renewed and stale jobs looked for.
+JOB_SWEEP_SECONDS = int(os.getenv("JOB_SWEEP_SECONDS", "30"))
+JOB_RECLAIM_LIMIT = 50
+WRITE_BATCH_SIZE = 500
+TERMINAL = ("succeeded", "failed")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _jobs_ref(job_id):
+    return db.collection("jobs").document(job_id)
+
+
+@firestore.transactional
+def _claim_jobs(transaction, refs, owner, now, max_attempts):
+    """
+    Leases jobs whose lease ran out to `owner`; concurrent claims conflict,
+    so one process wins. Jobs out of attempts are marked 'failed'.
+    Returns the claimed job docs.
+    """
+    claimed = []
+    for snap in transaction.get_all(refs):
+        data = snap.to_dict() or {}
+        lease_expires_at = data.get("lease_expires_at")
+        if not snap.exists or data.get("status") in TERMINAL or lease_expires_at is None or lease_expires_at > now:
+            continue
+        if data.get("attempts", 0) >= max_attempts:
+            transaction.update(snap.reference, {
+                "status": "failed", "error": data.get("error") or "worker lost", "lease_expires_at": None,
+                "payload": firestore.DELETE_FIELD,
+            })
+            print(f"❌ Job {snap.id} failed after {max_attempts} attempts")
+            continue
+        transaction.update(snap.reference, {
+            "lease_owner": owner,
+            "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+        })
+        claimed.append(data)
+    return claimed
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, max_depth=JOB_QUEUE_SIZE, max_attempts=JOB_MAX_ATTEMPTS,
+                 backoff_seconds=2.0, persist=False, owner=JOB_WORKER_ID):
+        """
+        Args:
+            workers (int): threads processing jobs
+            max_depth (int): queued jobs before submit() raises QueueFull
+            max_attempts (int): tries per job, with jittered exponential backoff
+            persist (bool): mirror jobs to Firestore and re-claim jobs of dead processes
+            owner (str): lease owner id of this process
+        """
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.persist = persist
+        self.owner = owner
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._handlers = {}
+        self._jobs = {}
+        self._dirty = set()
+        self._wake = threading.Event()
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._syncer = None
+        self._stats = {
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retried": 0,
+            "in_flight": 0,
+            "processing_ms_total": 0.0,
+            "processing_ms_max": 0.0,
+            "wait_ms_total": 0.0,
+            "reclaimed": 0,
+            "sync_errors": 0,
+        }
+
+    def register(self, kind, fn):
+        """Handler for jobs of `kind`; its arguments must be JSON-serialisable."""
+        self._handlers[kind] = fn
+
+    def _ensure_workers(self):
+        # Started lazily so forked server workers each get their own pool.
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self.persist and not (self._syncer and self._syncer.is_alive()):
+            self._syncer = threading.Thread(target=self._sync_loop, name="job-sync", daemon=True)
+            self._syncer.start()
+
+    def start(self):
+        """Starts the workers (and sync thread) without waiting for a submit."""
+        with self._lock:
+            self._ensure_workers()
+
+    def _record(self, job_id, **changes):
+        """Updates a job; the sync thread writes it to Firestore, never the caller."""
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes, updated_at=datetime.now(timezone.utc).isoformat())
+            if self.persist:
+                self._dirty.add(job_id)
+        if self.persist:
+            self._wake.set()
+
+    @staticmethod
+    def _public(job):
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    def submit(self, kind, *args, **kwargs):
+        """Queues the `kind` handler with (*args, **kwargs). Returns the job id."""
+        fn = self._handlers[kind]
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "_call": (fn, args, kwargs),
+            "_payload": json.dumps({"args": args, "kwargs": kwargs}, default=str),
+            "_enqueued": time.perf_counter(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._ensure_workers()
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise QueueFull(f"{self._queue.qsize()} jobs already queued")
+        with self._lock:
+            self._stats["submitted"] += 1
+        self._record(job_id)
+        return job_id
+
+    def _requeue(self, job_id):
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            self._finish(job_id, "failed", error="queue full on retry")
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._stats["succeeded" if status == "succeeded" else "failed"] += 1
+        self._record(job_id, status=status, result=result, error=error)
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            done = [jid for jid, j in self._jobs.items() if j["status"] in TERMINAL and jid not in self._dirty]
+            for jid in done[:max(0, len(done) - JOB_HISTORY)]:
+                self._jobs.pop(jid, None)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                fn, args, kwargs = job["_call"]
+                attempt = job["attempts"] + 1
+                self._stats["in_flight"] += 1
+                self._stats["wait_ms_total"] += (time.perf_counter() - job["_enqueued"]) * 1000
+            self._record(job_id, status="running", attempts=attempt)
+
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                error = None
+            except Exception as e:
+                result, error = None, str(e)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self._lock:
+                self._stats["in_flight"] -= 1
+                self._stats["processing_ms_total"] += elapsed_ms
+                self._stats["processing_ms_max"] = max(self._stats["processing_ms_max"], elapsed_ms)
+
+            if error is None:
+                self._finish(job_id, "succeeded", result=result)
+            elif attempt < self.max_attempts:
+                delay = self.backoff_seconds * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                print(f"⚠️ Job {job_id} attempt {attempt} failed, retrying in {delay:.1f}s: {error}")
+                with self._lock:
+                    self._stats["retried"] += 1
+                    job["_enqueued"] = time.perf_counter() + delay
+                self._record(job_id, status="retrying", error=error)
+                threading.Timer(delay, self._requeue, args=(job_id,)).start()
+            else:
+                print(f"❌ Job {job_id} failed after {attempt} attempts: {error}")
+                self._finish(job_id, "failed", error=error)
+
+    def _sync_loop(self):
+        while True:
+            self._wake.wait(JOB_SWEEP_SECONDS)
+            self._wake.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                with self._lock:
+                    self._stats["sync_errors"] += 1
+                print(f"⚠️ Job sync failed: {e}")
+                time.sleep(1)
+
+    def sync(self, now=None):
+        """
+        Writes changed jobs to Firestore. Every JOB_SWEEP_SECONDS it also
+        renews this process's leases and re-claims jobs whose lease ran out.
+        """
+        now = now or datetime.now(timezone.utc)
+        lease = now + timedelta(seconds=JOB_LEASE_SECONDS)
+        sweep = time.monotonic() >= self._next_sweep
+        with self._lock:
+            ids = [jid for jid, job in self._jobs.items()
+                   if jid in self._dirty or (sweep and job["status"] not in TERMINAL)]
+            writes = []
+            for jid in ids:
+                job = self._jobs[jid]
+                doc = {**self._public(job), "lease_owner": self.owner}
+                if job["status"] in TERMINAL:
+                    doc.update(lease_expires_at=None, payload=firestore.DELETE_FIELD)
+                else:
+                    doc.update(lease_expires_at=lease, payload=job["_payload"])
+                writes.append((jid, doc))
+            self._dirty.difference_update(ids)
+        try:
+            for i in range(0, len(writes), WRITE_BATCH_SIZE):
+                batch = db.batch()
+                for jid, doc in writes[i:i + WRITE_BATCH_SIZE]:
+                    batch.set(_jobs_ref(jid), doc, merge=True)
+                batch.commit()
+        except Exception:
+            with self._lock:
+                self._dirty.update(jid for jid, _ in writes)
+            raise
+        if sweep:
+            self._next_sweep = time.monotonic() + JOB_SWEEP_SECONDS
+            self.reclaim(now)
+
+    def reclaim(self, now=None):
+        """Re-queues jobs of processes that stopped renewing their lease. Returns their ids."""
+        now = now or datetime.now(timezone.utc)
+        room = self._queue.maxsize - self._queue.qsize() if self._queue.maxsize else JOB_RECLAIM_LIMIT
+        if room <= 0:
+            return []
+        stale = db.collection("jobs") \
+            .where(filter=firestore.FieldFilter("lease_expires_at", "<=", now)) \
+            .order_by("lease_expires_at") \
+            .limit(min(room, JOB_RECLAIM_LIMIT)) \
+            .stream()
+        refs = [doc.reference for doc in stale]
+        claimed = _claim_jobs(db.transaction(), refs, self.owner, now, self.max_attempts) if refs else []
+
+        reclaimed = []
+        for data in claimed:
+            job_id, fn = data["job_id"], self._handlers.get(data.get("kind"))
+            if fn is None or not data.get("payload"):
+                print(f"⚠️ Job {job_id} has no handler or payload here; its lease will run out again")
+                continue
+            payload = json.loads(data["payload"])
+            job = {k: v for k, v in data.items() if k not in ("payload", "lease_owner", "lease_expires_at")}
+            job.update(
+                status="queued",
+                _call=(fn, tuple(payload["args"]), payload["kwargs"]),
+                _payload=data["payload"],
+                _enqueued=time.perf_counter(),
+            )
+            with self._lock:
+                self._jobs[job_id] = job
+                self._ensure_workers()
+                self._stats["reclaimed"] += 1
+            self._record(job_id)
+            self._requeue(job_id)
+            reclaimed.append(job_id)
+        if reclaimed:
+            print(f"✓ Re-claimed {len(reclaimed)} job(s) from lost workers")
+        return reclaimed
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        processed = stats["succeeded"] + stats["failed"] + stats["retried"]
+        stats["processing_ms_avg"] = round(stats["processing_ms_total"] / processed, 2) if processed else None
+        started = processed + stats["in_flight"]
+        stats["wait_ms_avg"] = round(stats["wait_ms_total"] / started, 2) if started else None
+        return stats
+
+
+def get_job(job_id):
+    """Local lookup first, then the Firestore mirror written by other workers."""
+    job = job_queue.get(job_id)
+    if job is None and db:
+        doc = _jobs_ref(job_id).get()
+        if doc.exists:
+            job = {k: v for k, v in doc.to_dict().items() if k not in ("payload", "lease_owner", "lease_expires_at")}
+    return job
+
+
+job_queue = JobQueue(persist=True)
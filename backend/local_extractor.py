@@ -0,0 +1,190 @@
+"""
+local_extractor.py - Rule-based Transcript Pre-extraction
+Most reminder calls are a couple of turns ("Okay I will take it now.").
+This tier reads them with keyword/regex/lexicon rules and reports a
+confidence; Gemini is only called when the rules are unsure.
+"""
+
+import os
+import re
+import threading
+import time
+
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_EXTRACTION_THRESHOLD", "0.8"))
+
+COMMON_MEDICATIONS = (
+    "aspirin", "paracetamol", "acetaminophen", "ibuprofen", "metformin", "insulin",
+    "amlodipine", "atorvastatin", "lisinopril", "losartan", "omeprazole", "levothyroxine",
+    "metoprolol", "warfarin", "clopidogrel", "vitamin d", "calcium", "thyroxine",
+)
+
+# Longer conversations carry nuance (worries, memories) the rules cannot see.
+MAX_LOCAL_USER_TURNS = 6
+MAX_LOCAL_USER_WORDS = 80
+
+# Affirmative phrasings with a dose as object only: a bare "taken" or
+# "done" also appears in "I haven't taken it yet", and "I just had" in
+# "I just had breakfast".
+DOSE = r"(it|them|my (pills?|medicines?|medications?|tablets?|dose|meds|\w+ (pills?|tablets?))|my (" + \
+    "|".join(map(re.escape, COMMON_MEDICATIONS)) + "))"
+ACTION_PATTERNS = {
+    "completed": re.compile(
+        rf"\b(i took {DOSE}|(i've|i have|yes,? i've|yes,? i have) (already |just )?(taken|had) {DOSE}|"
+        rf"(will|i'll|going to) take (it|them) now|taking (it|them) now|(already|just) (took|had|taken) {DOSE})\b"
+    ),
+    "delayed": re.compile(
+        r"\b(later|after (lunch|dinner|breakfast|my meal)|take (it|them) after|in (\d+|a few|ten|five|fifteen|twenty) (min|minute|hour)s?|"
+        r"call (me )?back|remind me (again|later)|not (right )?now|give me (a|some) (minute|time))\b"
+    ),
+    "refused": re.compile(
+        r"\b(won't|will not|don't want|do not want|refuse|not taking|stop calling|no more pills)\b"
+    ),
+}
+
+# A negator this close to a match (before it, or after it in the same
+# sentence: "I took it yesterday but not today") flips or qualifies its
+# meaning; such calls go to the LLM instead of being read locally.
+NEGATORS = {"not", "never", "forgot", "forget", "yet"}  # plus any "...n't"
+NEGATION_WINDOW = 4
+DOSE_WORDS = re.compile(r"\b(take|taken|took|taking|had|done|finished)\b")
+_TOKEN = re.compile(r"[a-z']+")
+_SENTENCE_END = re.compile(r"[.!?]")
+
+MOOD_LEXICON = {
+    "happy": ("happy", "good", "great", "wonderful", "fine", "lovely", "glad"),
+    "sad": ("sad", "upset", "crying", "miss ", "unhappy", "down today"),
+    "lonely": ("lonely", "alone", "no one", "nobody"),
+    "anxious": ("worried", "anxious", "scared", "nervous", "afraid", "tense"),
+    "excited": ("excited", "can't wait", "looking forward"),
+    "nostalgic": ("remember when", "used to", "back in my day", "old days"),
+}
+
+RED_FLAG_PATTERN = re.compile(
+    r"\b(chest pain|can't breathe|cannot breathe|short of breath|fell|fallen|fall down|dizzy|faint|"
+    r"bleeding|unconscious|stroke|heart attack|help me|emergency|severe pain)\b"
+)
+WORRY_PATTERN = re.compile(r"\b(worried|worry|scared|afraid|concerned) (about|that|of)\b([^.!?]*)")
+ALLERGY_PATTERN = re.compile(r"\ballergic to ([a-z][a-z\- ]{2,30}?)(?:[.,!?]| and |$)")
+
+_MOOD_PATTERNS = {mood: re.compile("|".join(map(re.escape, cues))) for mood, cues in MOOD_LEXICON.items()}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "local": {"count": 0, "ms_total": 0.0},
+    "llm": {"count": 0, "ms_total": 0.0},
+    "deferred": {"count": 0, "ms_total": 0.0},
+}
+
+
+def _negated(text, start, end):
+    """True if a negator is within NEGATION_WINDOW tokens before text[start:end], or after it in its sentence."""
+    before = _TOKEN.findall(text[:start])[-NEGATION_WINDOW:]
+    after = _TOKEN.findall(_SENTENCE_END.split(text[end:], 1)[0])[:NEGATION_WINDOW]
+    return any(t in NEGATORS or t.endswith("n't") for t in before + after)
+
+
+def _affirmed(pattern, text):
+    """(matched, negated): whether `pattern` occurs un-negated, and whether any occurrence was negated."""
+    matched = negated = False
+    for m in pattern.finditer(text):
+        if _negated(text, m.start(), m.end()):
+            negated = True
+        else:
+            matched = True
+    return matched, negated
+
+
+def extract_reminder_signals(transcript_log):
+    """
+    Returns (analysis, confidence). `analysis` follows the reminder-analysis
+    schema plus action_status, medications_mentioned and allergies_mentioned.
+    """
+    user_lines = [
+        (t.get("text") or "").lower().strip()
+        for t in transcript_log or [] if t.get("role") == "user"
+    ]
+    text = " ".join(user_lines)
+    words = len(text.split())
+
+    actions, moods = [], []
+    # "not taken", "haven't had it", "never took" even where no pattern matched
+    negated = _affirmed(DOSE_WORDS, text)[1]
+    # Only the words around a match are checked, so refusals ("won't") still count.
+    for status, pattern in ACTION_PATTERNS.items():
+        matched, flipped = _affirmed(pattern, text)
+        negated = negated or flipped
+        if matched:
+            actions.append(status)
+    for mood, pattern in _MOOD_PATTERNS.items():
+        matched, flipped = _affirmed(pattern, text)
+        negated = negated or flipped
+        if matched:
+            moods.append(mood)
+    red_flags = bool(RED_FLAG_PATTERN.search(text))
+    worries = [m.group(0).strip() for m in WORRY_PATTERN.finditer(text)]
+
+    analysis = {
+        "action_status": actions[0] if len(actions) == 1 else ("ignored" if not user_lines else "pending"),
+        "engagement_level": "low" if words < 15 else ("meaningful" if words < 60 else "high"),
+        "mood_detected": moods[0] if len(moods) == 1 else "neutral",
+        "comfort_provided": False,
+        "memory_anchors": [],
+        "topics_discussed": ["medication"] if actions else [],
+        "user_worries": worries,
+        "red_flags_detected": red_flags,
+        "medications_mentioned": [m for m in COMMON_MEDICATIONS if m in text],
+        "allergies_mentioned": [m.group(1).strip() for m in ALLERGY_PATTERN.finditer(text)],
+    }
+
+    confidence = 0.95
+    if not user_lines:
+        return analysis, confidence  # the senior never answered
+    if len(actions) != 1:
+        confidence -= 0.4  # no or conflicting answer to the reminder
+    if len(moods) > 1:
+        confidence -= 0.2
+    if negated:
+        confidence -= 0.5  # "I haven't taken it", "not feeling good": too easy to misread
+    if red_flags or worries:
+        confidence -= 0.5  # safety-relevant: always let the LLM look
+    if len(user_lines) > MAX_LOCAL_USER_TURNS or words > MAX_LOCAL_USER_WORDS:
+        confidence -= 0.4
+    return analysis, round(max(confidence, 0.0), 2)
+
+
+def _record(tier, started):
+    with _stats_lock:
+        _stats[tier]["count"] += 1
+        _stats[tier]["ms_total"] += (time.perf_counter() - started) * 1000
+
+
+def analyze_reminder_tiered(transcript_log, llm_analyze, threshold=LOCAL_CONFIDENCE_THRESHOLD):
+    """
+    Local rules first; `llm_analyze()` only when confidence < threshold.
+    With llm_analyze=None the LLM tier is deferred to batch_analysis.
+    Returns (analysis, tier, confidence).
+    """
+    started = time.perf_counter()
+    analysis, confidence = extract_reminder_signals(transcript_log)
+    if confidence >= threshold:
+        _record("local", started)
+        return analysis, "local", confidence
+    if llm_analyze is None:
+        _record("deferred", started)
+        return analysis, "deferred", confidence
+
+    started = time.perf_counter()
+    # Keep the rule-only fields; the LLM's answer wins where both exist.
+    analysis = {**analysis, **llm_analyze()}
+    _record("llm", started)
+    return analysis, "llm", confidence
+
+
+def tier_stats():
+    with _stats_lock:
+        stats = {tier: dict(values) for tier, values in _stats.items()}
+    total = sum(s["count"] for s in stats.values())
+    for values in stats.values():
+        values["ms_avg"] = round(values["ms_total"] / values["count"], 2) if values["count"] else None
+        values["share"] = round(values["count"] / total, 3) if total else None
+    return stats
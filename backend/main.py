@@ -1,164 +1,160 @@
 import os
-from flask import Flask, jsonify, request
+import time
+import uuid
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timezone
 from pydantic import ValidationError
-from google.cloud import firestore
-from twilio.rest import Client  # Added Twilio import
 
 # Import your models
-from models.onboarding import OnboardingCall, SeniorProfile
-from models.reminder import ReminderCall, ReminderDetails
 from models.emergency import EmergencyCall
-from models.casual import CasualTalkCall
-from models.common import CallLog
+from models.calls import CALL_LOG_ADAPTER, TRANSCRIPT_ADAPTER, call_category
 
 # Import config and helpers
-from config import db, el_client, AGENT_ID, CANSUAL_AGENT_ID, SERVICE_AGENT_ID, get_health_status
+from config import el_client, AGENT_ID, CANSUAL_AGENT_ID, SERVICE_AGENT_ID, get_health_status, prewarm
 from onboarding import process_onboarding_transcript
+from service_agent import get_dynamic_variables, get_service_context
+from profile_cache import profile_cache
+from transcripts import append_turns, load_transcript, save_call_log, save_call_logs
+from jobs import QueueFull, get_job, job_queue
+from extraction_cache import extraction_cache
+from local_extractor import tier_stats
 from calllogs import process_reminder_call_log
+from batch_analysis import analyze_pending_calls
 from scheduler import (
     check_and_trigger_calls,
     schedule_reminder,
     list_pending_reminders,
 )
+from device_tokens import fcm_stats, register_token, unregister_token
+from trigger_call import trigger_reminder_calls
+from emergency import SOS_RESPONSE_BUDGET_MS, SosDispatcher, alert_message, sos_stats
+from services.signed_url_pool import SignedUrlPool, fetch_signed_url
+from services.twilio_service import TwilioWhatsAppService
+from storage import call_logs, scheduled_tasks, users
+import wellbeing
+import metrics
 
 app = Flask(__name__)
 CORS(app)
+metrics.init_app(app)
 
-# --- SERVICE CLASSES ---
+# --- SERVICES ---
 
 
-class TwilioWhatsAppService:
-    def __init__(self):
-        """Initialize Twilio client with credentials from environment variables"""
-        self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        self.auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        self.from_whatsapp_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
+try:
+    whatsapp_service = TwilioWhatsAppService()
+except ValueError:
+    # Missing credentials should not stop the rest of the API from serving
+    print("⚠️ Twilio credentials missing. WhatsApp service will not work.")
+    whatsapp_service = None
 
-        # We initialize lazily or log a warning if creds are missing to prevent app crash
-        if not all([self.account_sid, self.auth_token, self.from_whatsapp_number]):
-            print("⚠️ Twilio credentials missing. WhatsApp service will not work.")
-            self.client = None
-        else:
-            self.client = Client(self.account_sid, self.auth_token)
-
-    def send_message(self, to_number, message_body):
-        """
-        Send a WhatsApp message to a specific number
-        Args:
-            to_number (str): Recipient's phone number (e.g., +919167586024)
-            message_body (str): The message content to send
-        """
-        if not self.client:
-            return {"success": False, "error": "Twilio not configured"}
+# Parallel SOS alerts to every emergency contact
+sos_dispatcher = SosDispatcher(whatsapp_service.send_message if whatsapp_service else None)
 
-        try:
-            # Twilio WhatsApp numbers must be prefixed with 'whatsapp:'
-            # Handle cases where input might already have the prefix
-            recipient = (
-                to_number
-                if to_number.startswith("whatsapp:")
-                else f"whatsapp:{to_number}"
-            )
-
-            # Handle sender prefix similarly
-            sender = (
-                self.from_whatsapp_number
-                if self.from_whatsapp_number.startswith("whatsapp:")
-                else f"whatsapp:{self.from_whatsapp_number}"
-            )
-
-            message = self.client.messages.create(
-                body=message_body, from_=sender, to=recipient
-            )
-
-            return {
-                "success": True,
-                "message_sid": message.sid,
-                "status": message.status,
-                "to": to_number,
-                "message": "Message sent successfully",
-            }
+# Opt-in: build the SDK clients on a background thread right after startup
+if os.getenv("PREWARM_CLIENTS") == "1":
+    prewarm()
 
-        except Exception as e:
-            print(f"Twilio Error: {str(e)}")
-            return {"success": False, "error": str(e), "to": to_number}
+# Pre-minted ElevenLabs signed URLs, one pool per agent
+signed_url_pool = SignedUrlPool(lambda agent_id: fetch_signed_url(el_client, agent_id))
+if os.getenv("ELEVENLABS_API_KEY"):
+    # Refilled in the background; the ElevenLabs client is built there on first use
+    signed_url_pool.warm([AGENT_ID, SERVICE_AGENT_ID, CANSUAL_AGENT_ID])
 
+# Post-call jobs; registered by kind so a re-claimed job can be rerun
+job_queue.register("onboarding", process_onboarding_transcript)
+job_queue.register("reminder", process_reminder_call_log)
+job_queue.start()
 
-# Initialize the service
-whatsapp_service = TwilioWhatsAppService()
+# Existing stats dicts, exported as gauges on /api/metrics
+metrics.register_collector("signed_url_pool", signed_url_pool.stats)
+metrics.register_collector("profile_cache", profile_cache.stats)
+metrics.register_collector("job_queue", job_queue.stats)
+metrics.register_collector("extraction_cache", extraction_cache.stats)
+metrics.register_collector("extraction_tiers", tier_stats)
+metrics.register_collector("sos", sos_stats)
+metrics.register_collector("fcm", fcm_stats)
 
 
-# --- HELPER FUNCTIONS ---
+# --- 1. VOICE SESSION MANAGEMENT ---
+SESSION_AGENTS = {
+    "onboarding": AGENT_ID,
+    "reminder": SERVICE_AGENT_ID,
+    "emergency": SERVICE_AGENT_ID,
+    "casual": CANSUAL_AGENT_ID,
+}
 
 
-def _normalize_transcript(entries):
-    """Ensures transcript entries match the Pydantic model format."""
-    now_iso = datetime.now(timezone.utc).isoformat()
-    return [
-        {
-            "role": i.get("role", "assistant"),
-            "text": i.get("text", ""),
-            "timestamp": i.get("timestamp") or now_iso,
+@app.route("/api/voice-session/start", methods=["POST"])
+def start_personalized_session():
+    """
+    Single entry point for every agent. Expects JSON:
+    { "agent_type": "onboarding"|"service", "user_id": "...",
+      "service_type": "reminder"|"emergency"|"casual", "reminder": {...} }
+    Returns a pooled signed URL plus the per-user dynamic variables and
+    prompt override the client passes when it opens the conversation.
+    """
+    try:
+        data = request.json or {}
+        user_id = data.get("user_id")
+        agent_type = data.get("agent_type", "service")
+        service_type = data.get("service_type", "casual")
+        session_key = "onboarding" if agent_type == "onboarding" else service_type
+
+        agent_id = SESSION_AGENTS.get(session_key)
+        if not agent_id:
+            return jsonify({"error": f"Unknown session type '{session_key}'"}), 400
+
+        response = {
+            "signed_url": signed_url_pool.get(agent_id),
+            "agent_id": agent_id,
+            "status": "success",
         }
-        for i in entries or []
-    ]
+        if user_id and session_key != "onboarding":
+            response["dynamic_variables"] = get_dynamic_variables(
+                user_id, service_type, data.get("reminder")
+            )
+            response["conversation_config_override"] = {
+                "agent": {"prompt": {"prompt": get_service_context(user_id, service_type)}}
+            }
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
-# --- 1. VOICE SESSION MANAGEMENT ---
-@app.route("/api/voice-session/start", methods=["GET"])
-def start_session():
-    """Generates the signed URL to start the ElevenLabs conversation."""
+def _signed_session(agent_id):
+    """Legacy start routes: a pooled signed URL, or 503 if the agent is not configured."""
+    if not agent_id:
+        return jsonify({"error": "Voice agent is not configured"}), 503
     try:
-        agent_id = AGENT_ID
-        response = el_client.conversational_ai.conversations.get_signed_url(
-            agent_id=agent_id
-        )
-        signed = (
-            getattr(response, "signed_url", None)
-            or getattr(response, "url", None)
-            or str(response)
-        )
+        signed = signed_url_pool.get(agent_id)
         return jsonify({"signed_url": signed, "status": "success"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/voice-session/start", methods=["GET"])
+def start_session():
+    """Generates the signed URL to start the ElevenLabs conversation."""
+    return _signed_session(AGENT_ID)
     
 @app.route("/api/reminder-voice-session/start", methods=["GET"])
 def start_reminder_session():
     """Generates the signed URL to start the ElevenLabs conversation."""
-    try:
-        # You might want to pass dynamic agent_ids based on service type here
-        agent_id = SERVICE_AGENT_ID
-        response = el_client.conversational_ai.conversations.get_signed_url(
-            agent_id=agent_id
-        )
-        signed = (
-            getattr(response, "signed_url", None)
-            or getattr(response, "url", None)
-            or str(response)
-        )
-        return jsonify({"signed_url": signed, "status": "success"})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # You might want to pass dynamic agent_ids based on service type here
+    return _signed_session(SERVICE_AGENT_ID)
     
 @app.route("/api/casual-voice-session/start", methods=["GET"])
 def start_casual_session():
     """Generates the signed URL to start the ElevenLabs conversation."""
-    try:
-        # You might want to pass dynamic agent_ids based on service type here
-        agent_id = CANSUAL_AGENT_ID
-        response = el_client.conversational_ai.conversations.get_signed_url(
-            agent_id=agent_id
-        )
-        signed = (
-            getattr(response, "signed_url", None)
-            or getattr(response, "url", None)
-            or str(response)
-        )
-        return jsonify({"signed_url": signed, "status": "success"})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # You might want to pass dynamic agent_ids based on service type here
+    return _signed_session(CANSUAL_AGENT_ID)
+
+@app.route("/api/voice-session/pool-stats", methods=["GET"])
+def signed_url_pool_stats():
+    """Hit/miss/refill counters for sizing the signed URL pool."""
+    return jsonify(signed_url_pool.stats())
 
 # voice session for reminder calls
 # @app.route("/api/voice-session/reminder", methods=["POST"])
@@ -199,6 +195,9 @@ def save_transcript():
     """
     Called when a session ends.
     Handles 'onboarding' (profile creation) and 'reminder' (call log saving).
+    The Gemini analysis runs on the job queue; poll /api/jobs/<job_id>.
+    If the turns were streamed to /api/voice-session/<call_id>/turns, send
+    just the call_id and an empty transcript.
     """
     try:
         data = request.json or {}
@@ -209,59 +208,193 @@ def save_transcript():
 
         if agent_type == "onboarding":
             # 1. Process transcript to get Profile and create initial reminders
-            result = process_onboarding_transcript(transcript_log, user_id)
-            return jsonify({"status": "success", "result": result})
-
+            job_id = job_queue.submit("onboarding", transcript_log, user_id, call_id)
         elif agent_type == "reminder":
             # 2. Process the conversation to extract sentiment and memory anchors
-            result = process_reminder_call_log(transcript_log, user_id, call_id)
-            return jsonify({"status": "success", "result": result})
-
-        return jsonify({"status": "success"})
+            job_id = job_queue.submit("reminder", transcript_log, user_id, call_id)
+        else:
+            return jsonify({"status": "success"})
+
+        return jsonify({
+            "status": "accepted",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}",
+        }), 202
+    except QueueFull as e:
+        return jsonify({"error": f"Processing queue is full: {e}"}), 503
     except Exception as e:
         print(f"ERROR in save_transcript: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/calls/log", methods=["POST"])
-def log_call_event():
-    """Logs the full call details to Firestore."""
+@app.route("/api/voice-session/<call_id>/turns", methods=["POST"])
+def append_transcript_turns(call_id):
+    """
+    Appends turns while the call is live, so end-of-call processing only
+    has to analyse what is already stored.
+    Expects JSON: { "user_id": "...", "seq": 0, "turns": [{role, text, timestamp}] }
+    `seq` numbers the client's batches from 0; resending a seq is ignored.
+    """
     try:
-        payload = request.json
-        agent_type = payload.get("agent_type")
-        service_type = payload.get("service_type", "casual")
-        call_data = payload.get("call", {})
+        data = request.json or {}
+        user_id = data.get("user_id")
+        seq = data.get("seq")
+        if not user_id or not isinstance(seq, int) or seq < 0:
+            return jsonify({"error": "Missing user_id or non-negative integer seq"}), 400
 
-        call_data["transcript"] = _normalize_transcript(call_data.get("transcript"))
+        turns = [t.model_dump(exclude_none=True) for t in TRANSCRIPT_ADAPTER.validate_python(data.get("turns") or [])]
+        if not turns:
+            return jsonify({"error": "No turns provided"}), 400
+
+        stored = append_turns(call_id, user_id, seq, turns)
+        return jsonify({"success": True, "seq": seq, "duplicate": not stored}), 200
+    except ValidationError as ve:
+        return jsonify({"error": "Validation failed", "details": ve.errors()}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/calls/analyze-pending", methods=["POST"])
+def analyze_pending():
+    """Batch-analyses calls whose Gemini pass was deferred (cron or manual)."""
+    try:
+        limit = int((request.json or {}).get("limit", 500)) if request.is_json else 500
+        return jsonify(analyze_pending_calls(limit))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/jobs/stats", methods=["GET"])
+def job_queue_stats():
+    """Queue depth, outcomes and latency of post-call processing."""
+    return jsonify(job_queue.stats())
 
-        if agent_type == "onboarding":
-            model_cls = OnboardingCall
-        elif service_type == "reminder":
-            model_cls = ReminderCall
-        elif service_type == "emergency":
-            model_cls = EmergencyCall
-        else:
-            model_cls = CasualTalkCall
 
-        call_obj = model_cls(**call_data)
-        db.collection("call_logs").document(call_obj.call_id).set(call_obj.model_dump())
+@app.route("/api/extraction/cache-stats", methods=["GET"])
+def extraction_cache_stats():
+    """Hit rate of the Gemini extraction cache (memory and Firestore tiers)."""
+    return jsonify(extraction_cache.stats())
+
+
+@app.route("/api/extraction/tier-stats", methods=["GET"])
+def extraction_tier_stats():
+    """How many analyses the local rules answered vs. Gemini, with latency."""
+    return jsonify(tier_stats())
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Status of a queued post-call job: queued/running/retrying/succeeded/failed."""
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/calls/log", methods=["POST"])
+def log_call_event():
+    """
+    Logs the full call details to Firestore.
+    Expects JSON: { "agent_type": "...", "service_type": "...", "call": {...} }
+    """
+    try:
+        entry = CALL_LOG_ADAPTER.validate_json(request.get_data())
+        call_obj, call_data = entry.call, entry.call.model_dump()
+        save_call_log(call_obj.call_id, call_data)
+        wellbeing.record_call(call_obj.user_id, call_obj.call_id, call_category(entry), call_data)
 
         return jsonify({"success": True, "call_id": call_obj.call_id}), 201
     except ValidationError as ve:
-        return jsonify({"error": "Validation failed", "details": ve.errors()}), 400
+        # The raw input is bytes in JSON mode, and may hold a whole transcript
+        return jsonify({"error": "Validation failed", "details": ve.errors(include_input=False)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/calls/log/batch", methods=["POST"])
+def log_call_events_batch():
+    """
+    Bulk /api/calls/log for devices syncing a backlog of offline calls.
+    Body: NDJSON, one /api/calls/log payload per line. Lines are validated
+    as they are read and committed in write batches of up to 500 writes;
+    a bad line is reported and does not stop the others. Saved calls are
+    added to the wellbeing rollups together at the end.
+    Returns 201 if every line was saved, 207 if some were, else 400.
+    """
+    errors = []
+    rollups = {}
+
+    def valid_calls():
+        for line_no, line in enumerate(request.stream, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = CALL_LOG_ADAPTER.validate_json(line)
+            except ValidationError as ve:
+                errors.append({"line": line_no, "error": "Validation failed", "details": ve.errors(include_input=False)})
+                continue
+            call_data = entry.call.model_dump()
+            rollups[line_no] = (entry.call.user_id, entry.call.call_id, call_category(entry),
+                                wellbeing.rollup_fields(call_data))
+            yield line_no, entry.call.call_id, call_data
+
+    saved = 0
+    try:
+        for line_no, call_id, error in save_call_logs(valid_calls()):
+            if error:
+                errors.append({"line": line_no, "call_id": call_id, "error": error})
+                rollups.pop(line_no, None)
+            else:
+                saved += 1
+    except Exception as e:
+        return jsonify({"error": str(e), "saved": saved}), 500
+    wellbeing.record_calls(list(rollups.values()))
+
+    errors.sort(key=lambda e: e["line"])
+    status = 201 if not errors else 207 if saved else 400
+    return jsonify({"success": not errors, "saved": saved, "failed": len(errors), "errors": errors}), status
+
+
 # --- 2. USER PROFILE ENDPOINTS (Frontend: "My Profile") ---
 @app.route("/api/user/<user_id>/profile", methods=["GET"])
 def get_user_profile(user_id):
     """Fetches the structured profile."""
     try:
-        doc = db.collection("users").document(user_id).get()
-        if not doc.exists:
+        profile = profile_cache.get(user_id)
+        if profile is None:
             return jsonify({"error": "Profile not found"}), 404
-        return jsonify(doc.to_dict()), 200
+        return jsonify(profile), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/user/profile-cache/stats", methods=["GET"])
+def profile_cache_stats():
+    """Hit rate and size of the shared profile cache."""
+    return jsonify(profile_cache.stats())
+
+
+@app.route("/api/user/<user_id>/devices", methods=["POST"])
+def register_device(user_id):
+    """Adds an FCM device token. Expects JSON: { "token": "..." }"""
+    try:
+        token = (request.json or {}).get("token")
+        if not token:
+            return jsonify({"error": "Missing 'token'"}), 400
+        register_token(user_id, token)
+        return jsonify({"success": True}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/user/<user_id>/devices/<token>", methods=["DELETE"])
+def unregister_device(user_id, token):
+    try:
+        unregister_token(user_id, token)
+        return jsonify({"success": True}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -271,38 +404,102 @@ def update_user_profile(user_id):
     """Updates specific fields in the profile."""
     try:
         data = request.json
-        db.collection("users").document(user_id).update(data)
+        users.update(user_id, data)
+        profile_cache.invalidate(user_id)
         return jsonify({"success": True}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/user/<user_id>/wellbeing/trends", methods=["GET"])
+def wellbeing_trends(user_id):
+    """
+    Daily or weekly mood, engagement, red-flag and call-minute rollups.
+    Query params: period=day|week (default day), count (default 14 days or
+    8 weeks, max 90 or 26). Reads one rollup document per period.
+    """
+    period = request.args.get("period", "day")
+    if period not in wellbeing.MAX_PERIODS:
+        return jsonify({"error": "period must be 'day' or 'week'"}), 400
+    try:
+        return jsonify(wellbeing.get_trends(user_id, period, request.args.get("count"))), 200
+    except ValueError:
+        return jsonify({"error": "count must be an integer"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # --- 3. CALL HISTORY ENDPOINTS ---
 
 
+CALL_PAGE_DEFAULT = 20
+CALL_PAGE_MAX = 100
+
+# Fields returned by ?view=summary: everything a history list renders,
+# across all call types, but never the transcript.
+CALL_SUMMARY_FIELDS = [
+    "call_id", "user_id", "started_at", "ended_at", "created_at",
+    "call_duration_seconds", "duration_seconds", "status", "call_status",
+    "action_status", "mood_detected", "engagement_level", "red_flags_detected",
+    "topics_discussed", "reminder_details", "trigger_type", "severity_level",
+    "transcript_count", "transcript_summary",
+]
+
+
 @app.route("/api/calls/<user_id>", methods=["GET"])
 def list_calls(user_id):
-    """Returns a list of all past calls."""
+    """
+    Returns one page of past calls, newest first.
+    Query params: limit (default 20, max 100), start_after (call_id of the
+    last item of the previous page), view=summary (omit transcripts).
+    The body is streamed: {"calls": [...], "next_cursor": ..., "success": true}
+    """
     try:
-        query = (
-            db.collection("call_logs")
-            .where(filter=firestore.FieldFilter("user_id", "==", user_id))
-            .order_by("started_at", direction=firestore.Query.DESCENDING)
-        )
-        calls = [d.to_dict() for d in query.stream()]
-        return jsonify({"calls": calls, "success": True})
+        limit = min(max(int(request.args.get("limit", CALL_PAGE_DEFAULT)), 1), CALL_PAGE_MAX)
+        start_after = request.args.get("start_after")
+
+        summary = request.args.get("view") == "summary"
+        query = call_logs.history(user_id, fields=CALL_SUMMARY_FIELDS if summary else None)
+        if start_after:
+            cursor = call_logs.ref(start_after).get()
+            if not cursor.exists:
+                return jsonify({"error": "Unknown cursor"}), 400
+            query = query.start_after(cursor)
+
+        # One extra row tells us whether another page exists.
+        docs = query.limit(limit + 1).stream()
+        first = next(docs, None)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    def generate():
+        yield '{"calls": ['
+        doc, sent, last_id = first, 0, None
+        while doc is not None and sent < limit:
+            yield ("," if sent else "") + app.json.dumps({"call_id": doc.id, **doc.to_dict()})
+            sent, last_id = sent + 1, doc.id
+            doc = next(docs, None)
+        next_cursor = last_id if doc is not None else None
+        yield f'], "next_cursor": {app.json.dumps(next_cursor)}, "success": true}}'
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
 
 @app.route("/api/call/<call_id>", methods=["GET"])
 def get_call_details(call_id):
-    """Returns full details for a single call."""
+    """
+    Returns full details for a single call. The transcript is read from its
+    chunk subcollection only when needed; pass ?transcript=false to skip it.
+    """
     try:
-        doc = db.collection("call_logs").document(call_id).get()
-        if not doc.exists:
+        call = call_logs.get(call_id)
+        if call is None:
             return jsonify({"error": "Call not found"}), 404
-        return jsonify(doc.to_dict()), 200
+        if request.args.get("transcript", "true").lower() != "false":
+            call["transcript"] = load_transcript(call_id, call)
+        return jsonify(call), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -343,7 +540,7 @@ def get_reminders(user_id):
 def remove_reminder(reminder_id):
     """Cancel a scheduled reminder."""
     try:
-        db.collection("scheduled_tasks").document(reminder_id).delete()
+        scheduled_tasks.delete(reminder_id)
         return jsonify({"success": True}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -365,6 +562,8 @@ def send_whatsapp():
 
         if not to_number or not message_body:
             return jsonify({"error": "Missing 'to' or 'message' fields"}), 400
+        if not whatsapp_service:
+            return jsonify({"success": False, "error": "Twilio not configured"}), 500
 
         result = whatsapp_service.send_message(to_number, message_body)
 
@@ -382,38 +581,71 @@ def send_whatsapp():
 
 @app.route("/api/emergency/trigger", methods=["POST"])
 def trigger_manual_emergency():
-    """Allows the frontend 'SOS' button to log an emergency."""
+    """
+    Logs an SOS and alerts every emergency contact in parallel.
+    Responds within SOS_RESPONSE_BUDGET_MS; deliveries continue in the
+    background and are recorded onto the call log.
+    """
+    started = time.perf_counter()
     try:
         data = request.json
         user_id = data.get("user_id")
 
-        call_id = f"sos_{int(datetime.now().timestamp())}"
-        emergency_payload = EmergencyCall(
-            user_id=user_id,
-            call_id=call_id,
-            trigger_type="user_sos",
-            severity_level="critical",
-            emergency_description="User pressed SOS button in app",
-            created_at=datetime.now(timezone.utc).isoformat(),
-        )
-        db.collection("call_logs").document(call_id).set(emergency_payload.model_dump())
+        profile = profile_cache.get(user_id) or {}
+        contacts = profile.get("emergency_contacts", [])
+        call_id = f"sos_{user_id}_{uuid.uuid4().hex}"
+
+        # Alerts go out before the log write so Firestore is off the critical path
+        fanout = sos_dispatcher.dispatch(call_id, contacts, alert_message(profile, user_id), {"user_id": user_id})
+        try:
+            emergency_payload = EmergencyCall(
+                user_id=user_id,
+                call_id=call_id,
+                trigger_type="user_sos",
+                severity_level="critical",
+                emergency_description="User pressed SOS button in app",
+                created_at=datetime.now(timezone.utc).isoformat(),
+            )
+            save_call_log(call_id, emergency_payload.model_dump())
+        finally:
+            fanout.mark_logged()
 
-        # OPTIONAL: Send WhatsApp Alert immediately
-        # whatsapp_service.send_message("+91YOUR_ADMIN_NUM", f"SOS Alert for User {user_id}")
+        remaining = SOS_RESPONSE_BUDGET_MS / 1000 - (time.perf_counter() - started)
+        if fanout.total or fanout.pending_lookups:
+            fanout.wait_first(remaining)
 
-        return jsonify({"success": True, "call_id": call_id}), 200
+        return jsonify({"success": True, "call_id": call_id, "notifications": fanout.snapshot()}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/emergency/stats")
+def emergency_stats():
+    return jsonify(sos_stats())
+
+
 @app.route("/api/scheduler/check-pending", methods=["POST"])
 def trigger_scheduler():
-    return jsonify(check_and_trigger_calls())
+    """Manual/cron fallback; scheduler_daemon.py fires reminders on time."""
+    return jsonify(check_and_trigger_calls(on_fire_batch=trigger_reminder_calls))
+
+
+@app.route("/api/notifications/push-stats")
+def push_stats():
+    """FCM requests, outcomes and pruned tokens."""
+    return jsonify(fcm_stats())
 
 
 @app.route("/api/health")
 def health():
-    return jsonify(get_health_status())
+    """Cheap by default; ?deep=1 also connects any client not yet built."""
+    return jsonify(get_health_status(deep=request.args.get("deep") == "1"))
+
+
+@app.route("/api/metrics")
+def prometheus_metrics():
+    """Route and dependency latencies plus the stats above, in Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
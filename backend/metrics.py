@@ -0,0 +1,249 @@
+"""
+metrics.py - Request and Dependency Latency Metrics
+In-process Prometheus-style counters and histograms, rendered as text at
+/api/metrics:
+  - per-route latency histograms and status counts (Flask hooks below, and
+    an aiohttp middleware in aio_app.py)
+  - per-dependency call latency (`timed("gemini", "generate_content")`),
+    with Firestore SDK methods instrumented in one place
+  - the existing *_stats() dicts, folded in as gauges via register_collector
+Stdlib only; one lock and a bisect per observation.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; tuned for API calls between a few ms and tens of seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, counts in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {round(counts[-1], 6)}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+REQUEST_LATENCY = Histogram(
+    "voicecare_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+REQUESTS = Counter(
+    "voicecare_http_requests_total", "HTTP responses by route and status.", ("method", "route", "status"))
+DEPENDENCY_LATENCY = Histogram(
+    "voicecare_dependency_duration_seconds", "Latency of calls to external services.",
+    ("dependency", "operation", "outcome"))
+
+_collectors = {}
+
+
+def observe_request(method, route, status, seconds):
+    REQUEST_LATENCY.observe(seconds, method, route)
+    REQUESTS.inc(method, route, str(status))
+
+
+@contextmanager
+def timed(dependency, operation):
+    """Times one dependency call; the outcome label is 'error' if it raises."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        DEPENDENCY_LATENCY.observe(time.perf_counter() - started, dependency, operation, outcome)
+
+
+def register_collector(name, collect):
+    """`collect()` returns a (possibly nested) dict; numeric leaves become gauges."""
+    _collectors[name] = collect
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}_{key}", item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    elif isinstance(value, bool):
+        out[prefix] = int(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = REQUEST_LATENCY.render() + REQUESTS.render() + DEPENDENCY_LATENCY.render()
+    for name, collect in sorted(_collectors.items()):
+        try:
+            values = {}
+            _flatten(f"voicecare_{name}", collect(), values)
+        except Exception as e:
+            print(f"⚠️ Metrics collector {name} failed: {e}")
+            continue
+        for key, value in sorted(values.items()):
+            key = "".join(c if c.isalnum() or c == "_" else "_" for c in key)
+            lines.append(f"# TYPE {key} gauge")
+            lines.append(f"{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Per-route latency and status counts for a Flask app."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+        return response
+
+
+# --- Firestore ---
+# Wrapping the SDK classes times every call site without touching them.
+
+_FIRESTORE_METHODS = {
+    # CollectionReference.add/get/stream and Query.get delegate to these.
+    "DocumentReference": ("get", "set", "update", "delete", "create"),
+    "WriteBatch": ("commit",),
+    "Client": ("get_all",),
+}
+_firestore_instrumented = False
+
+
+def _collection_of(obj):
+    path = getattr(obj, "_path", None)
+    if path:
+        return path[0]
+    parent = getattr(obj, "_parent", None)
+    return getattr(parent, "id", None) or "-"
+
+
+def _time_call(kind, method, fn):
+    operation = {"WriteBatch": "batch.commit", "Client": "get_all"}.get(kind)
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with timed("firestore", operation or f"{_collection_of(self)}.{method}"):
+            return fn(self, *args, **kwargs)
+    return wrapper
+
+
+class _TimedStream:
+    """Wraps a query's StreamGenerator; timed until the caller has drained it."""
+
+    def __init__(self, stream, operation):
+        self._stream = stream
+        self._operation = operation
+        self._started = time.perf_counter()
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except StopIteration:
+            self._finish("ok")
+            raise
+        except Exception:
+            self._finish("error")
+            raise
+
+    def _finish(self, outcome):
+        if not self._done:
+            self._done = True
+            DEPENDENCY_LATENCY.observe(time.perf_counter() - self._started, "firestore", self._operation, outcome)
+
+    def __getattr__(self, attr):
+        return getattr(self._stream, attr)
+
+
+def _time_stream(fn):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        return _TimedStream(fn(self, *args, **kwargs), f"{_collection_of(self)}.stream")
+    return wrapper
+
+
+def instrument_firestore():
+    """Idempotently wraps the sync Firestore SDK's I/O methods with timers."""
+    global _firestore_instrumented
+    if _firestore_instrumented:
+        return
+    from google.cloud.firestore_v1 import batch, client, document, query
+
+    classes = {
+        "DocumentReference": document.DocumentReference,
+        "WriteBatch": batch.WriteBatch,
+        "Client": client.Client,
+    }
+    for kind, methods in _FIRESTORE_METHODS.items():
+        cls = classes[kind]
+        for method in methods:
+            setattr(cls, method, _time_call(kind, method, getattr(cls, method)))
+    query.Query.stream = _time_stream(query.Query.stream)
+    _firestore_instrumented = True
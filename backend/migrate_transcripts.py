@@ -0,0 +1,24 @@
+"""
+One-off migration: moves transcripts stored inline on 'call_logs'
+documents into their transcript_chunks subcollection.
+Run with: `uv run python migrate_transcripts.py [--dry-run]`
+"""
+
+import argparse
+
+from transcripts import migrate_inline_transcripts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offload inline call transcripts")
+    parser.add_argument("--dry-run", action="store_true", help="Only count logs that would move")
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    result = migrate_inline_transcripts(page_size=args.page_size, dry_run=args.dry_run)
+    print(f"✓ Scanned {result['scanned']} call logs, "
+          f"{'would migrate' if args.dry_run else 'migrated'} {result['migrated']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from .onboarding import SeniorProfile, OnboardingCall
 from .reminder import ReminderDetails, ReminderCall
 from .emergency import EmergencyCall
 from .casual import CasualTalkCall
+from .calls import CALL_LOG_ADAPTER, TRANSCRIPT_ADAPTER, LoggedCall, call_category
 
 __all__ = [
     "TranscriptEntry",
@@ -18,4 +19,8 @@ __all__ = [
     "ReminderCall",
     "EmergencyCall",
     "CasualTalkCall",
+    "LoggedCall",
+    "call_category",
+    "CALL_LOG_ADAPTER",
+    "TRANSCRIPT_ADAPTER",
 ]
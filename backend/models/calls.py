@@ -0,0 +1,54 @@
+"""
+calls.py - Call Log Envelope and Validators
+A logged call arrives as {"agent_type", "service_type", "call": {...}}.
+The envelope is a union tagged by call category; call_category() reads the
+two type fields, so one precompiled TypeAdapter picks the model and
+validates in a single pass, from a dict or straight from JSON bytes.
+"""
+
+from typing import Annotated, Generic, List, Optional, TypeVar, Union
+
+from pydantic import BaseModel, Discriminator, Tag, TypeAdapter
+
+from .casual import CasualTalkCall
+from .common import TranscriptEntry
+from .emergency import EmergencyCall
+from .onboarding import OnboardingCall
+from .reminder import ReminderCall
+
+CallModel = TypeVar("CallModel")
+
+
+class LoggedCall(BaseModel, Generic[CallModel]):
+    """Body of POST /api/calls/log, and one line of /api/calls/log/batch"""
+    agent_type: Optional[str] = None
+    service_type: Optional[str] = "casual"
+    call: CallModel
+
+
+def call_category(envelope):
+    """Tag for an envelope: onboarding agent first, then the service type."""
+    if isinstance(envelope, dict):
+        agent_type, service_type = envelope.get("agent_type"), envelope.get("service_type")
+    else:
+        agent_type, service_type = envelope.agent_type, envelope.service_type
+    if agent_type == "onboarding":
+        return "onboarding"
+    if service_type in ("reminder", "emergency"):
+        return service_type
+    return "casual"
+
+
+AnyLoggedCall = Annotated[
+    Union[
+        Annotated[LoggedCall[OnboardingCall], Tag("onboarding")],
+        Annotated[LoggedCall[ReminderCall], Tag("reminder")],
+        Annotated[LoggedCall[EmergencyCall], Tag("emergency")],
+        Annotated[LoggedCall[CasualTalkCall], Tag("casual")],
+    ],
+    Discriminator(call_category),
+]
+
+# Built once at import; validate_python / validate_json reuse the compiled schema.
+CALL_LOG_ADAPTER = TypeAdapter(AnyLoggedCall)
+TRANSCRIPT_ADAPTER = TypeAdapter(List[TranscriptEntry])
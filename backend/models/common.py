@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, Literal
+from datetime import datetime, timezone
 
 # --- GLOBAL LITERALS ---
 CallCategory = Literal["onboarding", "reminder", "emergency", "casual"]
@@ -7,13 +8,19 @@ CallStatus = Literal["ringing", "in_progress", "completed", "missed", "failed",
 
 class TranscriptEntry(BaseModel):
     """Enhanced Transcript Entry with Sentiment Analysis"""
-    role: Literal["user", "assistant"] = Field(...)
-    text: str = Field(...)
+    # Clients often send partial turns; these defaults fill them in.
+    role: Literal["user", "assistant"] = Field(default="assistant")
+    text: str = Field(default="")
     # AI will populate this during post-processing
     sentiment_score: Optional[float] = Field(
         None, description="Range -1.0 to 1.0 (Negative to Positive)"
     )
-    timestamp: str = Field(..., description="ISO format timestamp")
+    timestamp: Optional[str] = Field(None, validate_default=True, description="ISO format timestamp")
+
+    @field_validator("timestamp", mode="after")
+    @classmethod
+    def default_timestamp(cls, value):
+        return value or datetime.now(timezone.utc).isoformat()
 
 class CallLog(BaseModel):
     """The Universal Base Model for every VoiceCare interaction"""
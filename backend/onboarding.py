@@ -3,14 +3,26 @@ onboarding.py - Onboarding Agent Logic
 Processes onboarding transcripts and extracts medical profiles using Gemini 2.0
 """
 
-from datetime import datetime
 from google.cloud import firestore
-from config import db, get_gemini_client
-import json
-
-def process_onboarding_transcript(transcript_log, user_id):
-    full_text = "\n".join([f"{t['role'].upper()}: {t['text']}" for t in transcript_log])
-    client = get_gemini_client()
+from compaction import ONBOARDING_KEEP, compact_transcript
+from extraction_cache import generate_json
+from recurrence import save_reminder_rules
+from profile_cache import profile_cache
+from storage import users
+from transcripts import load_transcript
+
+# Bump when the prompt changes so cached extractions are not reused.
+PROMPT_VERSION = "onboarding-profile-v4"
+MODEL = "gemini-2.0-flash"
+
+def process_onboarding_transcript(transcript_log, user_id, call_id=None):
+    if not transcript_log and call_id:
+        # Turns were streamed in during the call.
+        transcript_log = load_transcript(call_id)
+
+    # Long onboarding chats are compacted to a token budget before prompting.
+    compacted, _ = compact_transcript(transcript_log, keep_pattern=ONBOARDING_KEEP)
+    full_text = "\n".join([f"{t['role'].upper()}: {t['text']}" for t in compacted])
 
     prompt = f"""
     Extract the senior's profile into JSON.
@@ -26,6 +38,9 @@ def process_onboarding_transcript(transcript_log, user_id):
         {{
           "name": "string",
           "time": "HH:MM AM/PM",
+          "frequency": "Daily" | "Weekly" | "Once",
+          "date": "YYYY-MM-DD (only for Once, else null)",
+          "weekday": "Monday" | "Tuesday" | "Wednesday" | "Thursday" | "Friday" | "Saturday" | "Sunday" (only for Weekly, else null),
           "about": "string"
         }}
       ]
@@ -37,47 +52,21 @@ def process_onboarding_transcript(transcript_log, user_id):
     {full_text}
     """
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt,
-        config={"response_mime_type": "application/json"},
-    )
-
-    data = json.loads(response.text)
-
-    user_ref = db.collection("users").document(user_id)
+    data = generate_json(PROMPT_VERSION, MODEL, compacted, prompt)
 
     # Update core profile
-    user_ref.set({
+    users.set(user_id, {
         "full_name": data.get("full_name"),
         "allergies": data.get("allergies", []),
         "emergency_contacts": data.get("emergency_contacts", []),
         "onboarding_complete": True,
         "updated_at": firestore.SERVER_TIMESTAMP
     }, merge=True)
+    profile_cache.invalidate(user_id)
 
-    created_reminders = []
-
-    for rem in data.get("reminders", []):
-        # Convert time string to ISO format (you can adjust parsing if needed)
-        time_str = rem.get("time")
-        scheduled_time = None
-        try:
-            scheduled_time = datetime.strptime(time_str, "%I:%M %p").isoformat()
-        except:
-            scheduled_time = datetime.utcnow().isoformat()
-
-        reminder_doc = {
-            "user_id": user_id,
-            "medication_name": rem.get("name"),
-            "scheduled_time": scheduled_time,
-            "status": "pending",
-            "type": "reminder",
-            "about": rem.get("about", "")
-        }
-
-        doc_ref = db.collection("reminders").add(reminder_doc)
-        created_reminders.append(doc_ref[1].id)
-
-    return {"profile_saved": True, "reminders_created": created_reminders}
+    # Reminders become recurrence rules; the scheduler fires their
+    # materialized occurrences in the user's own timezone.
+    tz_name = (profile_cache.get(user_id) or {}).get("timezone")
+    rule_ids = save_reminder_rules(user_id, data.get("reminders", []), tz_name)
 
+    return {"profile_saved": True, "reminder_rules": rule_ids}
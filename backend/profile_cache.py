@@ -0,0 +1,145 @@
+"""
+profile_cache.py - Read-through cache for 'users' documents
+Shared by the profile endpoint and the voice agents' context builder.
+Writers in this backend call invalidate(); writes made elsewhere (e.g. the
+mobile app) are picked up when the entry's TTL runs out.
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from storage import users
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "2048"))
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+
+
+class ProfileCache:
+    """Bounded LRU with per-entry TTL. Missing profiles are cached as None."""
+
+    def __init__(self, loader, max_entries=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL_SECONDS, clock=time.monotonic,
+                 many_loader=None):
+        self.loader = loader
+        self.many_loader = many_loader
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        # One token per in-flight load; invalidate() drops a user's tokens so a
+        # load that started before it cannot store stale data. Only loads in
+        # progress are tracked, so this stays as small as the concurrency.
+        self._loads = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def _lookup(self, user_id):
+        """(hit, data, load token); data is a copy on a hit."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > self.clock():
+                self._entries.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return True, copy.deepcopy(entry[1]), None
+            self._stats["misses"] += 1
+            token = object()
+            self._loads.setdefault(user_id, set()).add(token)
+            return False, None, token
+
+    def _finish(self, user_id, token, data=None, loaded=False):
+        """Ends a load; its result is stored only if nothing invalidated the user meanwhile."""
+        with self._lock:
+            tokens = self._loads.get(user_id)
+            if tokens and token in tokens:
+                tokens.discard(token)
+                if not tokens:
+                    del self._loads[user_id]
+                if loaded:
+                    self._store(user_id, data)
+        return copy.deepcopy(data)
+
+    def get(self, user_id):
+        """Returns a copy of the user's document, or None if it does not exist."""
+        hit, data, token = self._lookup(user_id)
+        if hit:
+            return data
+        try:
+            data = self.loader(user_id)
+        except BaseException:
+            self._finish(user_id, token)
+            raise
+        return self._finish(user_id, token, data, loaded=True)
+
+    def get_many(self, user_ids):
+        """
+        Like get() for several users: {user_id: copy or None}. All misses are
+        read with one `many_loader(ids)` call, which returns only existing docs.
+        """
+        found, misses = {}, {}
+        for user_id in dict.fromkeys(user_ids):
+            hit, data, token = self._lookup(user_id)
+            if hit:
+                found[user_id] = data
+            else:
+                misses[user_id] = token
+        if not misses:
+            return found
+        try:
+            if self.many_loader:
+                loaded = self.many_loader(list(misses))
+            else:
+                loaded = {user_id: self.loader(user_id) for user_id in misses}
+        except BaseException:
+            for user_id, token in misses.items():
+                self._finish(user_id, token)
+            raise
+        for user_id, token in misses.items():
+            found[user_id] = self._finish(user_id, token, loaded.get(user_id), loaded=True)
+        return found
+
+    async def get_async(self, user_id, loader):
+        """Like get(), awaiting `loader(user_id)` on a miss (async Firestore client)."""
+        hit, data, token = self._lookup(user_id)
+        if hit:
+            return data
+        try:
+            data = await loader(user_id)
+        except BaseException:
+            self._finish(user_id, token)
+            raise
+        return self._finish(user_id, token, data, loaded=True)
+
+    def _store(self, user_id, data):
+        self._entries[user_id] = (self.clock() + self.ttl, data)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._loads.pop(user_id, None)
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._loads.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
+
+
+def _load_profile(user_id):
+    return users.get(user_id)
+
+
+profile_cache = ProfileCache(_load_profile, many_loader=users.get_many)
@@ -0,0 +1,282 @@
+"""
+recurrence.py - Recurring Reminder Materialization
+Reminder rules ('reminder_rules') describe when a reminder repeats in the
+user's local timezone. This module expands each rule into concrete
+'reminders' occurrences (UTC Timestamps) over a rolling window so the
+scheduler only ever queries small due-time ranges.
+"""
+
+import hashlib
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from google.cloud import firestore
+
+from config import db
+from scheduler import shard_for
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Kolkata")
+WINDOW = timedelta(hours=int(os.getenv("RECURRENCE_WINDOW_HOURS", "48")))
+# Rules are topped up once less than this much of the window is left.
+TOP_UP_SLACK = timedelta(hours=12)
+
+FREQUENCIES = ("Daily", "Weekly", "Once")
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+_RULE_FIELDS = ("name", "time", "frequency", "date", "weekday", "timezone", "about", "type")
+
+
+def zone_for(name):
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def parse_time(value):
+    """'8:30 AM', '08:30 pm' or '20:30' -> time. Returns None if unparseable."""
+    value = (value or "").strip().upper()
+    for fmt in ("%I:%M %p", "%I:%M%p", "%H:%M", "%I %p"):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_frequency(value):
+    value = (value or "Daily").strip().capitalize()
+    return value if value in FREQUENCIES else "Daily"
+
+
+def parse_weekday(value):
+    """'Monday', 'mon' or 0-6 (Monday = 0) -> 0-6. Returns None if unparseable."""
+    if isinstance(value, int) and 0 <= value <= 6:
+        return value
+    value = str(value or "").strip().lower()
+    if value.isdigit():
+        return parse_weekday(int(value))
+    for i, name in enumerate(WEEKDAYS):
+        if len(value) >= 3 and name.startswith(value):
+            return i
+    return None
+
+
+def rule_hash(rule):
+    """Fingerprint of everything that affects the expanded occurrences."""
+    raw = "|".join(str(rule.get(f) or "") for f in _RULE_FIELDS)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def expand_rule(rule, start, end):
+    """
+    Yields UTC datetimes for every occurrence of `rule` in [start, end).
+    Local wall-clock times are resolved in the rule's timezone, so a daily
+    08:00 reminder stays at 08:00 across DST changes.
+    """
+    at = parse_time(rule.get("time"))
+    if at is None:
+        return
+    tz = zone_for(rule.get("timezone"))
+    frequency = normalize_frequency(rule.get("frequency"))
+
+    if frequency == "Once":
+        try:
+            day = date.fromisoformat(rule.get("date") or "")
+        except ValueError:
+            return
+        candidates = [day]
+    else:
+        first = start.astimezone(tz).date() - timedelta(days=1)
+        last = end.astimezone(tz).date()
+        candidates = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+        if frequency == "Weekly":
+            weekday = rule.get("weekday")
+            if weekday is None:
+                weekday = start.astimezone(tz).weekday()
+            candidates = [d for d in candidates if d.weekday() == int(weekday)]
+
+    for day in candidates:
+        occurrence = datetime.combine(day, at, tzinfo=tz).astimezone(timezone.utc)
+        if start <= occurrence < end:
+            yield occurrence
+
+
+def _occurrence_id(rule_id, when):
+    return f"{rule_id}_{when:%Y%m%dT%H%M}"
+
+
+def _rule_id(user_id, rule):
+    """
+    Stable id per (medication, time, frequency[, date]): Metformin at 08:00
+    and at 20:00 are two rules, and re-onboarding finds the same ones. The
+    weekday is left out, so a weekly rule whose weekday was defaulted or
+    changed is still the same rule.
+    """
+    label = rule.get("name") or rule.get("about") or "reminder"
+    slug = re.sub(r"[^a-z0-9]+", "-", label.lower()).strip("-")
+    parts = [user_id, slug[:40] or "reminder", f"{parse_time(rule.get('time')):%H%M}", rule["frequency"].lower()]
+    if rule["frequency"] == "Once":
+        parts.append(rule["date"])
+    return "_".join(parts)
+
+
+def _drop_future_occurrences(rule_id, now):
+    """Deletes not-yet-fired occurrences of a rule whose definition changed."""
+    pending = db.collection("reminders") \
+        .where(filter=firestore.FieldFilter("rule_id", "==", rule_id)) \
+        .where(filter=firestore.FieldFilter("status", "==", "pending")) \
+        .stream()
+    batch = db.batch()
+    dropped = 0
+    for doc in pending:
+        scheduled = (doc.to_dict() or {}).get("scheduled_time")
+        if isinstance(scheduled, datetime) and scheduled >= now:
+            batch.delete(doc.reference)
+            dropped += 1
+    if dropped:
+        batch.commit()
+    return dropped
+
+
+def materialize_rule(rule_ref, rule, now=None):
+    """
+    Tops up one rule's occurrences to now + WINDOW. Unchanged rules only get
+    the missing tail; changed rules are re-expanded from now. Returns the
+    number of occurrences written.
+    """
+    now = now or datetime.now(timezone.utc)
+    window_end = now + WINDOW
+    current_hash = rule_hash(rule)
+    until = rule.get("materialized_until")
+
+    if rule.get("materialized_hash") == current_hash and isinstance(until, datetime):
+        if until >= window_end:
+            return 0
+        start = max(until, now)
+    else:
+        _drop_future_occurrences(rule_ref.id, now)
+        start = now
+
+    batch = db.batch()
+    written = 0
+    for when in expand_rule(rule, start, window_end):
+        batch.set(db.collection("reminders").document(_occurrence_id(rule_ref.id, when)), {
+            "user_id": rule.get("user_id"),
+            "rule_id": rule_ref.id,
+            "medication_name": rule.get("name"),
+            "type": "reminder",
+            "about": rule.get("about", ""),
+            "scheduled_time": when,
+            "status": "pending",
+            "shard": shard_for(rule.get("user_id")),
+            "created_at": firestore.SERVER_TIMESTAMP
+        })
+        written += 1
+
+    # One-time rules are finished once the window has passed their date.
+    done = normalize_frequency(rule.get("frequency")) == "Once" and any(
+        expand_rule(rule, datetime.min.replace(tzinfo=timezone.utc), window_end)
+    )
+    batch.update(rule_ref, {
+        "materialized_hash": current_hash,
+        "materialized_until": window_end,
+        "active": not done
+    })
+    batch.commit()
+    return written
+
+
+def _once_date(rem, at, tz, now):
+    """ISO date of a one-time reminder; without one, its next local occurrence."""
+    if rem.get("date"):
+        try:
+            return date.fromisoformat(rem["date"]).isoformat()
+        except ValueError:
+            return None
+    local_now = now.astimezone(tz)
+    day = local_now.date() if at > local_now.time() else local_now.date() + timedelta(days=1)
+    return day.isoformat()
+
+
+def deactivate_missing_rules(user_id, keep_ids, now=None):
+    """Retires a user's active rules that are not in `keep_ids`, dropping their pending occurrences."""
+    now = now or datetime.now(timezone.utc)
+    active = db.collection("reminder_rules") \
+        .where(filter=firestore.FieldFilter("user_id", "==", user_id)) \
+        .where(filter=firestore.FieldFilter("active", "==", True)) \
+        .stream()
+    retired = []
+    for doc in active:
+        if doc.id in keep_ids:
+            continue
+        _drop_future_occurrences(doc.id, now)
+        doc.reference.update({"active": False, "updated_at": firestore.SERVER_TIMESTAMP})
+        retired.append(doc.id)
+    return retired
+
+
+def save_reminder_rules(user_id, reminders, tz_name=None, now=None):
+    """
+    Replaces a user's rules with those from an extracted profile and
+    materializes their window. Rules not in `reminders` are deactivated.
+    """
+    now = now or datetime.now(timezone.utc)
+    tz_name = tz_name or DEFAULT_TIMEZONE
+    rule_ids = []
+
+    for rem in reminders or []:
+        frequency = normalize_frequency(rem.get("frequency"))
+        rule = {
+            "user_id": user_id,
+            "name": rem.get("name"),
+            "type": rem.get("type", "medication"),
+            "time": rem.get("time"),
+            "frequency": frequency,
+            "date": rem.get("date"),
+            "weekday": parse_weekday(rem.get("weekday")) if frequency == "Weekly" else None,
+            "timezone": tz_name,
+            "about": rem.get("about", ""),
+        }
+        at = parse_time(rule["time"])
+        if at is None:
+            print(f"⚠️ Skipping reminder '{rule['name']}' with unparseable time: {rule['time']}")
+            continue
+        if frequency == "Once":
+            rule["date"] = _once_date(rem, at, zone_for(tz_name), now)
+            if rule["date"] is None:
+                print(f"⚠️ Skipping one-time reminder '{rule['name']}' with unparseable date: {rem.get('date')}")
+                continue
+
+        rule_ref = db.collection("reminder_rules").document(_rule_id(user_id, rule))
+        existing = rule_ref.get()
+        stored = existing.to_dict() if existing.exists else {}
+        if frequency == "Weekly" and rule["weekday"] is None:
+            # Keep the weekday already on the rule; a new one starts today.
+            rule["weekday"] = stored.get("weekday")
+            if rule["weekday"] is None:
+                rule["weekday"] = now.astimezone(zone_for(tz_name)).weekday()
+        rule_ref.set({**rule, "active": True, "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+        materialize_rule(rule_ref, {**stored, **rule}, now)
+        rule_ids.append(rule_ref.id)
+
+    deactivate_missing_rules(user_id, set(rule_ids), now)
+    return rule_ids
+
+
+def top_up_recurring_reminders(now=None, limit=500):
+    """Extends every active rule whose materialized window is running out."""
+    now = now or datetime.now(timezone.utc)
+    stale = db.collection("reminder_rules") \
+        .where(filter=firestore.FieldFilter("active", "==", True)) \
+        .where(filter=firestore.FieldFilter("materialized_until", "<", now + WINDOW - TOP_UP_SLACK)) \
+        .limit(limit) \
+        .stream()
+
+    rules = 0
+    occurrences = 0
+    for doc in stale:
+        occurrences += materialize_rule(doc.reference, doc.to_dict() or {}, now)
+        rules += 1
+    return {"rules": rules, "occurrences": occurrences}
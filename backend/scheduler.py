@@ -1,54 +1,209 @@
-"""
-scheduler.py - Background Scheduler
-"""
-from config import db
-from datetime import datetime, timezone
-from google.cloud import firestore
-
-def check_and_trigger_calls():
-    try:
-        if not db:
-            return {"success": False, "error": "Firestore not available"}
-
-        now = datetime.now(timezone.utc)
-        pending = db.collection("reminders").where(filter=firestore.FieldFilter("status", "==", "pending")).stream()
-
-        count = 0
-        for doc in pending:
-            data = doc.to_dict() or {}
-            scheduled_time = data.get("scheduled_time")
-            if scheduled_time and isinstance(scheduled_time, firestore.Timestamp):
-                if scheduled_time.to_datetime() > now:
-                    continue
-            doc.reference.update({
-                "status": "pinging",
-                "triggered_at": firestore.SERVER_TIMESTAMP
-            })
-            count += 1
-
-        return {"success": True, "triggered": count}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-def schedule_reminder(user_id, reminder_type, scheduled_time, medication_name=None):
-    """Schedules a new reminder."""
-    try:
-        reminder_data = {
-            "user_id": user_id,
-            "type": reminder_type,
-            "medication_name": medication_name,
-            "scheduled_time": scheduled_time if isinstance(scheduled_time, datetime) else datetime.fromisoformat(str(scheduled_time)),
-            "status": "pending",
-            "created_at": firestore.SERVER_TIMESTAMP
-        }
-        db.collection("reminders").add(reminder_data)
-        return {"success": True, "message": "Scheduled"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-def list_pending_reminders(user_id):
-    reminders = db.collection("reminders") \
-        .where(filter=firestore.FieldFilter("user_id", "==", user_id)) \
-        .where(filter=firestore.FieldFilter("status", "==", "pending")) \
-        .stream()
-    return {"reminders": [r.to_dict() for r in reminders], "success": True}
\ No newline at end of file
+"""
+scheduler.py - Background Scheduler
+"""
+import os
+import socket
+import time
+import zlib
+from config import db
+from datetime import datetime, timedelta, timezone
+from google.cloud import firestore
+from storage import reminders
+
+# Max reminders claimed per tick, and per claim transaction (Firestore caps a
+# transaction at 500 writes).
+DUE_BATCH_LIMIT = int(os.getenv("SCHEDULER_DUE_BATCH_LIMIT", "200"))
+CLAIM_CHUNK_SIZE = 100
+
+# Horizontal scaling: reminders are hash-partitioned by user_id into
+# SCHEDULER_SHARDS shards and each replica serves SCHEDULER_SHARD_INDEX.
+# Changing the shard count requires re-stamping the 'shard' field.
+SCHEDULER_SHARDS = int(os.getenv("SCHEDULER_SHARDS", "1"))
+SHARD_INDEX = int(os.getenv("SCHEDULER_SHARD_INDEX", "0"))
+WORKER_ID = os.getenv("SCHEDULER_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "120"))
+# A reminder claimed this many times without being released is marked
+# 'failed' instead of being retried forever.
+MAX_CLAIM_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_CLAIM_ATTEMPTS", "5"))
+
+
+def shard_for(user_id, shards=SCHEDULER_SHARDS):
+    """Stable shard number for a user (crc32, not Python's salted hash)."""
+    return zlib.crc32(str(user_id).encode("utf-8")) % max(shards, 1)
+
+
+def _in_shard(query, shard):
+    if SCHEDULER_SHARDS > 1:
+        query = query.where(filter=firestore.FieldFilter("shard", "==", shard))
+    return query
+
+
+def _due_reminders_query(now, limit=DUE_BATCH_LIMIT, shard=SHARD_INDEX):
+    """
+    Pending reminders whose scheduled_time has passed, oldest first.
+    Needs the composite index (shard, status, scheduled_time) on 'reminders'.
+    """
+    query = _in_shard(db.collection("reminders"), shard)
+    return (
+        query
+        .where(filter=firestore.FieldFilter("status", "==", "pending"))
+        .where(filter=firestore.FieldFilter("scheduled_time", "<=", now))
+        .order_by("scheduled_time")
+        .limit(limit)
+    )
+
+
+def _expired_leases_query(now, limit=DUE_BATCH_LIMIT, shard=SHARD_INDEX):
+    """
+    Reminders claimed by a worker that died before releasing them.
+    Needs the composite index (shard, status, lease_expires_at) on 'reminders'.
+    """
+    query = _in_shard(db.collection("reminders"), shard)
+    return (
+        query
+        .where(filter=firestore.FieldFilter("status", "==", "pinging"))
+        .where(filter=firestore.FieldFilter("lease_expires_at", "<=", now))
+        .order_by("lease_expires_at")
+        .limit(limit)
+    )
+
+
+def _claimable(data, now):
+    if data.get("status") == "pending":
+        return True
+    lease_expires_at = data.get("lease_expires_at")
+    return data.get("status") == "pinging" and lease_expires_at is not None and lease_expires_at <= now
+
+
+@firestore.transactional
+def _claim_chunk(transaction, refs, owner):
+    """
+    Leases pending (or lease-expired) reminders to `owner`. Concurrent claims
+    on the same doc conflict, so exactly one replica wins. Reminders out of
+    claim attempts are marked 'failed'. Returns claimed refs.
+    """
+    now = datetime.now(timezone.utc)
+    claimed = []
+    for snap in transaction.get_all(refs):
+        data = snap.to_dict() or {}
+        if not snap.exists or not _claimable(data, now):
+            continue
+        if data.get("claim_attempts", 0) >= MAX_CLAIM_ATTEMPTS:
+            transaction.update(snap.reference, {"status": "failed", "failed_at": firestore.SERVER_TIMESTAMP})
+            print(f"❌ Reminder {snap.id} failed after {MAX_CLAIM_ATTEMPTS} claim attempts")
+            continue
+        transaction.update(snap.reference, {
+            "status": "pinging",
+            "lease_owner": owner,
+            "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+            "claim_attempts": firestore.Increment(1),
+            "triggered_at": firestore.SERVER_TIMESTAMP
+        })
+        claimed.append(snap.reference)
+    return claimed
+
+
+@firestore.transactional
+def _release_chunk(transaction, refs, owner):
+    """Ends the lease on reminders that `owner` finished firing."""
+    released = []
+    for snap in transaction.get_all(refs):
+        if not snap.exists or (snap.to_dict() or {}).get("lease_owner") != owner:
+            continue
+        transaction.update(snap.reference, {
+            "lease_expires_at": None,
+            "fired_at": firestore.SERVER_TIMESTAMP
+        })
+        released.append(snap.reference)
+    return released
+
+
+def _chunked(fn, refs, owner):
+    done = []
+    for i in range(0, len(refs), CLAIM_CHUNK_SIZE):
+        done.extend(fn(db.transaction(), refs[i:i + CLAIM_CHUNK_SIZE], owner))
+    return done
+
+
+def claim_reminders(refs, owner=WORKER_ID):
+    """Claims the given reminder refs in chunked transactions."""
+    return _chunked(_claim_chunk, refs, owner)
+
+
+def release_reminders(refs, owner=WORKER_ID):
+    """Releases leases held by `owner`; unreleased leases expire and get retried."""
+    return _chunked(_release_chunk, refs, owner)
+
+
+def check_and_trigger_calls(limit=DUE_BATCH_LIMIT, shard=SHARD_INDEX, on_fire=None, on_fire_batch=None):
+    started = time.perf_counter()
+    try:
+        if not db:
+            return {"success": False, "error": "Firestore not available"}
+
+        from recurrence import top_up_recurring_reminders
+
+        now = datetime.now(timezone.utc)
+        try:
+            materialized = top_up_recurring_reminders(now)["occurrences"]
+        except Exception as e:
+            print(f"⚠️ Recurring reminder top-up failed: {e}")
+            materialized = 0
+        due = [doc.reference for doc in _due_reminders_query(now, limit, shard).stream()]
+        expired = [doc.reference for doc in _expired_leases_query(now, limit, shard).stream()]
+        claimed = claim_reminders(due + expired)
+
+        fired = []
+        if on_fire_batch and claimed:
+            # One call for the whole wave; unfired reminders keep their lease.
+            try:
+                fired_ids = on_fire_batch([ref.id for ref in claimed])
+                fired = [ref for ref in claimed if ref.id in fired_ids]
+            except Exception as e:
+                print(f"⚠️ {len(claimed)} reminder(s) not fired, leases will expire: {e}")
+        else:
+            for ref in claimed:
+                try:
+                    if on_fire:
+                        on_fire(ref.id)
+                    fired.append(ref)
+                except Exception as e:
+                    print(f"⚠️ Reminder {ref.id} not fired, lease will expire: {e}")
+        release_reminders(fired)
+
+        return {
+            "success": True,
+            "triggered": len(fired),
+            "stats": {
+                "shard": shard,
+                "worker": WORKER_ID,
+                "scanned": len(due),
+                "lease_expired": len(expired),
+                "materialized": materialized,
+                "claimed": len(claimed),
+                "has_more": len(due) >= limit,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def schedule_reminder(user_id, reminder_type, scheduled_time, medication_name=None):
+    """Schedules a new reminder."""
+    try:
+        reminder_data = {
+            "user_id": user_id,
+            "type": reminder_type,
+            "medication_name": medication_name,
+            "scheduled_time": scheduled_time if isinstance(scheduled_time, datetime) else datetime.fromisoformat(str(scheduled_time)),
+            "status": "pending",
+            "shard": shard_for(user_id),
+            "created_at": firestore.SERVER_TIMESTAMP
+        }
+        reminders.add(reminder_data)
+        return {"success": True, "message": "Scheduled"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def list_pending_reminders(user_id):
+    return {"reminders": [data for _, data in reminders.pending_for_user(user_id)], "success": True}
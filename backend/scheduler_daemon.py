@@ -0,0 +1,392 @@
+"""
+scheduler_daemon.py - Long-running Reminder Scheduler
+Keeps upcoming reminders in an in-memory min-heap fed by a Firestore
+snapshot listener and fires each one as soon as its scheduled_time passes.
+Run with: `uv run python scheduler_daemon.py`
+"""
+
+import heapq
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# Reminders further out than this are left in Firestore until the listener
+# window rolls forward.
+HORIZON = timedelta(hours=6)
+# Upper bound on a single sleep so the horizon is re-armed on time.
+MAX_SLEEP_SECONDS = 60.0
+# How often to look for reminders whose lease expired on a crashed worker.
+RECOVERY_INTERVAL_SECONDS = 60.0
+# How often recurring-reminder rules are expanded into new occurrences.
+TOP_UP_INTERVAL_SECONDS = 15 * 60.0
+# After a failed iteration (e.g. Firestore unavailable) the loop waits
+# 1s, 2s, 4s... up to this before trying again.
+MAX_ERROR_BACKOFF_SECONDS = 60.0
+
+
+def _to_epoch(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+class ReminderHeap:
+    """Min-heap of (due_epoch, reminder_id) with lazy removal of stale entries."""
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+
+    def __len__(self):
+        return len(self._due)
+
+    def upsert(self, reminder_id, due_epoch):
+        if self._due.get(reminder_id) == due_epoch:
+            return
+        self._due[reminder_id] = due_epoch
+        heapq.heappush(self._heap, (due_epoch, reminder_id))
+
+    def remove(self, reminder_id):
+        self._due.pop(reminder_id, None)
+
+    def _drop_stale(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now_epoch):
+        """Removes and returns (reminder_id, due_epoch) for everything due by now."""
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now_epoch:
+            due_epoch, reminder_id = heapq.heappop(self._heap)
+            self._due.pop(reminder_id, None)
+            due.append((reminder_id, due_epoch))
+            self._drop_stale()
+        return due
+
+
+class FirestoreReminderSource:
+    """Feeds the daemon from a snapshot listener on this shard's pending reminders."""
+
+    def __init__(self, db, shard=None):
+        from scheduler import SHARD_INDEX
+
+        self.db = db
+        self.shard = SHARD_INDEX if shard is None else shard
+
+    def subscribe(self, horizon_end, on_upsert, on_remove):
+        from google.cloud import firestore
+        from scheduler import _in_shard
+
+        query = (
+            _in_shard(self.db.collection("reminders"), self.shard)
+            .where(filter=firestore.FieldFilter("status", "==", "pending"))
+            .where(filter=firestore.FieldFilter("scheduled_time", "<=", horizon_end))
+        )
+
+        def on_snapshot(_docs, changes, _read_time):
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    on_remove(doc.id)
+                else:
+                    on_upsert(doc.id, (doc.to_dict() or {}).get("scheduled_time"))
+
+        watch = query.on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+    def _refs(self, reminder_ids):
+        return [self.db.collection("reminders").document(rid) for rid in reminder_ids]
+
+    def claim(self, reminder_ids):
+        from scheduler import claim_reminders
+
+        return [ref.id for ref in claim_reminders(self._refs(reminder_ids))]
+
+    def release(self, reminder_ids):
+        from scheduler import release_reminders
+
+        release_reminders(self._refs(reminder_ids))
+
+    def recover(self):
+        """Ids of reminders whose lease expired without being released."""
+        from scheduler import _expired_leases_query
+
+        now = datetime.now(timezone.utc)
+        return [doc.id for doc in _expired_leases_query(now, shard=self.shard).stream()]
+
+    def top_up(self):
+        from recurrence import top_up_recurring_reminders
+
+        return top_up_recurring_reminders()["occurrences"]
+
+
+class InMemoryReminderSource:
+    """Stand-in source for tests and local runs; mirrors the Firestore contract."""
+
+    def __init__(self, lease_seconds=120, clock=time.time, max_claim_attempts=None):
+        from scheduler import MAX_CLAIM_ATTEMPTS
+
+        self._lock = threading.Lock()
+        self.lease_seconds = lease_seconds
+        self.max_claim_attempts = max_claim_attempts or MAX_CLAIM_ATTEMPTS
+        self.clock = clock
+        self.reminders = {}
+        self.claimed = []
+        self.released = []
+        self._listeners = []
+
+    def add(self, reminder_id, scheduled_time, status="pending"):
+        with self._lock:
+            self.reminders[reminder_id] = {"scheduled_time": scheduled_time, "status": status}
+            listeners = list(self._listeners)
+        for horizon_end, on_upsert, on_remove in listeners:
+            if status == "pending" and scheduled_time <= horizon_end:
+                on_upsert(reminder_id, scheduled_time)
+            else:
+                on_remove(reminder_id)
+
+    def remove(self, reminder_id):
+        with self._lock:
+            self.reminders.pop(reminder_id, None)
+            listeners = list(self._listeners)
+        for _, _, on_remove in listeners:
+            on_remove(reminder_id)
+
+    def subscribe(self, horizon_end, on_upsert, on_remove):
+        entry = (horizon_end, on_upsert, on_remove)
+        with self._lock:
+            self._listeners.append(entry)
+            initial = [
+                (rid, r["scheduled_time"]) for rid, r in self.reminders.items()
+                if r["status"] == "pending" and r["scheduled_time"] <= horizon_end
+            ]
+        for rid, scheduled_time in initial:
+            on_upsert(rid, scheduled_time)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._listeners:
+                    self._listeners.remove(entry)
+
+        return unsubscribe
+
+    def _claimable(self, reminder, now):
+        if reminder["status"] == "pending":
+            return True
+        lease = reminder.get("lease_expires_at")
+        return reminder["status"] == "pinging" and lease is not None and lease <= now
+
+    def claim(self, reminder_ids):
+        claimed = []
+        with self._lock:
+            now = self.clock()
+            for rid in reminder_ids:
+                reminder = self.reminders.get(rid)
+                if not reminder or not self._claimable(reminder, now):
+                    continue
+                if reminder.get("claim_attempts", 0) >= self.max_claim_attempts:
+                    reminder["status"] = "failed"
+                    continue
+                reminder["status"] = "pinging"
+                reminder["lease_expires_at"] = now + self.lease_seconds
+                reminder["claim_attempts"] = reminder.get("claim_attempts", 0) + 1
+                claimed.append(rid)
+            self.claimed.extend(claimed)
+        return claimed
+
+    def release(self, reminder_ids):
+        with self._lock:
+            for rid in reminder_ids:
+                if rid in self.reminders:
+                    self.reminders[rid]["lease_expires_at"] = None
+            self.released.extend(reminder_ids)
+
+    def recover(self):
+        with self._lock:
+            now = self.clock()
+            return [
+                rid for rid, r in self.reminders.items()
+                if r["status"] == "pinging" and self._claimable(r, now)
+            ]
+
+    def top_up(self):
+        return 0
+
+
+class SchedulerDaemon:
+    """Sleeps until the earliest reminder is due, then claims and fires it."""
+
+    def __init__(self, source, on_fire=None, clock=time.time, horizon=HORIZON, on_fire_batch=None):
+        self.source = source
+        self.on_fire = on_fire
+        # Takes all claimed ids at once and returns those fired (e.g. one FCM batch).
+        self.on_fire_batch = on_fire_batch
+        self.clock = clock
+        self.horizon = horizon
+        self.heap = ReminderHeap()
+        self.stats = {
+            "fired": 0, "recovered": 0, "materialized": 0, "lag_ms_max": 0.0, "resubscribes": 0, "errors": 0,
+        }
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._dirty = False
+        self._unsubscribe = None
+        self._horizon_end = None
+        self._next_recovery = 0.0
+        self._next_top_up = 0.0
+
+    # --- listener callbacks (called from the listener thread) ---
+    def _on_upsert(self, reminder_id, scheduled_time):
+        due = _to_epoch(scheduled_time)
+        with self._cond:
+            if due is None:
+                self.heap.remove(reminder_id)
+            else:
+                self.heap.upsert(reminder_id, due)
+            self._dirty = True
+            self._cond.notify()
+
+    def _on_remove(self, reminder_id):
+        with self._cond:
+            self.heap.remove(reminder_id)
+            self._dirty = True
+            self._cond.notify()
+
+    def _resubscribe(self):
+        if self._unsubscribe:
+            unsubscribe, self._unsubscribe = self._unsubscribe, None
+            unsubscribe()
+        self._horizon_end = datetime.fromtimestamp(self.clock(), timezone.utc) + self.horizon
+        self._unsubscribe = self.source.subscribe(self._horizon_end, self._on_upsert, self._on_remove)
+        self.stats["resubscribes"] += 1
+
+    def _requeue(self, due):
+        with self._cond:
+            for rid, due_epoch in due:
+                if due_epoch is not None:
+                    self.heap.upsert(rid, due_epoch)
+
+    def _fire(self, due):
+        """
+        Claims, fires and releases. A failed fire keeps its lease so it is
+        retried on expiry; if the claim itself fails, the ids go back on the
+        heap (recovered ones are found again by recover()).
+        """
+        due_at = dict(due)
+        try:
+            claimed = self.source.claim(list(due_at))
+        except Exception:
+            self._requeue(due)
+            raise
+        if self.on_fire_batch and claimed:
+            try:
+                fired_ids = self.on_fire_batch(claimed)
+            except Exception as e:
+                print(f"⚠️ Scheduler batch fire error for {len(claimed)} reminder(s): {e}")
+                fired_ids = set()
+            fired = [rid for rid in claimed if rid in fired_ids]
+        else:
+            fired = []
+            for rid in claimed:
+                try:
+                    if self.on_fire:
+                        self.on_fire(rid)
+                except Exception as e:
+                    print(f"⚠️ Scheduler fire error for {rid}: {e}")
+                    continue
+                fired.append(rid)
+        for rid in fired:
+            if due_at[rid] is not None:
+                lag_ms = (self.clock() - due_at[rid]) * 1000
+                self.stats["lag_ms_max"] = max(self.stats["lag_ms_max"], round(lag_ms, 2))
+        if fired:
+            self.stats["fired"] += len(fired)
+            # Unreleased leases expire and are fired again, so this is retried by raising.
+            self.source.release(fired)
+
+    def run_once(self):
+        """Fires everything currently due. Returns seconds until the next due reminder."""
+        now = self.clock()
+        if now >= self._next_top_up:
+            # New occurrences reach the heap through the listener.
+            self._next_top_up = now + TOP_UP_INTERVAL_SECONDS
+            try:
+                self.stats["materialized"] += self.source.top_up()
+            except Exception as e:
+                # Occurrences already materialized keep firing; retried next interval.
+                print(f"⚠️ Scheduler top-up error: {e}")
+
+        if self._horizon_end is None or now >= self._horizon_end.timestamp() - self.horizon.total_seconds() / 2:
+            self._resubscribe()
+
+        with self._cond:
+            self._dirty = False
+            due = self.heap.pop_due(now)
+            next_due = self.heap.next_due()
+
+        if due:
+            self._fire(due)
+
+        if now >= self._next_recovery:
+            self._next_recovery = now + RECOVERY_INTERVAL_SECONDS
+            recovered = self.source.recover()
+            if recovered:
+                self.stats["recovered"] += len(recovered)
+                self._fire([(rid, None) for rid in recovered])
+
+        if next_due is None:
+            return MAX_SLEEP_SECONDS
+        return max(0.0, min(next_due - self.clock(), MAX_SLEEP_SECONDS))
+
+    def run(self):
+        print(f"✓ Scheduler daemon started (horizon {self.horizon})")
+        try:
+            failures = 0
+            while True:
+                try:
+                    timeout = self.run_once()
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    self.stats["errors"] += 1
+                    timeout = min(2 ** (failures - 1), MAX_ERROR_BACKOFF_SECONDS)
+                    print(f"⚠️ Scheduler iteration failed ({failures} in a row), retrying in {timeout}s: {e}")
+                with self._cond:
+                    if not (self._stopping or self._dirty):
+                        self._cond.wait(timeout)
+                    if self._stopping:
+                        break
+        finally:
+            if self._unsubscribe:
+                self._unsubscribe()
+            print(f"✓ Scheduler daemon stopped ({self.stats['fired']} fired)")
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+
+def main():
+    from config import db
+    from trigger_call import trigger_reminder_calls
+
+    if not db:
+        raise SystemExit("Firestore not available")
+
+    daemon = SchedulerDaemon(FirestoreReminderSource(db), on_fire_batch=trigger_reminder_calls)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
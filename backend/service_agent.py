@@ -6,6 +6,7 @@ Handles Reminders, Emergency, and Casual Talk with personalized context injectio
 from config import db, get_gemini_client # Fixed Import
 from google.cloud import firestore
 from datetime import datetime, timedelta, timezone
+from profile_cache import profile_cache
 import json
 
 SERVICE_PERSONAS = {
@@ -23,20 +24,53 @@ SERVICE_PERSONAS = {
     )
 }
 
-def get_service_context(user_id, service_type="casual"):
-    """Enriches the system prompt with Firestore profile data."""
-    try:
-        if not db: return SERVICE_PERSONAS.get(service_type)
+def build_context_snapshot(user_data):
+    """Flattens a 'users' document into the fields the voice agents use."""
+    user_data = user_data or {}
+    # Onboarding writes the profile at the top level; older docs nest it.
+    profile = user_data.get("profile") or user_data
+    return {
+        "full_name": profile.get("full_name") or "Friend",
+        "medications": list(profile.get("medications") or []),
+        "allergies": list(profile.get("allergies") or []),
+    }
+
+
+def get_user_context(user_id):
+    """Context snapshot built from the cached profile; no Firestore read on a hit."""
+    if not db or not user_id:
+        return build_context_snapshot({})
+    return build_context_snapshot(profile_cache.get(user_id))
+
 
-        user_doc = db.collection("users").document(user_id).get()
-        if not user_doc.exists: return SERVICE_PERSONAS.get(service_type)
+def get_dynamic_variables(user_id, service_type="casual", reminder=None, context=None):
+    """
+    ElevenLabs dynamic variables for a personalised session.
+    Pass `context` (a build_context_snapshot result) if it is already loaded.
+    """
+    context = context or get_user_context(user_id)
+    reminder = reminder or {}
+    return {
+        "user_name": context["full_name"],
+        "medications": ", ".join(context["medications"]) or "none recorded",
+        "allergies": ", ".join(context["allergies"]) or "none recorded",
+        "service_type": service_type,
+        "reminder_topic": reminder.get("name", "your health check"),
+        "specific_task": reminder.get("about", "ensure you are feeling well"),
+        "questions_to_ask": reminder.get("questions", "How are you feeling today?"),
+    }
 
-        profile = user_doc.to_dict().get("profile", {})
+
+def get_service_context(user_id, service_type="casual", context=None):
+    """Enriches the system prompt with the cached user profile."""
+    try:
         base_prompt = SERVICE_PERSONAS.get(service_type, SERVICE_PERSONAS["casual"])
-        
+        if not user_id: return base_prompt
+
+        profile = context or get_user_context(user_id)
         context = f"{base_prompt}\n\n--- USER CONTEXT ---\n"
-        context += f"Name: {profile.get('full_name', 'Friend')}\n"
-        context += f"Meds: {', '.join(profile.get('medications', []))}\n"
+        context += f"Name: {profile['full_name']}\n"
+        context += f"Meds: {', '.join(profile['medications'])}\n"
         return context
     except Exception as e:
         print(f"❌ Context Error: {e}")
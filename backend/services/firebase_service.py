@@ -1,16 +1,29 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
-import os
-
-def init_firestore():
-    # Path to your downloaded JSON key
-    key_path = os.path.join(os.path.dirname(__file__), '..', 'serviceAccountKey.json')
-    
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(key_path)
-        firebase_admin.initialize_app(cred)
-    
-    return firestore.client()
-
-# Export a single db instance to use everywhere
-db = init_firestore()
\ No newline at end of file
+import firebase_admin
+from firebase_admin import credentials, firestore
+import os
+import threading
+
+_lock = threading.Lock()
+_db = None
+
+def init_firestore():
+    """Initialises Firebase on first call and returns the shared Firestore client."""
+    global _db
+    with _lock:
+        if _db is None:
+            # Path to your downloaded JSON key
+            key_path = os.path.join(os.path.dirname(__file__), '..', 'serviceAccountKey.json')
+
+            if not firebase_admin._apps:
+                cred = credentials.Certificate(key_path)
+                firebase_admin.initialize_app(cred)
+
+            _db = firestore.client()
+    return _db
+
+# `from services.firebase_service import db` still works; the client is
+# created on first access instead of at import.
+def __getattr__(name):
+    if name == "db":
+        return init_firestore()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,158 @@
+"""
+ElevenLabs Signed URL Pool
+Keeps a few pre-minted conversation signed URLs per agent so starting a
+voice session does not wait on the ElevenLabs API.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import timed
+
+# ElevenLabs signed URLs are valid for 15 minutes; retire them well before that.
+DEFAULT_TTL_SECONDS = int(os.getenv("SIGNED_URL_TTL_SECONDS", "600"))
+DEFAULT_POOL_SIZE = int(os.getenv("SIGNED_URL_POOL_SIZE", "3"))
+
+
+def fetch_signed_url(el_client, agent_id):
+    """Blocking call to ElevenLabs for one conversation signed URL."""
+    with timed("elevenlabs", "get_signed_url"):
+        response = el_client.conversational_ai.conversations.get_signed_url(
+            agent_id=agent_id
+        )
+    return (
+        getattr(response, "signed_url", None)
+        or getattr(response, "url", None)
+        or str(response)
+    )
+
+
+async def fetch_signed_url_async(async_el_client, agent_id):
+    """Non-blocking variant for the async server (AsyncElevenLabs client)."""
+    with timed("elevenlabs", "get_signed_url"):
+        response = await async_el_client.conversational_ai.conversations.get_signed_url(
+            agent_id=agent_id
+        )
+    return (
+        getattr(response, "signed_url", None)
+        or getattr(response, "url", None)
+        or str(response)
+    )
+
+
+class SignedUrlPool:
+    def __init__(self, fetch, size=DEFAULT_POOL_SIZE, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        """
+        Args:
+            fetch (callable): agent_id -> signed URL (blocking)
+            size (int): URLs kept ready per agent
+            ttl (float): seconds before a pooled URL is discarded
+        """
+        self.fetch = fetch
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._pools = {}
+        self._wanted = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "refills": 0,
+            "refill_errors": 0,
+            "refill_latency_ms_total": 0.0,
+            "refill_latency_ms_max": 0.0,
+        }
+
+    def _ensure_refiller(self):
+        # Started lazily so forked server workers each get their own thread.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._refill_loop, name="signed-url-pool", daemon=True)
+            self._thread.start()
+
+    def _drop_expired(self, pool, now):
+        while pool and pool[0][0] <= now:
+            pool.popleft()
+            self._stats["expired"] += 1
+
+    def take(self, agent_id):
+        """Pops a pooled signed URL without blocking; None when the pool is empty."""
+        if not agent_id:
+            return None  # an unconfigured agent is never pooled, or it would be refilled forever
+        with self._cond:
+            self._wanted.add(agent_id)
+            pool = self._pools.setdefault(agent_id, deque())
+            self._drop_expired(pool, self.clock())
+            url = pool.popleft()[1] if pool else None
+            self._stats["hits" if url else "misses"] += 1
+            self._ensure_refiller()
+            self._cond.notify()
+        return url
+
+    def get(self, agent_id):
+        """Returns a never-used signed URL, fetching synchronously if the pool is empty."""
+        return self.take(agent_id) or self.fetch(agent_id)
+
+    async def get_async(self, agent_id, fetch_async):
+        """Like get(), awaiting `fetch_async(agent_id)` on a miss."""
+        return self.take(agent_id) or await fetch_async(agent_id)
+
+    def warm(self, agent_ids):
+        """Starts background filling for the given agents."""
+        with self._cond:
+            self._wanted.update(a for a in agent_ids if a)
+            self._ensure_refiller()
+            self._cond.notify()
+
+    def _next_refill(self):
+        """Picks an agent below target size, or returns seconds until the next expiry."""
+        now = self.clock()
+        next_expiry = None
+        for agent_id in self._wanted:
+            pool = self._pools.setdefault(agent_id, deque())
+            self._drop_expired(pool, now)
+            if len(pool) < self.size:
+                return agent_id, None
+            if pool:
+                next_expiry = pool[0][0] if next_expiry is None else min(next_expiry, pool[0][0])
+        return None, (None if next_expiry is None else max(next_expiry - now, 0.1))
+
+    def _refill_loop(self):
+        while True:
+            with self._cond:
+                agent_id, wait = self._next_refill()
+                if agent_id is None:
+                    self._cond.wait(wait)
+                    continue
+
+            started = time.perf_counter()
+            try:
+                url = self.fetch(agent_id)
+            except Exception as e:
+                print(f"⚠️ Signed URL refill failed for {agent_id}: {e}")
+                with self._cond:
+                    self._stats["refill_errors"] += 1
+                    self._cond.wait(5)
+                continue
+            latency_ms = (time.perf_counter() - started) * 1000
+
+            with self._cond:
+                self._pools.setdefault(agent_id, deque()).append((self.clock() + self.ttl, url))
+                self._stats["refills"] += 1
+                self._stats["refill_latency_ms_total"] += latency_ms
+                self._stats["refill_latency_ms_max"] = max(self._stats["refill_latency_ms_max"], latency_ms)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            served = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / served, 3) if served else None
+            stats["refill_latency_ms_avg"] = (
+                round(stats["refill_latency_ms_total"] / stats["refills"], 2) if stats["refills"] else None
+            )
+            stats["pooled"] = {agent_id: len(pool) for agent_id, pool in self._pools.items()}
+        return stats
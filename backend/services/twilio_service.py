@@ -1,17 +1,126 @@
 """
 Twilio WhatsApp Service
-Service for sending WhatsApp messages using Twilio API
+Service for sending WhatsApp messages using Twilio API.
+Bulk sends fan out over a bounded thread pool sharing one pooled HTTP
+session, throttled by a per-account token bucket. Set TWILIO_API_BASE to
+point the client at a local fake Twilio server.
 """
 
 import os
-from twilio.rest import Client
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+from metrics import timed
 
 load_dotenv()
 
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE")  # e.g. http://127.0.0.1:8765
+BULK_CONCURRENCY = int(os.getenv("TWILIO_BULK_CONCURRENCY", "8"))
+RATE_PER_SECOND = float(os.getenv("TWILIO_RATE_PER_SECOND", "10"))
+MAX_ATTEMPTS = int(os.getenv("TWILIO_MAX_ATTEMPTS", "4"))
+BACKOFF_SECONDS = 0.25
+REQUEST_TIMEOUT = 10
+
+# Only answers that mean Twilio did not accept the message are retried. A
+# timed-out or dropped POST may already have been sent, and retrying it
+# would send a duplicate (an SOS alert twice), so network errors are not.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER_SECONDS = 30
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+
+# Twilio's limits are per account, so every service instance for the same
+# account shares one bucket.
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def account_bucket(account_sid, rate=RATE_PER_SECOND):
+    with _buckets_lock:
+        if account_sid not in _buckets:
+            _buckets[account_sid] = TokenBucket(rate)
+        return _buckets[account_sid]
+
+
+def _retry_after_seconds(value):
+    """Retry-After as delta-seconds or an HTTP date; None if absent or unparseable."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _whatsapp_address(number):
+    return number if number.startswith("whatsapp:") else f"whatsapp:{number}"
+
+
+class PooledHttpClient(TwilioHttpClient):
+    """TwilioHttpClient with a connection pool sized for the fan-out and an optional base-URL override."""
+
+    def __init__(self, pool_size, api_base=None):
+        super().__init__(pool_connections=True, timeout=REQUEST_TIMEOUT)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.api_base = api_base.rstrip("/") if api_base else None
+        # Shared by the bulk pool's threads, so the last 429's Retry-After is per thread
+        self._local = threading.local()
+
+    def request(self, method, url, *args, **kwargs):
+        if self.api_base:
+            url = self.api_base + url.split(".twilio.com", 1)[-1]
+        response = super().request(method, url, *args, **kwargs)
+        self._local.retry_after = _retry_after_seconds(response.headers.get("Retry-After")) \
+            if response.status_code == 429 else None
+        return response
+
+    def retry_after(self):
+        """Seconds the last 429 on this thread asked us to wait, or None."""
+        return getattr(self._local, "retry_after", None)
+
 
 class TwilioWhatsAppService:
-    def __init__(self):
+    def __init__(self, api_base=TWILIO_API_BASE, max_workers=BULK_CONCURRENCY, rate_per_second=RATE_PER_SECOND):
         """Initialize Twilio client with credentials from environment variables"""
         self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
         self.auth_token = os.getenv("TWILIO_AUTH_TOKEN")
@@ -20,7 +129,34 @@ class TwilioWhatsAppService:
         if not all([self.account_sid, self.auth_token, self.from_whatsapp_number]):
             raise ValueError("Missing Twilio credentials. Please check your .env file.")
 
-        self.client = Client(self.account_sid, self.auth_token)
+        self.max_workers = max_workers
+        self.bucket = account_bucket(self.account_sid, rate_per_second)
+        self.http_client = PooledHttpClient(max_workers, api_base)
+        self.client = Client(self.account_sid, self.auth_token, http_client=self.http_client)
+
+    def _create(self, to_number, message_body):
+        """
+        One throttled Messages API call. 429/5xx answers are retried with
+        jittered backoff, or after Retry-After on a 429; anything else,
+        including timeouts, is raised.
+        """
+        # Twilio WhatsApp numbers must be prefixed with 'whatsapp:'
+        sender = _whatsapp_address(self.from_whatsapp_number)
+        recipient = _whatsapp_address(to_number)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.bucket.acquire()
+            try:
+                with timed("twilio", "messages.create"):
+                    message = self.client.messages.create(body=message_body, from_=sender, to=recipient)
+                return message, attempt
+            except TwilioRestException as e:
+                if e.status not in RETRYABLE_STATUS or attempt == MAX_ATTEMPTS:
+                    raise
+                retry_after = self.http_client.retry_after() if e.status == 429 else None
+            if retry_after is not None:
+                time.sleep(min(retry_after, MAX_RETRY_AFTER_SECONDS))
+            else:
+                time.sleep(random.uniform(0, BACKOFF_SECONDS * 2 ** (attempt - 1)))
 
     def send_message(self, to_number, message_body):
         """
@@ -34,40 +170,51 @@ class TwilioWhatsAppService:
         Returns:
             dict: Response containing message SID and status
         """
+        started = time.perf_counter()
         try:
-            # Twilio WhatsApp numbers must be prefixed with 'whatsapp:'
-            to_whatsapp = f"whatsapp:{to_number}"
-            from_whatsapp = f"whatsapp:{self.from_whatsapp_number}"
-
-            message = self.client.messages.create(
-                body=message_body, from_=from_whatsapp, to=to_whatsapp
-            )
+            message, attempts = self._create(to_number, message_body)
 
             return {
                 "success": True,
                 "message_sid": message.sid,
                 "status": message.status,
                 "to": to_number,
+                "attempts": attempts,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
                 "message": "Message sent successfully",
             }
 
         except Exception as e:
-            return {"success": False, "error": str(e), "to": to_number}
+            return {
+                "success": False,
+                "error": str(e),
+                "to": to_number,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
 
     def send_bulk_messages(self, contacts, message_body):
         """
-        Send the same message to multiple contacts
+        Send the same message to multiple contacts concurrently
 
         Args:
             contacts (list): List of phone numbers
             message_body (str): The message to send
 
         Returns:
-            list: List of response dictionaries for each contact
+            dict: per-recipient results (in contact order), sent/failed
+                  counts and the total fan-out latency
         """
-        results = []
-        for contact in contacts:
-            result = self.send_message(contact, message_body)
-            results.append(result)
-
-        return results
+        started = time.perf_counter()
+        contacts = list(contacts)
+        workers = max(1, min(self.max_workers, len(contacts)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="twilio-bulk") as pool:
+            results = list(pool.map(lambda contact: self.send_message(contact, message_body), contacts))
+
+        sent = sum(1 for r in results if r["success"])
+        return {
+            "success": sent == len(results),
+            "sent": sent,
+            "failed": len(results) - sent,
+            "results": results,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
@@ -0,0 +1,547 @@
+"""
+storage.py - Storage Backends and Repositories
+STORAGE_BACKEND picks what config.db is: "firestore" (default) or "memory",
+a thread-safe in-process client with the same API surface as the Firestore
+SDK (documents, equality/range filters, order_by, cursors, batches,
+transactions and write sentinels), for offline benchmarking and profiling.
+The repositories below wrap the users, reminders, call_logs and
+scheduled_tasks collections and work on either backend.
+"""
+
+import copy
+import functools
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from config import db
+
+_MISSING = object()
+
+
+# --- IN-MEMORY BACKEND ---
+
+
+def _pause(latency_ms, jitter=0.2):
+    if latency_ms:
+        time.sleep(latency_ms * random.uniform(1 - jitter, 1 + jitter) / 1000)
+
+
+def _normalize(value):
+    """Stored copy of a value; naive datetimes are read back as UTC, like Firestore."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return copy.deepcopy(value)
+
+
+def _resolve(value, current, now):
+    """Applies a write sentinel (SERVER_TIMESTAMP, Increment, ArrayUnion...) to `current`."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    number = current if isinstance(current, (int, float)) and not isinstance(current, bool) else None
+    if isinstance(value, transforms.Increment):
+        return (number or 0) + value.value
+    if isinstance(value, transforms.Maximum):
+        return value.value if number is None else max(number, value.value)
+    if isinstance(value, transforms.Minimum):
+        return value.value if number is None else min(number, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        items = list(current) if isinstance(current, list) else []
+        return items + [_normalize(v) for v in value.values if v not in items]
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in current if v not in value.values] if isinstance(current, list) else []
+    if isinstance(value, dict):
+        return {k: _resolve(v, _MISSING, now) for k, v in value.items() if v is not transforms.DELETE_FIELD}
+    return _normalize(value)
+
+
+def _set_path(data, parts, value, now):
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    if value is transforms.DELETE_FIELD:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = _resolve(value, data.get(parts[-1], _MISSING), now)
+
+
+def _merge_paths(data, prefix=()):
+    """Leaf field paths of a set(merge=True) payload; non-empty maps are merged, not replaced."""
+    for key, value in data.items():
+        if isinstance(value, dict) and value:
+            yield from _merge_paths(value, prefix + (key,))
+        else:
+            yield prefix + (key,), value
+
+
+def _lookup(data, field_path):
+    for part in field_path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+# Cross-type ordering used by Firestore: null < bool < number < timestamp < string < bytes < array < map
+def _type_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 7
+    return 8
+
+
+def _compare(a, b):
+    rank_a, rank_b = _type_rank(a), _type_rank(b)
+    if rank_a != rank_b:
+        return -1 if rank_a < rank_b else 1
+    if rank_a in (0, 8):
+        return 0
+    return (a > b) - (a < b)
+
+
+def _matches(value, op, target):
+    if value is _MISSING:
+        return False
+    if op == "==":
+        return value == target
+    if op == "!=":
+        return value is not None and value != target
+    if op == "in":
+        return value in target
+    if op == "not-in":
+        return value is not None and value not in target
+    if op == "array_contains":
+        return isinstance(value, list) and target in value
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(t in value for t in target)
+    # Range filters only match values of the same type.
+    if _type_rank(value) != _type_rank(target):
+        return False
+    order = _compare(value, target)
+    return {"<": order < 0, "<=": order <= 0, ">": order > 0, ">=": order >= 0}[op]
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self.exists else None
+
+    def get(self, field_path):
+        value = _lookup(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class MemoryQuery:
+    def __init__(self, store, collection_path, filters=(), orders=(), limit=None, cursor=None, fields=None):
+        self._store = store
+        self._collection_path = collection_path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters, "orders": self._orders, "limit": self._limit,
+            "cursor": self._cursor, "fields": self._fields, **changes,
+        }
+        return MemoryQuery(self._store, self._collection_path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, _normalize(value)),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction == "DESCENDING"),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        cursor = document_fields_or_snapshot
+        if isinstance(cursor, MemorySnapshot):
+            cursor = (cursor.id, cursor._data or {})
+        else:
+            cursor = (None, cursor)
+        return self._copy(cursor=cursor)
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(field_paths))
+
+    def _sort_key(self):
+        def compare(a, b):
+            for field_path, descending in self._orders:
+                order = _compare(_lookup(a[1], field_path), _lookup(b[1], field_path))
+                if order:
+                    return -order if descending else order
+            if a[0] is None or b[0] is None:
+                return 0
+            order = (a[0] > b[0]) - (a[0] < b[0])
+            descending = self._orders[-1][1] if self._orders else False
+            return -order if descending else order
+        return functools.cmp_to_key(compare)
+
+    def _matching(self, documents):
+        # Like Firestore, ordering on a field excludes documents without it.
+        required = [field_path for field_path, _ in self._orders]
+        return [
+            (doc_id, data) for doc_id, data in documents.items()
+            if all(_matches(_lookup(data, f), op, target) for f, op, target in self._filters)
+            and all(_lookup(data, f) is not _MISSING for f in required)
+        ]
+
+    def _run(self):
+        with self._store._lock:
+            # Filtered and sorted in place; only the returned page is copied.
+            items = self._matching(self._store._collections.get(self._collection_path, {}))
+            key = self._sort_key()
+            items.sort(key=key)
+            if self._cursor is not None:
+                cursor = key(self._cursor)
+                items = [item for item in items if key(item) > cursor]
+            if self._limit is not None:
+                items = items[:self._limit]
+            items = [(doc_id, copy.deepcopy(data)) for doc_id, data in items]
+        results = []
+        for doc_id, data in items:
+            if self._fields is not None:
+                projected = {}
+                for field_path in self._fields:
+                    value = _lookup(data, field_path)
+                    if value is not _MISSING:
+                        _set_path(projected, field_path.split("."), value, None)
+                data = projected
+            results.append(MemorySnapshot(MemoryDocument(self._store, self._collection_path, doc_id), data))
+        return results
+
+    def stream(self, transaction=None):
+        self._store._rpc("query")
+        return iter(self._run())
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction))
+
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, store, path):
+        super().__init__(store, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return MemoryDocument(self._store, self._collection_path, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+
+class MemoryDocument:
+    def __init__(self, store, collection_path, document_id):
+        self._store = store
+        self._collection_path = collection_path
+        self.id = document_id
+
+    @property
+    def path(self):
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self):
+        return MemoryCollection(self._store, self._collection_path)
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocument) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def collection(self, name):
+        return MemoryCollection(self._store, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        self._store._rpc("get")
+        return self._store._snapshot(self)
+
+    def _write(self, op, data=None, merge=False):
+        self._store._rpc("write")
+        self._store._commit([(op, self, data, merge)])
+
+    def set(self, document_data, merge=False):
+        self._write("set", document_data, merge)
+
+    def update(self, field_updates):
+        self._write("update", field_updates)
+
+    def create(self, document_data):
+        self._write("create", document_data)
+
+    def delete(self):
+        self._write("delete")
+
+
+class MemoryBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append(("update", reference, field_updates, False))
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, False))
+
+    def delete(self, reference):
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._store._rpc("commit")
+        writes, self._writes = self._writes, []
+        self._store._commit(writes)
+        return []
+
+
+class MemoryTransaction(MemoryBatch):
+    """
+    Works with the real @firestore.transactional decorator. Transactions are
+    serialised on the store lock, so they never conflict or retry.
+    """
+
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._id = None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._store._lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    def _release(self):
+        if self._id is not None:
+            self._id = None
+            self._store._lock.release()
+
+    def _commit(self):
+        try:
+            self.commit()
+        finally:
+            self._release()
+
+    def _rollback(self):
+        self._writes = []
+        self._release()
+
+    def get_all(self, references):
+        return self._store.get_all(references)
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, MemoryDocument):
+            return iter([ref_or_query.get()])
+        return ref_or_query.stream()
+
+
+class MemoryFirestore:
+    """
+    Thread-safe in-memory Firestore client. Each RPC can sleep `latency_ms`
+    to mimic the network (benchmarks/load_bench.py); the default is 0.
+    """
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.ops = Counter()
+        self._collections = {}  # collection path -> {document id: data}
+        self._lock = threading.RLock()
+
+    def _rpc(self, kind):
+        with self._lock:
+            self.ops[kind] += 1
+        _pause(self.latency_ms)
+
+    def _snapshot(self, ref):
+        with self._lock:
+            data = self._collections.get(ref._collection_path, {}).get(ref.id)
+            return MemorySnapshot(ref, copy.deepcopy(data))
+
+    def _commit(self, writes):
+        """Applies writes atomically: any NotFound/AlreadyExists leaves the store untouched."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            staged = {}
+            for op, ref, data, merge in writes:
+                key = (ref._collection_path, ref.id)
+                current = staged[key] if key in staged else self._collections.get(key[0], {}).get(key[1])
+                if op == "create" and current is not None:
+                    raise AlreadyExists(f"Document already exists: {ref.path}")
+                if op == "update" and current is None:
+                    raise NotFound(f"No document to update: {ref.path}")
+                if op == "delete":
+                    staged[key] = None
+                    continue
+                if op == "update":
+                    updated = copy.deepcopy(current)
+                    for field_path, value in data.items():
+                        _set_path(updated, field_path.split("."), value, now)
+                else:
+                    updated = copy.deepcopy(current) if merge and current is not None else {}
+                    for parts, value in _merge_paths(data):
+                        _set_path(updated, list(parts), value, now)
+                staged[key] = updated
+            for (collection_path, doc_id), data in staged.items():
+                documents = self._collections.setdefault(collection_path, {})
+                if data is None:
+                    documents.pop(doc_id, None)
+                else:
+                    documents[doc_id] = data
+
+    def collection(self, collection_path):
+        return MemoryCollection(self, collection_path)
+
+    def batch(self):
+        return MemoryBatch(self)
+
+    def transaction(self, **kwargs):
+        return MemoryTransaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self._rpc("get_all")
+        return [self._snapshot(ref) for ref in references]
+
+    def document_count(self, collection_path):
+        with self._lock:
+            return len(self._collections.get(collection_path, {}))
+
+
+# --- REPOSITORIES ---
+
+
+class Repository:
+    """Documents of one collection as plain dicts, on whichever client config.db is."""
+
+    collection_name = None
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def collection(self):
+        return self.client.collection(self.collection_name)
+
+    def ref(self, doc_id):
+        return self.collection.document(doc_id)
+
+    def get(self, doc_id):
+        doc = self.ref(doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_many(self, doc_ids):
+        """{doc_id: data} for the ids that exist, in one round trip."""
+        docs = self.client.get_all([self.ref(doc_id) for doc_id in doc_ids])
+        return {doc.id: doc.to_dict() for doc in docs if doc.exists}
+
+    def add(self, data):
+        _, ref = self.collection.add(data)
+        return ref.id
+
+    def set(self, doc_id, data, merge=False):
+        self.ref(doc_id).set(data, merge=merge)
+
+    def update(self, doc_id, fields):
+        self.ref(doc_id).update(fields)
+
+    def delete(self, doc_id):
+        self.ref(doc_id).delete()
+
+    def query(self, *filters, order_by=None, descending=False, fields=None, limit=None):
+        """
+        Args:
+            filters: (field, op, value) tuples, e.g. ("status", "==", "pending")
+            order_by (str): sort field; range filters must be on this field
+            fields (list): projection, as Query.select
+        """
+        query = self.collection
+        for field, op, value in filters:
+            query = query.where(filter=FieldFilter(field, op, value))
+        if order_by:
+            query = query.order_by(order_by, direction="DESCENDING" if descending else "ASCENDING")
+        if fields:
+            query = query.select(fields)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    def find(self, *filters, **options):
+        """[(doc_id, data)] for `query(*filters, **options)`."""
+        return [(doc.id, doc.to_dict()) for doc in self.query(*filters, **options).stream()]
+
+
+class UserRepository(Repository):
+    collection_name = "users"
+
+
+class ReminderRepository(Repository):
+    collection_name = "reminders"
+
+    def pending_for_user(self, user_id):
+        return self.find(("user_id", "==", user_id), ("status", "==", "pending"))
+
+
+class CallLogRepository(Repository):
+    collection_name = "call_logs"
+
+    def history(self, user_id, fields=None):
+        """Query over a user's calls, newest first (index: user_id, started_at desc)."""
+        return self.query(("user_id", "==", user_id), order_by="started_at", descending=True, fields=fields)
+
+
+class ScheduledTaskRepository(Repository):
+    collection_name = "scheduled_tasks"
+
+
+users = UserRepository(db)
+reminders = ReminderRepository(db)
+call_logs = CallLogRepository(db)
+scheduled_tasks = ScheduledTaskRepository(db)
@@ -14,6 +14,13 @@ from main import app  # Imports the Flask app and config clients
 
 
 client = app.test_client()
+# benchmarks/load_bench.py swaps in an HTTP client and turns output off.
+VERBOSE = True
+
+
+def _log(*args):
+    if VERBOSE:
+        print(*args)
 
 
 def _call_api(method: str, path: str, payload=None):
@@ -22,8 +29,9 @@ def _call_api(method: str, path: str, payload=None):
         body = resp.get_json()
     except Exception:
         body = resp.data.decode("utf-8")
-    print(f"\n[{method}] {path} -> {resp.status_code}")
-    print(json.dumps(body, indent=2) if isinstance(body, dict) else body)
+    if VERBOSE:
+        print(f"\n[{method}] {path} -> {resp.status_code}")
+        print(json.dumps(body, indent=2) if isinstance(body, dict) else body)
     return resp, body
 
 
@@ -51,12 +59,12 @@ def start_voice_session(agent: str, user_id: str, service_type: str = "casual"):
     }
     _, body = _call_api("POST", "/api/voice-session/start", payload)
     if isinstance(body, dict) and body.get("signed_url"):
-        print("\nSigned URL received. You can open it with a WebSocket client for a live call:")
-        print("  wscat -c \"<signed_url_here>\"")
+        _log("\nSigned URL received. You can open it with a WebSocket client for a live call:")
+        _log("  wscat -c \"<signed_url_here>\"")
 
 
 def onboarding_flow(user_id: str):
-    print("\n-- Onboarding flow --")
+    _log("\n-- Onboarding flow --")
     start_voice_session("onboarding", user_id)
     transcript = _make_transcript("Hello! I'm here to learn about your health.|Hi, I'm using aspirin and allergic to penicillin.")
     payload = {
@@ -94,7 +102,7 @@ def onboarding_flow(user_id: str):
 
 
 def service_flow(user_id: str):
-    print("\n-- Reminder service flow --")
+    _log("\n-- Reminder service flow --")
     start_voice_session("service", user_id, service_type="reminder")
     transcript = _make_transcript("Time for your morning pill.|Okay I will take it now.")
 
@@ -133,7 +141,7 @@ def service_flow(user_id: str):
     }
     _call_api("POST", "/api/calls/log", log_payload)
 
-    print("\n-- Emergency service flow --")
+    _log("\n-- Emergency service flow --")
     emergency_call = {
         "agent_type": "service",
         "service_type": "emergency",
@@ -152,7 +160,7 @@ def service_flow(user_id: str):
     }
     _call_api("POST", "/api/calls/log", emergency_call)
 
-    print("\n-- Casual/companionship flow --")
+    _log("\n-- Casual/companionship flow --")
     casual_call = {
         "agent_type": "service",
         "service_type": "casual",
@@ -175,7 +183,7 @@ def service_flow(user_id: str):
 
 
 def reminder_flow(user_id: str):
-    print("\n-- Reminder scheduling --")
+    _log("\n-- Reminder scheduling --")
     scheduled_time = (datetime.now(timezone.utc) + timedelta(minutes=1)).isoformat()
     payload = {
         "user_id": user_id,
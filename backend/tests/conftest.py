@@ -0,0 +1,41 @@
+"""
+Shared fixtures. Every test runs against a fresh storage.MemoryFirestore
+(STORAGE_BACKEND=memory, the in-memory backend of storage.py) and the
+fakes in benchmarks/, so the suite needs no credentials or network.
+Run with: `uv run python -m pytest -q`
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["STORAGE_BACKEND"] = "memory"
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "benchmarks")]
+
+import pytest  # noqa: E402
+
+import config  # noqa: E402
+from storage import MemoryFirestore  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def memory_db():
+    from profile_cache import profile_cache
+
+    client = MemoryFirestore()
+    config.db.override(client)
+    profile_cache.clear()
+    yield client
+    profile_cache.clear()
+
+
+@pytest.fixture
+def fake_twilio(monkeypatch):
+    from fake_twilio import FakeTwilio
+
+    fake = FakeTwilio().start()
+    monkeypatch.setenv("TWILIO_ACCOUNT_SID", "AC" + "0" * 32)
+    monkeypatch.setenv("TWILIO_AUTH_TOKEN", "fake-token")
+    monkeypatch.setenv("TWILIO_WHATSAPP_NUMBER", "+10000000000")
+    yield fake
+    fake.stop()
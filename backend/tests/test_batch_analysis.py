@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import config
+from batch_analysis import MAX_ANALYSIS_ATTEMPTS, analyze_pending_calls
+from fakes import FakeGemini
+from storage import call_logs, users
+from transcripts import save_call_log
+
+START = datetime(2026, 10, 18, 4, 0, tzinfo=timezone.utc)
+
+
+class RecordingGemini(FakeGemini):
+    def __init__(self, fail=False):
+        super().__init__()
+        self.fail = fail
+        self.prompts = []
+
+    def generate_content(self, model, contents, config=None):
+        self.prompts.append(contents)
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        return super().generate_content(model, contents, config)
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    from extraction_cache import extraction_cache
+
+    fake = RecordingGemini()
+    config.gemini_client.override(fake)
+    monkeypatch.setattr(extraction_cache, "get", lambda key: None)
+    return fake
+
+
+def _pending_call(call_id, minutes_ago, text="I am not sure, maybe, I don't remember"):
+    save_call_log(call_id, {
+        "call_id": call_id,
+        "user_id": "u1",
+        "started_at": START.isoformat(),
+        "created_at": START - timedelta(minutes=minutes_ago),
+        "analysis_pending": True,
+        "transcript": [
+            {"role": "assistant", "text": "Did you take your medicine?"},
+            {"role": "user", "text": "ok"},
+            {"role": "user", "text": "hmm"},
+            {"role": "user", "text": text},
+        ],
+    })
+
+
+def test_batch_prompts_use_compacted_transcripts(gemini):
+    _pending_call("c1", 5)
+
+    analyze_pending_calls()
+
+    [prompt] = gemini.prompts
+    assert "### CALL c1" in prompt
+    assert "USER: ok\n" not in prompt and "USER: hmm\n" not in prompt
+    assert not call_logs.get("c1")["analysis_pending"]
+
+
+def test_oldest_pending_calls_go_first(gemini):
+    _pending_call("newer", 1)
+    _pending_call("older", 30)
+
+    result = analyze_pending_calls(limit=1)
+
+    assert result["analysed"] == 1
+    assert not call_logs.get("older")["analysis_pending"]
+    assert call_logs.get("newer")["analysis_pending"]
+
+
+def test_calls_that_keep_failing_are_given_up_on(gemini, monkeypatch):
+    monkeypatch.setattr("wellbeing._user_zone", lambda user_id: timezone.utc)
+    gemini.fail = True
+    _pending_call("c1", 5)
+
+    for attempt in range(1, MAX_ANALYSIS_ATTEMPTS + 1):
+        result = analyze_pending_calls()
+        assert result["failed"] == ["c1"]
+        assert call_logs.get("c1")["analysis_attempts"] == attempt
+
+    call = call_logs.get("c1")
+    assert call["analysis_tier"] == "failed" and not call["analysis_pending"]
+    assert result["given_up"] == ["c1"]
+    assert analyze_pending_calls()["analysed"] == 0 and len(gemini.prompts) == MAX_ANALYSIS_ATTEMPTS
+    rollup = users.ref("u1").collection("wellbeing").document("day-2026-10-18").get().to_dict()
+    assert rollup["calls"] == 1 and rollup["categories"] == {"reminder": 1}
+
+
+def test_call_deleted_during_analysis_does_not_lose_the_others(gemini, monkeypatch):
+    _pending_call("c1", 5)
+    _pending_call("c2", 4)
+    generate = gemini.generate_content
+
+    def delete_then_generate(model, contents, config=None):
+        call_logs.delete("c2")  # the user deleted this call mid-run
+        return generate(model, contents, config)
+
+    monkeypatch.setattr(gemini.models, "generate_content", delete_then_generate)
+    analyze_pending_calls()
+
+    assert call_logs.get("c1")["analysis_tier"] == "llm_batch"
+    assert call_logs.get("c2") is None
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import emergency
+from device_tokens import register_token
+from emergency import SosDispatcher
+from storage import call_logs, users
+
+
+def _wait_done(fanout, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = fanout.snapshot()
+        if not snapshot["pending"] and not snapshot["pending_lookups"]:
+            return snapshot
+        time.sleep(0.01)
+    raise AssertionError(f"fan-out did not finish: {fanout.snapshot()}")
+
+
+def test_sends_start_before_device_lookups_finish(monkeypatch):
+    lookup_started, release_lookup, whatsapp_sent = threading.Event(), threading.Event(), threading.Event()
+    pushes = []
+
+    def slow_get_tokens(user_id):
+        lookup_started.set()
+        release_lookup.wait(5)
+        return ["account-token", "inline-token"]
+
+    def send_whatsapp(number, text):
+        whatsapp_sent.set()
+        return {"success": True}
+
+    monkeypatch.setattr(emergency, "get_tokens", slow_get_tokens)
+    dispatcher = SosDispatcher(send_whatsapp, send_push=lambda *args: pushes.append(args[0]) or {"success": True},
+                               record=lambda *args: None)
+    contacts = [{"name": "Asha", "number": "+15550001", "user_id": "family-1", "fcm_token": "inline-token"}]
+
+    fanout = dispatcher.dispatch("sos_u1_x", contacts, "help")
+    fanout.mark_logged()
+
+    assert whatsapp_sent.wait(5) and lookup_started.wait(5)
+    assert fanout.snapshot()["pending_lookups"] == 1
+    release_lookup.set()
+    snapshot = _wait_done(fanout)
+
+    assert sorted(pushes) == ["account-token", "inline-token"]
+    assert snapshot["contacts_targeted"] == 3 and snapshot["sent"] == 3
+
+
+def test_sos_ids_are_unique_per_user_and_incident(monkeypatch):
+    from main import app, sos_dispatcher
+
+    monkeypatch.setattr(sos_dispatcher, "send_push", lambda *args: {"success": True})
+    register_token("family-1", "tok-1")
+    for user_id in ("u1", "u2"):
+        users.set(user_id, {"full_name": user_id, "emergency_contacts": [{"name": "Kin", "user_id": "family-1"}]})
+    client = app.test_client()
+
+    ids = [client.post("/api/emergency/trigger", json={"user_id": u}).get_json()["call_id"] for u in ("u1", "u2", "u1")]
+
+    assert len(set(ids)) == 3
+    assert ids[0].startswith("sos_u1_") and ids[1].startswith("sos_u2_")
+    for call_id, user_id in zip(ids, ("u1", "u2", "u1")):
+        assert call_logs.get(call_id)["user_id"] == user_id
+
+
+def test_send_workers_do_not_wait_for_the_call_log():
+    recorded = []
+    dispatcher = SosDispatcher(lambda number, text: {"success": True}, workers=1,
+                               record=lambda call_id, key, *rest: recorded.append(key))
+    contacts = [{"name": f"c{i}", "number": f"+1555000{i}"} for i in range(3)]
+
+    fanout = dispatcher.dispatch("sos_u1_y", contacts, "help")
+    snapshot = _wait_done(fanout, timeout=2)  # one worker, log not written yet
+
+    assert snapshot["sent"] == 3 and recorded == []
+    fanout.mark_logged()
+    deadline = time.monotonic() + 5
+    while len(recorded) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(recorded) == [f"whatsapp_1555000{i}" for i in range(3)]
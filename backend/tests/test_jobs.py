@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import jobs
+from jobs import JobQueue
+
+
+def _wait_for(queue, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if (queue.get(job_id) or {}).get("status") == status:
+            return
+        time.sleep(0.01)
+    raise AssertionError(queue.get(job_id))
+
+
+def _doc(memory_db, job_id):
+    return memory_db.collection("jobs").document(job_id).get().to_dict()
+
+
+def test_submit_does_not_wait_on_firestore(memory_db, monkeypatch):
+    monkeypatch.setattr(JobQueue, "_ensure_workers", lambda self: None)
+    queue = JobQueue(persist=True, owner="a")
+    queue.register("reminder", lambda *args: None)
+    memory_db.ops.clear()
+
+    job_id = queue.submit("reminder", [{"role": "user", "text": "done"}], "u1", "c1")
+
+    assert sum(memory_db.ops.values()) == 0
+    queue.sync()
+    doc = _doc(memory_db, job_id)
+    assert doc["status"] == "queued" and doc["lease_owner"] == "a"
+    assert '"c1"' in doc["payload"]
+
+
+def test_job_of_a_dead_process_is_reclaimed_and_rerun(memory_db, monkeypatch):
+    ran = []
+    monkeypatch.setattr(JobQueue, "_ensure_workers", lambda self: None)
+    dead = JobQueue(persist=True, owner="dead")
+    dead.register("reminder", lambda *args: None)
+    job_id = dead.submit("reminder", [], "u1", "c1")
+    dead.sync()
+    monkeypatch.undo()
+
+    alive = JobQueue(workers=1, persist=True, owner="alive")
+    alive.register("reminder", lambda *args: ran.append(args))
+    later = datetime.now(timezone.utc) + timedelta(seconds=jobs.JOB_LEASE_SECONDS + 1)
+
+    assert alive.reclaim(datetime.now(timezone.utc)) == []  # lease still live
+    assert alive.reclaim(later) == [job_id]
+
+    _wait_for(alive, job_id, "succeeded")
+    assert ran == [([], "u1", "c1")]
+    alive.sync()
+    doc = _doc(memory_db, job_id)
+    assert doc["status"] == "succeeded" and doc["lease_expires_at"] is None and "payload" not in doc
+    assert jobs.get_job(job_id) is not None
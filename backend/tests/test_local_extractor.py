@@ -0,0 +1,77 @@
+import pytest
+
+from local_extractor import LOCAL_CONFIDENCE_THRESHOLD, analyze_reminder_tiered
+
+
+def _user(text):
+    return [{"role": "assistant", "text": "Have you taken your medicine?"}, {"role": "user", "text": text}]
+
+
+@pytest.mark.parametrize("reply", [
+    "I haven't taken it yet",
+    "No, I have not taken my pills today",
+    "I'm not done with breakfast, I'll take it after",
+    "I forgot. Not taken",
+    "I took it yesterday but not today.",
+])
+def test_negated_replies_are_never_completed_locally(reply):
+    llm_calls = []
+
+    def llm():
+        llm_calls.append(reply)
+        return {"action_status": "pending"}
+
+    analysis, tier, confidence = analyze_reminder_tiered(_user(reply), llm)
+
+    assert tier == "llm" and llm_calls
+    assert confidence < LOCAL_CONFIDENCE_THRESHOLD
+    assert analysis["action_status"] != "completed"
+
+
+def test_negated_mood_cue_is_not_read_as_happy():
+    analysis, tier, _ = analyze_reminder_tiered(_user("I took it, but I'm not feeling good"), None)
+
+    assert analysis["mood_detected"] != "happy"
+    assert tier == "deferred"
+
+
+@pytest.mark.parametrize("reply, status", [
+    ("Yes, I took it. Feeling good today", "completed"),
+    ("Okay I will take it now.", "completed"),
+    ("I've already taken my aspirin", "completed"),
+    ("Remind me later please", "delayed"),
+    ("I don't want them", "refused"),
+])
+def test_plain_replies_stay_local(reply, status):
+    analysis, tier, _ = analyze_reminder_tiered(_user(reply), None)
+
+    assert tier == "local"
+    assert analysis["action_status"] == status
+
+
+@pytest.mark.parametrize("reply", [
+    "I already had lunch.",
+    "I just had breakfast.",
+    "I just took a nap.",
+])
+def test_meals_and_naps_are_not_doses(reply):
+    analysis, tier, confidence = analyze_reminder_tiered(_user(reply), None)
+
+    assert tier == "deferred"
+    assert analysis["action_status"] != "completed"
+
+
+def test_llm_action_status_replaces_an_unsure_local_one():
+    analysis, tier, _ = analyze_reminder_tiered(_user("I took it yesterday but not today."),
+                                                lambda: {"action_status": "pending"})
+
+    assert tier == "llm" and analysis["action_status"] == "pending"
+
+
+def test_allergies_are_saved_on_the_call_log():
+    from calllogs import process_reminder_call_log
+    from storage import call_logs
+
+    process_reminder_call_log(_user("I took my aspirin. I'm allergic to penicillin."), "u1", call_id="c1")
+
+    assert call_logs.get("c1")["allergies_mentioned"] == ["penicillin"]
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from profile_cache import ProfileCache
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    started, release = threading.Event(), threading.Event()
+    versions = iter(["stale", "fresh"])
+
+    def loader(user_id):
+        value = next(versions)
+        if value == "stale":
+            started.set()
+            release.wait(5)
+        return {"v": value}
+
+    cache = ProfileCache(loader)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(cache.get("u1")))
+    reader.start()
+    started.wait(5)
+    cache.invalidate("u1")
+    release.set()
+    reader.join(5)
+
+    assert results == [{"v": "stale"}]
+    assert cache.get("u1") == {"v": "fresh"}
+    assert cache.get("u1") == {"v": "fresh"}
+    assert cache.stats()["misses"] == 2
+
+
+def test_bookkeeping_stays_bounded():
+    cache = ProfileCache(lambda user_id: {"id": user_id}, max_entries=10)
+    for i in range(100):
+        cache.get(f"u{i}")
+        cache.invalidate(f"u{i - 50}")
+
+    def failing(user_id):
+        raise RuntimeError("firestore down")
+
+    cache.loader = failing
+    with pytest.raises(RuntimeError):
+        cache.get("missing")
+
+    assert cache.stats()["size"] == 10
+    assert cache._loads == {}
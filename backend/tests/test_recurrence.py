@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+
+from recurrence import save_reminder_rules, top_up_recurring_reminders
+from storage import reminders
+
+NOW = datetime(2026, 10, 18, 2, 0, tzinfo=timezone.utc)  # 07:30 in Asia/Kolkata
+
+
+def _rules(memory_db, user_id="u1"):
+    return {doc.id: doc.to_dict() for doc in memory_db.collection("reminder_rules").stream()
+            if doc.to_dict()["user_id"] == user_id}
+
+
+def _pending(rule_id):
+    return reminders.find(("rule_id", "==", rule_id), ("status", "==", "pending"))
+
+
+def test_same_medication_at_two_times_keeps_both_rules(memory_db):
+    ids = save_reminder_rules("u1", [
+        {"name": "Metformin", "time": "08:00 AM", "frequency": "Daily"},
+        {"name": "Metformin", "time": "08:00 PM", "frequency": "Daily"},
+    ], "Asia/Kolkata", now=NOW)
+
+    assert len(set(ids)) == 2
+    for rule_id in ids:
+        assert _pending(rule_id)
+
+
+def test_reminders_without_a_name_do_not_collide(memory_db):
+    ids = save_reminder_rules("u1", [
+        {"about": "Aspirin", "time": "09:00 AM", "frequency": "Daily"},
+        {"about": "Vitamin D", "time": "09:00 AM", "frequency": "Daily"},
+    ], "Asia/Kolkata", now=NOW)
+
+    assert len(set(ids)) == 2
+
+
+def test_rules_missing_from_a_new_onboarding_are_deactivated(memory_db):
+    first = save_reminder_rules("u1", [
+        {"name": "Metformin", "time": "08:00 AM", "frequency": "Daily"},
+        {"name": "Aspirin", "time": "09:00 PM", "frequency": "Daily"},
+    ], "Asia/Kolkata", now=NOW)
+    save_reminder_rules("u2", [{"name": "Aspirin", "time": "09:00 PM", "frequency": "Daily"}], now=NOW)
+
+    second = save_reminder_rules("u1", [{"name": "Metformin", "time": "08:00 AM", "frequency": "Daily"}],
+                                 "Asia/Kolkata", now=NOW)
+
+    rules = _rules(memory_db)
+    dropped = (set(first) - set(second)).pop()
+    assert not rules[dropped]["active"] and not _pending(dropped)
+    assert rules[second[0]]["active"] and _pending(second[0])
+    assert all(rule["active"] for rule in _rules(memory_db, "u2").values())
+
+
+def test_once_rule_without_a_date_fires_once_and_expires(memory_db):
+    [rule_id] = save_reminder_rules("u1", [{"name": "Doctor visit", "time": "06:00 PM", "frequency": "Once"}],
+                                    "Asia/Kolkata", now=NOW)
+
+    rule = _rules(memory_db)[rule_id]
+    assert rule["date"] == "2026-10-18"
+    assert not rule["active"]
+    assert len(_pending(rule_id)) == 1
+
+    top_up_recurring_reminders(now=NOW.replace(day=20))
+    assert len(_pending(rule_id)) == 1
+
+
+def test_reonboarding_on_another_day_keeps_a_weekly_rules_weekday(memory_db):
+    [rule_id] = save_reminder_rules("u1", [{"name": "Yoga", "time": "07:00 PM", "frequency": "Weekly"}],
+                                    "Asia/Kolkata", now=NOW)
+    before = {doc_id for doc_id, _ in _pending(rule_id)}
+
+    later = NOW.replace(day=20)  # a Tuesday
+    assert save_reminder_rules("u1", [{"name": "Yoga", "time": "07:00 PM", "frequency": "Weekly"}],
+                               "Asia/Kolkata", now=later) == [rule_id]
+
+    rule = _rules(memory_db)[rule_id]
+    assert rule["weekday"] == NOW.weekday() and rule["active"]
+    assert before and before <= {doc_id for doc_id, _ in _pending(rule_id)}
+
+
+def test_weekday_from_the_extraction_is_used(memory_db):
+    [rule_id] = save_reminder_rules("u1", [
+        {"name": "Yoga", "time": "07:00 PM", "frequency": "Weekly", "weekday": "Wednesday"},
+    ], "Asia/Kolkata", now=NOW)
+
+    assert _rules(memory_db)[rule_id]["weekday"] == 2
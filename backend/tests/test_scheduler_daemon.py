@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import scheduler_daemon
+from scheduler import MAX_CLAIM_ATTEMPTS, claim_reminders
+from scheduler_daemon import RECOVERY_INTERVAL_SECONDS, InMemoryReminderSource, SchedulerDaemon
+from storage import reminders
+
+START = datetime(2026, 10, 18, 8, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.now = START.timestamp()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def _daemon(clock, on_fire, **source_options):
+    source = InMemoryReminderSource(lease_seconds=120, clock=clock, **source_options)
+    return source, SchedulerDaemon(source, on_fire=on_fire, clock=clock)
+
+
+def test_fires_when_due_and_releases(clock):
+    fired = []
+    source, daemon = _daemon(clock, fired.append)
+    source.add("r1", START + timedelta(seconds=30))
+
+    assert daemon.run_once() == pytest.approx(30)
+    assert fired == []
+
+    clock.advance(30)
+    daemon.run_once()
+    assert fired == ["r1"]
+    assert source.released == ["r1"]
+    assert daemon.stats["fired"] == 1
+
+
+def test_claim_failure_puts_due_reminders_back(clock):
+    fired = []
+    source, daemon = _daemon(clock, fired.append)
+    source.add("r1", START)
+    claim = source.claim
+    source.claim = lambda ids: (_ for _ in ()).throw(ConnectionError("firestore unavailable"))
+
+    with pytest.raises(ConnectionError):
+        daemon.run_once()
+    assert len(daemon.heap) == 1
+
+    source.claim = claim
+    daemon.run_once()
+    assert fired == ["r1"]
+
+
+def test_failed_fire_is_recovered_after_lease_expiry(clock):
+    attempts = []
+
+    def on_fire(rid):
+        attempts.append(rid)
+        if len(attempts) == 1:
+            raise RuntimeError("push failed")
+
+    source, daemon = _daemon(clock, on_fire)
+    source.add("r1", START)
+    daemon.run_once()
+    assert source.reminders["r1"]["status"] == "pinging" and not source.released
+
+    clock.advance(max(121, RECOVERY_INTERVAL_SECONDS))
+    daemon.run_once()
+    assert attempts == ["r1", "r1"]
+    assert source.released == ["r1"]
+    assert daemon.stats["recovered"] == 1
+
+
+def test_poison_reminder_stops_after_max_claim_attempts(clock):
+    attempts = []
+
+    def on_fire(rid):
+        attempts.append(rid)
+        raise RuntimeError("always fails")
+
+    source, daemon = _daemon(clock, on_fire, max_claim_attempts=3)
+    source.add("r1", START)
+    for _ in range(6):
+        daemon.run_once()
+        clock.advance(max(121, RECOVERY_INTERVAL_SECONDS))
+
+    assert len(attempts) == 3
+    assert source.reminders["r1"]["status"] == "failed"
+
+
+def test_run_survives_iteration_errors(monkeypatch):
+    fired = []
+    source = InMemoryReminderSource()
+    daemon = SchedulerDaemon(source, on_fire=fired.append)
+    failures = iter([RuntimeError("top-up down"), ConnectionError("claim down")])
+    real_run_once = daemon.run_once
+
+    def flaky_run_once():
+        error = next(failures, None)
+        if error:
+            raise error
+        result = real_run_once()
+        if fired:
+            daemon.stop()
+        return result
+
+    monkeypatch.setattr(scheduler_daemon, "MAX_ERROR_BACKOFF_SECONDS", 0.01)
+    daemon.run_once = flaky_run_once
+    source.add("r1", datetime.now(timezone.utc))
+    daemon.run()
+
+    assert fired == ["r1"]
+    assert daemon.stats["errors"] == 2
+
+
+def test_firestore_claim_marks_exhausted_reminders_failed():
+    reminders.set("r1", {"status": "pending", "claim_attempts": MAX_CLAIM_ATTEMPTS})
+    reminders.set("r2", {"status": "pending"})
+
+    claimed = claim_reminders([reminders.ref("r1"), reminders.ref("r2")])
+
+    assert [ref.id for ref in claimed] == ["r2"]
+    assert reminders.get("r1")["status"] == "failed"
+    assert reminders.get("r2")["claim_attempts"] == 1
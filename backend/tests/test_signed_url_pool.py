@@ -0,0 +1,22 @@
+import main
+from services.signed_url_pool import SignedUrlPool
+
+
+def test_missing_agent_id_is_never_pooled():
+    fetched = []
+    pool = SignedUrlPool(lambda agent_id: fetched.append(agent_id) or "wss://signed")
+
+    assert pool.take(None) is None
+    pool.warm([None])
+
+    assert pool.stats()["pooled"] == {} and fetched == []
+
+
+def test_legacy_route_rejects_an_unconfigured_agent(monkeypatch):
+    monkeypatch.setattr(main, "CANSUAL_AGENT_ID", None)
+    fetched = []
+    monkeypatch.setattr(main.signed_url_pool, "fetch", lambda agent_id: fetched.append(agent_id))
+
+    response = main.app.test_client().get("/api/casual-voice-session/start")
+
+    assert response.status_code == 503 and fetched == []
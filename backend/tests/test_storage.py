@@ -0,0 +1,74 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+
+from storage import call_logs, reminders, users
+
+
+def test_merge_set_applies_nested_increments(memory_db):
+    ref = memory_db.collection("counters").document("c1")
+    for _ in range(3):
+        ref.set({"total": firestore.Increment(2), "by_kind": {"a": firestore.Increment(1)}}, merge=True)
+
+    assert ref.get().to_dict() == {"total": 6, "by_kind": {"a": 3}}
+
+
+def test_failed_batch_leaves_the_store_untouched(memory_db):
+    users.set("u1", {"name": "A"})
+    batch = memory_db.batch()
+    batch.set(users.ref("u2"), {"name": "B"})
+    batch.create(users.ref("u1"), {"name": "again"})
+
+    with pytest.raises(AlreadyExists):
+        batch.commit()
+    assert users.get("u2") is None
+    assert users.get("u1") == {"name": "A"}
+
+
+def test_history_is_newest_first_and_pages_with_cursors():
+    for i in range(5):
+        call_logs.set(f"c{i}", {"user_id": "u1", "started_at": f"2026-10-0{i + 1}T10:00:00Z"})
+    call_logs.set("other", {"user_id": "u2", "started_at": "2026-10-09T10:00:00Z"})
+
+    first = list(call_logs.history("u1").limit(2).stream())
+    rest = list(call_logs.history("u1").start_after(first[-1]).stream())
+
+    assert [d.id for d in first] == ["c4", "c3"]
+    assert [d.id for d in rest] == ["c2", "c1", "c0"]
+
+
+def test_get_many_skips_missing_documents():
+    users.set("u1", {"name": "A"})
+
+    assert users.get_many(["u1", "missing"]) == {"u1": {"name": "A"}}
+
+
+def test_equality_and_range_filters_with_order_by():
+    start = datetime(2026, 10, 18, tzinfo=timezone.utc)
+    for i in range(4):
+        reminders.set(f"r{i}", {"status": "pending", "scheduled_time": start + timedelta(hours=i)})
+    reminders.set("done", {"status": "fired", "scheduled_time": start})
+
+    due = reminders.find(("status", "==", "pending"), ("scheduled_time", "<=", start + timedelta(hours=2)),
+                         order_by="scheduled_time", descending=True)
+
+    assert [doc_id for doc_id, _ in due] == ["r2", "r1", "r0"]
+
+
+def test_concurrent_increments_are_not_lost(memory_db):
+    ref = memory_db.collection("counters").document("c1")
+
+    def bump():
+        for _ in range(100):
+            ref.set({"n": firestore.Increment(1)}, merge=True)
+
+    threads = [threading.Thread(target=bump) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert ref.get().to_dict() == {"n": 800}
@@ -0,0 +1,79 @@
+import pytest
+
+from calllogs import process_reminder_call_log
+import transcripts
+from transcripts import CHUNK_COLLECTION, append_turns, chunk_transcript, load_transcript, save_call_log, save_call_logs
+
+TURNS = [{"role": "user" if i % 2 else "assistant", "text": f"t{i}"} for i in range(6)]
+
+
+@pytest.fixture
+def client():
+    from main import app
+
+    return app.test_client()
+
+
+def _stream(call_id):
+    for seq in range(3):
+        assert append_turns(call_id, "u1", seq, TURNS[2 * seq:2 * seq + 2])
+
+
+def test_live_turns_are_read_back_in_order():
+    _stream("c1")
+    assert not append_turns("c1", "u1", 1, TURNS[2:4])  # client retry
+
+    assert [t["text"] for t in load_transcript("c1")] == [f"t{i}" for i in range(6)]
+
+
+def test_full_transcript_after_streaming_is_not_duplicated(client):
+    _stream("c1")
+
+    response = client.post("/api/calls/log", json={
+        "agent_type": "service", "service_type": "casual",
+        "call": {"call_id": "c1", "user_id": "u1", "started_at": "2026-10-18T10:00:00Z", "transcript": TURNS},
+    })
+    assert response.status_code == 201
+
+    call = client.get("/api/call/c1").get_json()
+    assert call["transcript_count"] == 6
+    assert [t["text"] for t in call["transcript"]] == [f"t{i}" for i in range(6)]
+
+
+def test_save_transcript_after_streaming_is_not_duplicated():
+    _stream("r1")
+    transcript = [{"role": "assistant", "text": "Did you take it?"}, {"role": "user", "text": "Yes, I took it"}]
+
+    process_reminder_call_log(transcript, "u1", "r1")
+
+    assert load_transcript("r1") == transcript
+
+
+def _chunk_ids(memory_db, call_id):
+    return [doc.id for doc in memory_db.collection("call_logs").document(call_id).collection(CHUNK_COLLECTION).stream()]
+
+
+def test_chunks_are_split_by_encoded_size(monkeypatch):
+    monkeypatch.setattr(transcripts, "CHUNK_MAX_BYTES", 1000)
+    turns = [{"role": "user", "text": "é" * 300} for _ in range(5)]  # ~620 encoded bytes each
+    too_long = {"role": "user", "text": "x" * 5000}
+
+    chunks = chunk_transcript(turns + [too_long])
+
+    assert [len(chunk) for chunk in chunks] == [1, 1, 1, 1, 1, 1]
+    assert all(sum(transcripts._turn_size(t) for t in chunk) <= 1000 for chunk in chunks)
+
+
+def test_shorter_transcript_removes_the_old_extra_chunks(memory_db, monkeypatch):
+    monkeypatch.setattr(transcripts, "TURNS_PER_CHUNK", 2)
+    save_call_log("c1", {"user_id": "u1", "transcript": TURNS})
+    assert len(_chunk_ids(memory_db, "c1")) == 3
+
+    save_call_log("c1", {"user_id": "u1", "transcript": TURNS[:2]})
+    assert _chunk_ids(memory_db, "c1") == ["00000"]
+    assert load_transcript("c1") == TURNS[:2]
+
+    list(save_call_logs([("k", "c1", {"user_id": "u1", "transcript": TURNS})]))
+    list(save_call_logs([("k", "c1", {"user_id": "u1", "transcript": TURNS[:4]})]))
+    assert len(_chunk_ids(memory_db, "c1")) == 2
+    assert load_transcript("c1") == TURNS[:4]
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+import device_tokens
+import trigger_call
+from profile_cache import ProfileCache, profile_cache
+from storage import users
+
+
+def _fake_send_each(sent):
+    def send_each(messages, app=None):
+        sent.append(len(messages))
+        responses = [SimpleNamespace(success=True, message_id=f"m{i}", exception=None) for i in range(len(messages))]
+        return SimpleNamespace(responses=responses, success_count=len(messages), failure_count=0)
+    return send_each
+
+
+def test_wave_reads_all_tokens_in_one_round_trip(memory_db, monkeypatch):
+    sent = []
+    monkeypatch.setattr(device_tokens.messaging, "send_each", _fake_send_each(sent))
+    monkeypatch.setattr(device_tokens, "get_firebase_app", lambda: None)
+    for i in range(30):
+        users.set(f"u{i}", {"fcm_tokens": [f"t{i}a", f"t{i}b"]})
+    profile_cache.get("u0")  # already cached: must not be re-read
+    memory_db.ops.clear()
+
+    calls = [(f"u{i}", f"r{i}") for i in range(30)] + [("ghost", "r-ghost")]
+    result = trigger_call.trigger_ai_calls(calls)
+
+    assert memory_db.ops["get_all"] == 1
+    assert memory_db.ops["get"] == 0
+    assert sent == [60]
+    assert result["sent"] == 60
+    assert result["no_devices"] == ["r-ghost"]
+    assert len(result["reached"]) == 30
+
+
+def test_get_many_releases_loads_when_the_read_fails():
+    def boom(ids):
+        raise RuntimeError("down")
+
+    cache = ProfileCache(lambda user_id: {"n": user_id}, many_loader=boom)
+    with pytest.raises(RuntimeError):
+        cache.get_many(["a", "b"])
+    assert cache._loads == {}
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,64 @@
+from services import twilio_service
+from services.twilio_service import MAX_ATTEMPTS, TokenBucket, TwilioWhatsAppService
+
+
+def test_bulk_send_reaches_every_contact(fake_twilio):
+    service = TwilioWhatsAppService(api_base=fake_twilio.base_url, rate_per_second=1000)
+    contacts = [f"+1555000{i:04d}" for i in range(6)]
+
+    result = service.send_bulk_messages(contacts, "Time for your medicine")
+
+    assert result["success"] and result["sent"] == 6
+    assert [r["to"] for r in result["results"]] == contacts
+    assert sorted(r["to"] for r in fake_twilio.requests) == [f"whatsapp:{c}" for c in contacts]
+
+
+def test_retryable_errors_stop_after_max_attempts(fake_twilio, monkeypatch):
+    monkeypatch.setattr(twilio_service, "BACKOFF_SECONDS", 0)
+    fake_twilio.error_rate = 1.0
+    service = TwilioWhatsAppService(api_base=fake_twilio.base_url, rate_per_second=1000)
+
+    result = service.send_message("+15550000001", "hello")
+
+    assert not result["success"]
+    assert len(fake_twilio.requests) == MAX_ATTEMPTS
+
+
+def test_token_bucket_waits_for_a_token():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0], sleep=sleep)
+    bucket.acquire()
+    bucket.acquire()
+
+    assert slept == [0.5]
+
+
+def test_timed_out_send_is_not_retried(fake_twilio, monkeypatch):
+    monkeypatch.setattr(twilio_service, "REQUEST_TIMEOUT", 0.2)
+    fake_twilio.latency_ms = 500
+    service = TwilioWhatsAppService(api_base=fake_twilio.base_url, rate_per_second=1000)
+
+    result = service.send_message("+15550000001", "SOS")
+
+    assert not result["success"]
+    assert len(fake_twilio.requests) == 1
+
+
+def test_429_waits_for_retry_after(fake_twilio, monkeypatch):
+    slept = []
+    sleep = twilio_service.time.sleep
+    # The fake server sleeps too (latency 0); only count the client's waits
+    monkeypatch.setattr(twilio_service.time, "sleep", lambda seconds: slept.append(seconds) if seconds else sleep(0))
+    monkeypatch.setattr("fake_twilio.random.choice", lambda options: 429)
+    fake_twilio.error_rate, fake_twilio.retry_after = 1.0, 3
+    service = TwilioWhatsAppService(api_base=fake_twilio.base_url, rate_per_second=1000)
+
+    service.send_message("+15550000001", "hello")
+
+    assert slept == [3.0] * (MAX_ATTEMPTS - 1)
@@ -0,0 +1,34 @@
+from datetime import date
+
+from storage import users
+from wellbeing import period_ids, record_call, record_calls
+
+CALL = {"started_at": "2026-10-18T09:00:00+00:00", "call_duration_seconds": 120, "mood_detected": "happy"}
+
+
+def _day(user_id):
+    day_id, _ = period_ids(date(2026, 10, 18))
+    return users.ref(user_id).collection("wellbeing").document(day_id).get().to_dict()
+
+
+def test_call_counted_meanwhile_by_record_call_is_not_counted_twice(memory_db, monkeypatch):
+    get_all = memory_db.get_all
+
+    def racing_get_all(refs):
+        docs = get_all(refs)  # the backlog sees no marker yet...
+        record_call("u1", "c1", "reminder", CALL)  # ...then the live path counts c1
+        return docs
+
+    monkeypatch.setattr(memory_db, "get_all", racing_get_all)
+    counted = record_calls([("u1", "c1", "reminder", CALL), ("u1", "c2", "reminder", CALL)])
+
+    assert counted == 1
+    assert _day("u1")["calls"] == 2
+    assert _day("u1")["mood"] == {"happy": 2}
+
+
+def test_backlog_is_split_so_markers_and_rollups_share_a_batch(memory_db):
+    calls = [(f"u{i}", f"c{i}", "reminder", CALL) for i in range(400)]
+    assert record_calls(calls) == 400
+    assert record_calls(calls) == 0
+    assert _day("u399")["calls"] == 1
@@ -0,0 +1,295 @@
+"""
+transcripts.py - Transcript Storage
+Transcripts live in call_logs/<call_id>/transcript_chunks, split by encoded
+size so every chunk, and the parent call log, stays under Firestore's 1 MiB
+document limit. The parent only keeps a turn count and
+a short summary. Turns streamed during a live call are stored as separate
+"live-" chunks; once a full transcript is saved its chunks take precedence.
+"""
+
+import json
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+
+from config import db
+
+CHUNK_COLLECTION = "transcript_chunks"
+TURNS_PER_CHUNK = 200
+# Encoded turns per chunk, leaving headroom under the 1 MiB limit for
+# field names and Firestore's own per-value overhead.
+CHUNK_MAX_BYTES = 900_000
+SUMMARY_CHARS = 280
+WRITE_BATCH_LIMIT = 500  # Firestore's cap on writes per batch
+
+
+def _chunk_id(index):
+    # Zero-padded so document ids sort in chunk order.
+    return f"{index:05d}"
+
+
+def _live_chunk_id(seq):
+    # Own namespace: live seq numbers and full-transcript chunk indexes overlap.
+    return f"live-{seq:05d}"
+
+
+def summarize_transcript(entries):
+    """Cheap, LLM-free preview: the first things the user said."""
+    user_lines = [e.get("text", "").strip() for e in entries or [] if e.get("role") == "user"]
+    summary = " / ".join(line for line in user_lines if line)
+    return summary[:SUMMARY_CHARS]
+
+
+def _turn_size(turn):
+    return len(json.dumps(turn, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _fit_turn(turn):
+    """A turn that alone exceeds CHUNK_MAX_BYTES has its text cut to fit."""
+    excess = _turn_size(turn) - CHUNK_MAX_BYTES
+    if excess <= 0:
+        return turn
+    print(f"⚠️ Truncating a {excess + CHUNK_MAX_BYTES}-byte transcript turn to fit a chunk")
+    text = (turn.get("text") or "").encode("utf-8")
+    return {**turn, "text": text[:max(0, len(text) - excess)].decode("utf-8", "ignore")}
+
+
+def chunk_transcript(entries):
+    """Splits turns into chunks of at most TURNS_PER_CHUNK turns and CHUNK_MAX_BYTES."""
+    chunks, current, size = [], [], 0
+    for turn in entries or []:
+        turn = _fit_turn(turn)
+        cost = _turn_size(turn)
+        if current and (size + cost > CHUNK_MAX_BYTES or len(current) >= TURNS_PER_CHUNK):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(turn)
+        size += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def transcript_fields(entries, chunks=None):
+    """Fields stored on the parent call log in place of the transcript."""
+    return {
+        "transcript_count": len(entries or []),
+        "transcript_summary": summarize_transcript(entries),
+        "transcript_chunks": len(chunk_transcript(entries) if chunks is None else chunks),
+    }
+
+
+def write_transcript(batch, call_ref, entries, old_chunks=0, chunks=None):
+    """
+    Queues the chunk writes for a transcript onto an existing write batch.
+    Chunks from index len(chunks) up to `old_chunks` (the parent's previous
+    transcript_chunks) are deleted, so a shorter transcript leaves none behind.
+    """
+    chunks = chunk_transcript(entries) if chunks is None else chunks
+    for index, turns in enumerate(chunks):
+        batch.set(call_ref.collection(CHUNK_COLLECTION).document(_chunk_id(index)), {
+            "index": index,
+            "turns": turns,
+        })
+    for index in range(len(chunks), old_chunks):
+        batch.delete(call_ref.collection(CHUNK_COLLECTION).document(_chunk_id(index)))
+
+
+def _stored_chunks(snapshots):
+    """{call_id: transcript_chunks} of existing parents, for write_transcript's cleanup."""
+    return {
+        snap.id: (snap.to_dict() or {}).get("transcript_chunks") or 0
+        for snap in snapshots if snap.exists
+    }
+
+
+def _queue_call_log(batch, call_ref, call_data, transcript_stored, old_chunks=0):
+    call_data = dict(call_data)
+    entries = call_data.pop("transcript", None) or []
+    chunks = [] if transcript_stored else chunk_transcript(entries)
+    fields = transcript_fields(entries, chunks)
+    if transcript_stored:
+        fields.pop("transcript_chunks")
+        fields["status"] = call_data.get("status", "completed")
+
+    batch.set(call_ref, {**call_data, **fields}, merge=transcript_stored)
+    if not transcript_stored:
+        write_transcript(batch, call_ref, entries, old_chunks, chunks)
+
+
+def save_call_log(call_id, call_data, transcript_stored=False):
+    """
+    Writes a call log with its transcript offloaded, in one batch.
+    `call_data` may contain a 'transcript' list; it is not stored inline.
+    With transcript_stored=True the chunks were already appended live and
+    only the parent document is written.
+    """
+    call_ref = db.collection("call_logs").document(call_id)
+    old_chunks = 0
+    if not transcript_stored:
+        old_chunks = _stored_chunks([call_ref.get(field_paths=["transcript_chunks"])]).get(call_id, 0)
+    batch = db.batch()
+    _queue_call_log(batch, call_ref, call_data, transcript_stored, old_chunks)
+    batch.commit()
+    return call_ref
+
+
+def call_log_write_count(call_data, old_chunks=0):
+    """Writes save_call_log makes for a call: the parent, its chunks and stale chunk deletes."""
+    chunks = transcript_fields(call_data.get("transcript"))["transcript_chunks"]
+    return 1 + max(chunks, old_chunks)
+
+
+def _commit(batch, pending):
+    try:
+        batch.commit()
+        error = None
+    except Exception as e:
+        error = str(e)
+    return [(key, call_id, error) for key, call_id in pending]
+
+
+def _save_group(group, limit):
+    """Commits a group of records, reading their parents' chunk counts in one round trip."""
+    refs = [db.collection("call_logs").document(call_id) for _, call_id, _ in group]
+    old = _stored_chunks(db.get_all(refs, field_paths=["transcript_chunks"]))
+    batch, pending, writes = db.batch(), [], 0
+    for (key, call_id, call_data), call_ref in zip(group, refs):
+        cost = call_log_write_count(call_data, old.get(call_id, 0))
+        if pending and writes + cost > limit:
+            yield from _commit(batch, pending)
+            batch, pending, writes = db.batch(), [], 0
+        _queue_call_log(batch, call_ref, call_data, False, old.get(call_id, 0))
+        pending.append((key, call_id))
+        writes += cost
+    if pending:
+        yield from _commit(batch, pending)
+
+
+def save_call_logs(records, limit=WRITE_BATCH_LIMIT):
+    """
+    save_call_log() for many calls in as few write batches as possible. A
+    batch holds up to `limit` writes and a call's writes never span two.
+    `records` is an iterable of (key, call_id, call_data), consumed lazily.
+    Yields (key, call_id, error) as batches commit; error is None on success.
+    """
+    group, writes = [], 0
+    for key, call_id, call_data in records:
+        cost = call_log_write_count(call_data)
+        if group and writes + cost > limit:
+            yield from _save_group(group, limit)
+            group, writes = [], 0
+        group.append((key, call_id, call_data))
+        writes += cost
+    if group:
+        yield from _save_group(group, limit)
+
+
+async def save_call_log_async(async_db, call_id, call_data, transcript_stored=False):
+    """save_call_log() on the async Firestore client."""
+    call_ref = async_db.collection("call_logs").document(call_id)
+    old_chunks = 0
+    if not transcript_stored:
+        old_chunks = _stored_chunks([await call_ref.get(field_paths=["transcript_chunks"])]).get(call_id, 0)
+    batch = async_db.batch()
+    _queue_call_log(batch, call_ref, call_data, transcript_stored, old_chunks)
+    await batch.commit()
+    return call_ref
+
+
+def _queue_turns(batch, call_ref, call_id, user_id, seq, turns):
+    batch.create(call_ref.collection(CHUNK_COLLECTION).document(_live_chunk_id(seq)), {
+        "index": seq,
+        "turns": turns,
+        "live": True,
+    })
+    batch.set(call_ref, {
+        "call_id": call_id,
+        "user_id": user_id,
+        "status": "in_progress",
+        "transcript_count": firestore.Increment(len(turns)),
+        "transcript_chunks": firestore.Increment(1),
+        "last_turn_at": firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+
+
+def append_turns(call_id, user_id, seq, turns):
+    """
+    Stores one live batch of turns as chunk `seq` of the call's transcript.
+    Chunks are create-only, so a client retrying the same seq is a no-op.
+    Returns False for such a duplicate.
+    """
+    call_ref = db.collection("call_logs").document(call_id)
+    batch = db.batch()
+    _queue_turns(batch, call_ref, call_id, user_id, seq, turns)
+    try:
+        batch.commit()
+    except AlreadyExists:
+        return False
+    return True
+
+
+async def append_turns_async(async_db, call_id, user_id, seq, turns):
+    """append_turns() on the async Firestore client."""
+    call_ref = async_db.collection("call_logs").document(call_id)
+    batch = async_db.batch()
+    _queue_turns(batch, call_ref, call_id, user_id, seq, turns)
+    try:
+        await batch.commit()
+    except AlreadyExists:
+        return False
+    return True
+
+
+def load_transcript(call_id, call_data=None):
+    """
+    Reads a call's transcript. Logs written before offloading still carry it
+    inline, so that copy is returned when present. A full transcript saved
+    at the end of a call replaces the turns streamed live.
+    """
+    if call_data and call_data.get("transcript"):
+        return call_data["transcript"]
+
+    chunks = (
+        db.collection("call_logs").document(call_id)
+        .collection(CHUNK_COLLECTION)
+        .order_by("index")
+        .stream()
+    )
+    turns = {False: [], True: []}
+    for chunk in chunks:
+        data = chunk.to_dict() or {}
+        turns[bool(data.get("live"))].extend(data.get("turns", []))
+    return turns[False] or turns[True]
+
+
+def migrate_inline_transcripts(page_size=100, dry_run=False):
+    """Moves transcripts stored inline on existing call logs into chunks."""
+    moved = 0
+    scanned = 0
+    last = None
+    while True:
+        query = db.collection("call_logs").order_by("__name__").limit(page_size)
+        if last is not None:
+            query = query.start_after(last)
+        page = list(query.stream())
+        if not page:
+            break
+
+        for doc in page:
+            scanned += 1
+            entries = (doc.to_dict() or {}).get("transcript")
+            if not entries or dry_run:
+                moved += 1 if entries else 0
+                continue
+            batch = db.batch()
+            write_transcript(batch, doc.reference, entries)
+            batch.update(doc.reference, {
+                **transcript_fields(entries),
+                "transcript": firestore.DELETE_FIELD,
+            })
+            batch.commit()
+            moved += 1
+        last = page[-1]
+
+    return {"scanned": scanned, "migrated": moved, "dry_run": dry_run}
@@ -1,28 +1,88 @@
-from services.firebase_service import init_firestore
+"""
+trigger_call.py - Incoming-call Pushes
+Wakes the VoiceCare app with a high-priority 'incoming_call' data push on
+every registered device of a user. A whole reminder wave looks up its
+users' tokens in one read and goes out through device_tokens.send_messages.
+Run with: `uv run python trigger_call.py <user_id> [<user_id> ...]`
+"""
+
+import argparse
+import json
+import uuid
 
 from firebase_admin import messaging
 
-init_firestore()
+from device_tokens import get_tokens_many, send_messages
+from storage import reminders
+
 
-def trigger_ai_call(fcm_token, caller_name="Voice Care"):
-    # Define the data payload
-    message = messaging.Message(
+def call_message(token, call_id, caller_name="Voice Care"):
+    return messaging.Message(
         data={
             'type': 'incoming_call',
-            'id': 'unique_call_123',
+            'id': call_id,
             'nameCaller': caller_name,
             'handle': 'Voice Session',
             'hasVideo': 'false',
         },
-        token=fcm_token,
+        token=token,
         android=messaging.AndroidConfig(
             priority='high', # Critical for waking up the app
         ),
     )
 
-    # Send message
-    response = messaging.send(message)
-    print(f"Successfully sent call trigger: {response}")
 
-# Example Usage:
-trigger_ai_call("cvwb33MWSfSMsPhfO-9oCi:APA91bF1Wdd1AaMh-n_MeWsVBFnHLqYY-0fJhSF4EupNdak-OCRvN6-8num5MhBXTGpli7I3Nwdv-KTPJJSro6bBaI42I9HMy3qzxbGNJJLMi6EAG9GxfdA")
\ No newline at end of file
+def trigger_ai_calls(calls, caller_name="Voice Care"):
+    """
+    Rings every device of each (user_id, call_id) pair.
+    Returns counts plus the call ids that reached at least one device and
+    those whose user has no registered device.
+    """
+    items, no_devices = [], []
+    tokens_by_user = get_tokens_many(user_id for user_id, _ in calls)
+    for user_id, call_id in calls:
+        tokens = tokens_by_user.get(user_id, [])
+        if not tokens:
+            no_devices.append(call_id)
+        items.extend((user_id, token, call_message(token, call_id, caller_name)) for token in tokens)
+
+    results = send_messages(items)
+    reached = {items[i][2].data['id'] for i, result in enumerate(results) if result["success"]}
+    return {
+        "success": True,
+        "sent": sum(1 for r in results if r["success"]),
+        "failed": sum(1 for r in results if not r["success"]),
+        "reached": sorted(reached),
+        "no_devices": no_devices,
+    }
+
+
+def trigger_ai_call(user_id, caller_name="Voice Care", call_id=None):
+    return trigger_ai_calls([(user_id, call_id or f"call_{uuid.uuid4().hex[:12]}")], caller_name)
+
+
+def trigger_reminder_calls(reminder_ids):
+    """
+    Scheduler fire hook: rings the users of the claimed reminders in one go.
+    Returns the reminder ids that count as fired; a user without devices
+    cannot be reached by retrying, so those are reported and fired too.
+    """
+    calls = [(data.get("user_id"), rid) for rid, data in reminders.get_many(reminder_ids).items()]
+    result = trigger_ai_calls(calls)
+    if result["no_devices"]:
+        print(f"⚠️ {len(result['no_devices'])} reminder(s) for users without a registered device")
+    return set(result["reached"]) | set(result["no_devices"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ring users' devices with an incoming-call push")
+    parser.add_argument("user_ids", nargs="+")
+    parser.add_argument("--caller-name", default="Voice Care")
+    args = parser.parse_args()
+
+    calls = [(user_id, f"call_{uuid.uuid4().hex[:12]}") for user_id in args.user_ids]
+    print(json.dumps(trigger_ai_calls(calls, args.caller_name), indent=2))
+
+
+if __name__ == "__main__":
+    main()
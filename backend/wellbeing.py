@@ -0,0 +1,247 @@
+"""
+wellbeing.py - Per-user Wellbeing Rollups
+Every logged call adds to two aggregate documents under
+users/<id>/wellbeing: one for the user's local day and one for the ISO
+week. They hold call count and minutes, mood and engagement
+distributions, call categories, red flags and worries. Updates are
+Firestore Increments, so concurrent calls never conflict, and a trend over
+N days reads N documents however many calls there were. A marker per call
+(users/<id>/wellbeing_applied/<call_id>) keeps a retried log from being
+counted twice.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+
+from config import db
+from profile_cache import profile_cache
+from recurrence import zone_for
+from storage import users
+
+ROLLUP_COLLECTION = "wellbeing"
+APPLIED_COLLECTION = "wellbeing_applied"
+WRITE_BATCH_LIMIT = 500
+MAX_PERIODS = {"day": 90, "week": 26}
+DEFAULT_PERIODS = {"day": 14, "week": 8}
+# The only call fields a rollup reads
+ROLLUP_FIELDS = (
+    "started_at", "created_at", "ended_at", "completed_at", "call_duration_seconds", "duration_seconds",
+    "mood_detected", "engagement_level", "red_flags_detected", "user_worries",
+)
+_LABEL_CHARS = 40
+
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value or "").replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _label(value):
+    # Gemini output; bounded so a stray sentence cannot become a map key
+    label = str(value or "").strip().lower()[:_LABEL_CHARS]
+    return label or None
+
+
+def call_minutes(call):
+    seconds = call.get("call_duration_seconds") or call.get("duration_seconds")
+    if seconds is None:
+        started = _parse_time(call.get("started_at") or call.get("created_at"))
+        ended = _parse_time(call.get("ended_at") or call.get("completed_at"))
+        if started and ended and ended > started:
+            seconds = (ended - started).total_seconds()
+    return round((seconds or 0) / 60, 2)
+
+
+def call_contribution(category, call):
+    """What one call adds to its rollups, as nested counters."""
+    contribution = {
+        "calls": 1,
+        "minutes": call_minutes(call),
+        "red_flags": int(bool(call.get("red_flags_detected"))),
+        "worries": len(call.get("user_worries") or []),
+        "categories": {category: 1},
+    }
+    for field, key in (("mood_detected", "mood"), ("engagement_level", "engagement")):
+        label = _label(call.get(field))
+        if label:
+            contribution[key] = {label: 1}
+    return contribution
+
+
+def rollup_fields(call):
+    """The slice of a call record the rollups need, for holding many calls at once."""
+    return {field: call[field] for field in ROLLUP_FIELDS if call.get(field) is not None}
+
+
+def _add(total, values):
+    for key, value in values.items():
+        if isinstance(value, dict):
+            _add(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def _increments(values):
+    return {
+        key: _increments(value) if isinstance(value, dict) else firestore.Increment(value)
+        for key, value in values.items() if value
+    }
+
+
+def _user_zone(user_id):
+    return zone_for((profile_cache.get(user_id) or {}).get("timezone"))
+
+
+def period_ids(day):
+    """Rollup document ids for a local date: ('day-2026-10-18', 'week-2026-W42')."""
+    iso_year, iso_week, _ = day.isocalendar()
+    return f"day-{day.isoformat()}", f"week-{iso_year}-W{iso_week:02d}"
+
+
+def _rollup_ref(user_id, period_id):
+    return users.ref(user_id).collection(ROLLUP_COLLECTION).document(period_id)
+
+
+def _marker_ref(user_id, call_id):
+    return users.ref(user_id).collection(APPLIED_COLLECTION).document(call_id)
+
+
+def _rollup_writes(user_id, call, contribution, zone=None):
+    """(ref, merge-set payload) for the day and week rollups of one call."""
+    moment = _parse_time(call.get("started_at") or call.get("created_at")) or datetime.now(timezone.utc)
+    day = moment.astimezone(zone or _user_zone(user_id)).date()
+    day_id, week_id = period_ids(day)
+    week_start = day - timedelta(days=day.weekday())
+    return [
+        (_rollup_ref(user_id, period_id), {
+            **_increments(contribution),
+            "user_id": user_id,
+            "period": period,
+            "start": start.isoformat(),
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        })
+        for period_id, period, start in ((day_id, "day", day), (week_id, "week", week_start))
+    ]
+
+
+def record_call(user_id, call_id, category, call):
+    """
+    Adds one saved call to its user's rollups in a single batch. Returns
+    False if the call was already counted or the update failed; the call
+    log itself is never affected.
+    """
+    try:
+        batch = db.batch()
+        batch.create(_marker_ref(user_id, call_id), {"applied_at": firestore.SERVER_TIMESTAMP})
+        for ref, payload in _rollup_writes(user_id, call, call_contribution(category, call)):
+            batch.set(ref, payload, merge=True)
+        batch.commit()
+        return True
+    except AlreadyExists:
+        return False
+    except Exception as e:
+        print(f"⚠️ Wellbeing rollup failed for {call_id}: {e}")
+        return False
+
+
+def _commit_chunk(chunk):
+    """
+    Counts a chunk of (user_id, call_id, category, call, rollup writes) in
+    one batch. Markers are created, not merged, so a call counted meanwhile
+    by record_call() fails the batch; the chunk is then redone call by call.
+    """
+    rollups = {}
+    for _, _, category, call, writes in chunk:
+        contribution = call_contribution(category, call)
+        for ref, payload in writes:
+            _add(rollups.setdefault(ref.path, (ref, payload, {}))[2], contribution)
+    try:
+        batch = db.batch()
+        for user_id, call_id, _, _, _ in chunk:
+            batch.create(_marker_ref(user_id, call_id), {"applied_at": firestore.SERVER_TIMESTAMP})
+        for ref, meta, totals in rollups.values():
+            batch.set(ref, {**meta, **_increments(totals)}, merge=True)
+        batch.commit()
+        return len(chunk)
+    except AlreadyExists:
+        return sum(record_call(user_id, call_id, category, call) for user_id, call_id, category, call, _ in chunk)
+
+
+def record_calls(calls):
+    """
+    record_call() for a backlog: (user_id, call_id, category, call) items.
+    Calls already counted are skipped with one get_all, and the rest are
+    summed per rollup document first, so a user's day costs one write.
+    Returns the number of calls counted.
+    """
+    try:
+        unique = {(user_id, call_id): (category, call) for user_id, call_id, category, call in calls}
+        markers = {key: _marker_ref(*key) for key in unique}
+        applied = {doc.reference.path for doc in db.get_all(list(markers.values())) if doc.exists} if markers else set()
+        pending = [key for key, ref in markers.items() if ref.path not in applied]
+
+        counted, chunk, chunk_rollups, zones = 0, [], set(), {}
+        for user_id, call_id in pending:
+            category, call = unique[(user_id, call_id)]
+            if user_id not in zones:
+                zones[user_id] = _user_zone(user_id)
+            writes = _rollup_writes(user_id, call, {}, zones[user_id])
+            new_rollups = {ref.path for ref, _ in writes} - chunk_rollups
+            # A call's marker and its rollups always share a batch
+            if len(chunk) + len(chunk_rollups) + 1 + len(new_rollups) > WRITE_BATCH_LIMIT:
+                counted += _commit_chunk(chunk)
+                chunk, chunk_rollups = [], set()
+                new_rollups = {ref.path for ref, _ in writes}
+            chunk.append((user_id, call_id, category, call, writes))
+            chunk_rollups |= new_rollups
+        if chunk:
+            counted += _commit_chunk(chunk)
+        return counted
+    except Exception as e:
+        print(f"⚠️ Wellbeing rollups failed for {len(calls)} call(s): {e}")
+        return 0
+
+
+def get_trends(user_id, period="day", count=None):
+    """
+    The last `count` day or week rollups, oldest first, missing periods as
+    zeros, plus their totals. Reads `count` documents in one round trip.
+    """
+    count = min(max(int(count or DEFAULT_PERIODS[period]), 1), MAX_PERIODS[period])
+    today = datetime.now(_user_zone(user_id)).date()
+    if period == "week":
+        this_week = today - timedelta(days=today.weekday())
+        starts = [this_week - timedelta(weeks=i) for i in reversed(range(count))]
+        ids = [period_ids(start)[1] for start in starts]
+    else:
+        starts = [today - timedelta(days=i) for i in reversed(range(count))]
+        ids = [period_ids(start)[0] for start in starts]
+
+    docs = {doc.id: doc.to_dict() for doc in db.get_all([_rollup_ref(user_id, i) for i in ids]) if doc.exists}
+    series, totals = [], {}
+    for period_id, start in zip(ids, starts):
+        data = docs.get(period_id, {})
+        point = {
+            "period_id": period_id,
+            "start": start.isoformat(),
+            "calls": data.get("calls", 0),
+            "minutes": round(data.get("minutes", 0), 2),
+            "red_flags": data.get("red_flags", 0),
+            "worries": data.get("worries", 0),
+            "mood": data.get("mood", {}),
+            "engagement": data.get("engagement", {}),
+            "categories": data.get("categories", {}),
+        }
+        series.append(point)
+        _add(totals, {k: v for k, v in point.items() if k not in ("period_id", "start")})
+    totals["minutes"] = round(totals.get("minutes", 0), 2)
+    return {"user_id": user_id, "period": period, "series": series, "totals": totals, "success": True}